@@ -6,7 +6,7 @@
 # https://github.com/The-Sequence-Ontology/SO-Ontologies/blob/master/subsets/SOFA.obo
 
 '''
-alignmentpos2gff.py  last modified 2017-09-19
+alignmentpos2gff.py  last modified 2026-10-18
 
     EXAMPLE USAGE:
 alignmentpos2gff.py -a all_prots.aln -s 100,150 > all_prots.sites.gff
@@ -17,12 +17,27 @@ alignmentpos2gff.py -a all_prots.aln -s 100,150 -f FYW > all_prots.FYW_only.gff
     or append to the protein GFF files from pfam2gff.py or pfampipeline.py
 
 alignmentpos2gff.py -a all_prots.aln -s 100,150 >> all_prots.clan.gff
+
+    or mark every column where the residue passes the filter, such as all C
+
+alignmentpos2gff.py -a all_prots.aln -A -f C > all_prots.C_only.gff
 '''
 
 import sys
 import time
 import argparse
-from Bio import SeqIO
+from itertools import accumulate
+from genomegtf.inputs import open_input
+from genomegtf.profiling import run_main
+
+def ungapped_position_map(alignedseq):
+	'''return list where each alignment index gives the ungapped position, counting from 1'''
+	# such as "MK--LV" gives [1, 2, 2, 2, 3, 4]
+	return list(accumulate(int(residue!="-") for residue in alignedseq))
+
+def sites_to_positions(alignedseq, posmap, sites, residuefilter):
+	'''return list of tuples of ungapped position and residue for all sites that pass the filter'''
+	return [(posmap[ss], alignedseq[ss]) for ss in sites if alignedseq[ss] in residuefilter] # by default this will ignore any gaps
 
 def main(argv, wayout):
 	if not len(argv):
@@ -31,23 +46,31 @@ def main(argv, wayout):
 	parser.add_argument('-a','--alignment', help="alignment in fasta format")
 	parser.add_argument('-f','--filter', default="ACDEFGHIKLMNPQRSTVWY", help="keep only certain amino acids [default: all]")
 	parser.add_argument('-s','--sites', help="comma separate list of sites, like '75,79,150'")
+	parser.add_argument('-A','--all-sites', action="store_true", help="mark all sites that pass the filter, cannot use with -s")
 	parser.add_argument('-i','--keep-index', action="store_true", help="sites given are already indexed for python (meaning minus 1)")
 	args = parser.parse_args(argv)
 
-	sites = [int(s) for s in args.sites.split(",")]
-	if not args.keep_index:
-		sites = [i-1 for i in sites]
-
-	for seqrec in SeqIO.parse(args.alignment, "fasta"):
-		#seqsites = [seqrec.seq[s] for s in sites]
-		#seqpos = [len(str(x1.seq[:s+1]).replace("-","")) for s in sites]
-		for ss in sites:
-			residueatpos = seqrec.seq[ss]
-			nogappos = len(str(seqrec.seq[:ss+1]).replace("-",""))
-			if residueatpos in args.filter: # by default this will ignore any gaps
-				# Q16665	UniProtKB	Modified residue	564	564	.	.	.	Note=4-hydroxyproline
-				outline = "{0}\talignment\tmodified residue\t{1}\t{1}\t1\t.\t.\tNote={2}".format(seqrec.id, nogappos, residueatpos)
-				print >> wayout, outline
+	if args.sites and args.all_sites:
+		sys.exit("ERROR: can only use one of -s and -A")
+	if args.sites:
+		sites = [int(s) for s in args.sites.split(",")]
+		if not args.keep_index:
+			sites = [i-1 for i in sites]
+	elif not args.all_sites:
+		sys.exit("ERROR: must give sites with -s, or use -A for all sites")
+
+	from Bio import SeqIO # slow to import, so only when reading sequences
+	for seqrec in SeqIO.parse(open_input(args.alignment), "fasta"):
+		alignedseq = str(seqrec.seq)
+		if args.all_sites:
+			sites = range(len(alignedseq))
+		elif sites and max(sites) >= len(alignedseq):
+			sys.exit("ERROR: site {} is beyond the length {} of {}".format(max(sites) + (0 if args.keep_index else 1), len(alignedseq), seqrec.id) )
+		posmap = ungapped_position_map(alignedseq)
+		for nogappos, residueatpos in sites_to_positions(alignedseq, posmap, sites, args.filter):
+			# Q16665	UniProtKB	Modified residue	564	564	.	.	.	Note=4-hydroxyproline
+			outline = "{0}\talignment\tmodified residue\t{1}\t{1}\t1\t.\t.\tNote={2}\n".format(seqrec.id, nogappos, residueatpos)
+			wayout.write(outline)
 
 if __name__ == "__main__":
-	main(sys.argv[1:],sys.stdout)
+	run_main(main, sys.argv[1:], sys.stdout)
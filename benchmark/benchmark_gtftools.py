@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+#
+# benchmark_gtftools.py created 2026-10-18
+
+'''benchmark_gtftools.py  last modified 2026-10-18
+    time and measure peak memory of the genomeGTFtools scripts
+    on synthetic data, and write the results as JSON
+
+    two related genomes are generated, with gene models, proteins,
+    blast tables, PFAM domains, a protein alignment and other inputs
+    all files come from the random --seed, so the same -g and --seed
+    always give identical data, and results can be compared between
+    commits or machines
+
+benchmark_gtftools.py -g 20000 -o results_v1.json
+
+    then compare a later commit to the first results
+    any step slower by more than --tolerance is marked as SLOWER
+
+benchmark_gtftools.py -g 20000 -o results_v2.json -c results_v1.json
+
+    data are made in a temporary folder and removed afterwards,
+    unless a folder is given with -w, where data are kept and reused
+    to run only some steps, give the names to -t, list them with -l
+
+benchmark_gtftools.py -g 100000 -w bench_100k/ -t microsynteny scaffold_synteny -r 3
+
+    each step runs as a separate process, the time is wall-clock time
+    and memory is the maximum resident set size of that process
+'''
+
+import sys
+import os
+import time
+import json
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from collections import namedtuple
+
+# translation tables to convert random bytes into sequence letters
+DNA_TABLE = bytes.maketrans(bytes(range(256)), b"ACGT" * 64)
+PROTEIN_TABLE = bytes.maketrans(bytes(range(256)), (b"ACDEFGHIKLMNPQRSTVWY" * 13)[:256])
+FASTA_WIDTH = 60
+
+# name is used in the output, arguments are formatted with {data} for the data folder and {out} for outputs of earlier steps
+BenchmarkStep = namedtuple("BenchmarkStep", "name script arguments")
+BENCHMARK_STEPS = [
+BenchmarkStep("repeat2gtf", "repeat2gtf.py", ["{data}/A.fasta"]),
+BenchmarkStep("repeat2gtf_mmap", "repeat2gtf.py", ["-m", "{data}/A.fasta"]),
+BenchmarkStep("repeat2gtf_motifs", "repeat2gtf.py", ["-r", "N,CA,CAG,AT", "-s", "-a", "5", "{data}/A.fasta"]),
+BenchmarkStep("repeat2gtf_motifs_mmap", "repeat2gtf.py", ["-r", "N,CA,CAG,AT", "-s", "-a", "5", "-m", "{data}/A.fasta"]),
+BenchmarkStep("microsynteny", "microsynteny.py", ["-b", "{data}/A_vs_B.blastp.tab", "-q", "{data}/A.gff", "-d", "{data}/B.gff", "-Q", ".", "-D", ".", "--blast-query-delimiter", ".", "--blast-db-delimiter", "."]),
+BenchmarkStep("microsynteny_gff", "microsynteny.py", ["-b", "{data}/A_vs_B.blastp.tab", "-q", "{data}/A.gff", "-d", "{data}/B.gff", "-Q", ".", "-D", ".", "--blast-query-delimiter", ".", "--blast-db-delimiter", ".", "-G"]),
+BenchmarkStep("scaffold_synteny", "scaffold_synteny.py", ["-b", "{data}/A_vs_B.blastp.tab", "-f", "{data}/A.fasta", "-F", "{data}/B.fasta", "-q", "{data}/A.gff", "-d", "{data}/B.gff", "-Q", ".", "-D", ".", "--blast-query-delimiter", ".", "--blast-db-delimiter", "."]),
+BenchmarkStep("blast2genomegff", "blast2genomegff.py", ["-b", "{data}/A_vs_B.blastp.tab", "-d", "{data}/B.prots.fasta", "-g", "{data}/A.gff", "-p", "blastp", "-x", "-K"]),
+BenchmarkStep("pfam2gff_protein", "pfam2gff.py", ["-i", "{data}/A.pfam.tab"]),
+BenchmarkStep("pfam2gff_genome", "pfam2gff.py", ["-i", "{data}/A.pfam.tab", "-g", "{data}/A.gff"]),
+BenchmarkStep("pfamgff2clans", "pfamgff2clans.py", ["-i", "{out}/pfam2gff_protein.out", "-c", "{data}/Pfam-A.clans.tsv", "-s", "{data}/A.prots.fasta"]),
+BenchmarkStep("blast2gff", "blast2gff.py", ["-b", "{data}/B_vs_A.tblastn.tab"]),
+BenchmarkStep("make_parent_features", "make_parent_features.py", ["{data}/B_vs_A.hits.gff"]),
+BenchmarkStep("collate_features", "collate_features.py", ["{data}/A.mrna.gff", "{data}/A.exons.gff"]),
+BenchmarkStep("clean_gff", "clean_gff.py", ["{data}/A.gff"]),
+BenchmarkStep("removeredundantgff", "removeredundantgff.py", ["-g", "{data}/A.gff"]),
+BenchmarkStep("rename_gtf_contigs", "rename_gtf_contigs.py", ["-c", "{data}/A.conversions.tab", "-g", "{data}/A.gff"]),
+BenchmarkStep("number_contigs_by_length", "number_contigs_by_length.py", ["{data}/A.fasta"]),
+BenchmarkStep("alignmentpos2gff", "alignmentpos2gff.py", ["-a", "{data}/prots.aln", "-A", "-f", "C"]),
+# startup time of the subcommand entry point, importing the script but not running it
+BenchmarkStep("startup_microsynteny", "gtftools.py", ["microsynteny", "--startup-time"]),
+BenchmarkStep("startup_blast2genomegff", "gtftools.py", ["blast2genomegff", "--startup-time"]),
+BenchmarkStep("startup_repeat2gtf", "gtftools.py", ["repeat2gtf", "--startup-time"]),
+]
+
+def random_dna(rng, length):
+	return rng.randbytes(length).translate(DNA_TABLE)
+
+def random_protein(rng, length):
+	return rng.randbytes(length).translate(PROTEIN_TABLE)
+
+def fasta_record(seqid, sequence):
+	'''return bytes of one fasta entry, wrapped to even lines'''
+	lines = [sequence[i:i+FASTA_WIDTH] for i in range(0, len(sequence), FASTA_WIDTH)]
+	return b">" + seqid.encode() + b"\n" + b"\n".join(lines) + b"\n"
+
+def make_genome(rng, prefix, genecount, scaffoldcount):
+	'''lay out genes on scaffolds, return list of tuples of scaffold name, length and list of genes
+	    where each gene is a tuple of gene ID, strand, and list of exon intervals'''
+	# scaffolds have uneven numbers of genes, so lengths vary like a real assembly
+	weights = [rng.paretovariate(1.5) for i in range(scaffoldcount)]
+	genecounts = [max(1, int(genecount * w / sum(weights))) for w in weights]
+	genecounts[0] += genecount - sum(genecounts)
+	scaffolds = []
+	genenumber = 0
+	for scafnumber, scafgenes in enumerate(genecounts):
+		position = rng.randint(100, 3000)
+		genes = []
+		for i in range(scafgenes):
+			genenumber += 1
+			exons = []
+			for exonnumber in range(rng.randint(1, 8)):
+				exonlength = rng.randint(60, 400)
+				exons.append( (position, position + exonlength - 1) )
+				position += exonlength + rng.randint(60, 600)
+			genes.append( ("{}_g{:06d}".format(prefix, genenumber), rng.choice("+-"), exons) )
+			position += rng.randint(200, 3000)
+		scaffolds.append( ("{}_scaffold_{:04d}".format(prefix, scafnumber + 1), position, genes) )
+	return scaffolds
+
+def protein_length(exons):
+	return sum(end - start + 1 for start, end in exons) // 3 - 1
+
+def write_genome_fasta(rng, scaffolds, fastafile):
+	'''write random sequence for each scaffold, with runs of N between some genes'''
+	with open(fastafile, 'wb') as fh:
+		for scaffold, length, genes in scaffolds:
+			sequence = bytearray(random_dna(rng, length))
+			for i in range(1, len(genes)):
+				if rng.random() < 0.1: # gap in the intergenic region before this gene
+					gapstart = genes[i-1][2][-1][1] + 20
+					gapend = min(genes[i][2][0][0] - 20, gapstart + rng.randint(10, 500))
+					if gapend > gapstart:
+						sequence[gapstart:gapend] = b"N" * (gapend - gapstart)
+			fh.write(fasta_record(scaffold, bytes(sequence)))
+
+def write_genome_gff(rng, scaffolds, gfffile, mrnafile=None, exonfile=None):
+	'''write gene, mRNA, exon and CDS features, and some redundant second transcripts'''
+	gh = open(gfffile, 'w')
+	mh = open(mrnafile, 'w') if mrnafile else None
+	eh = open(exonfile, 'w') if exonfile else None
+	for scaffold, length, genes in scaffolds:
+		for geneid, strand, exons in genes:
+			genestart, geneend = exons[0][0], exons[-1][1]
+			gh.write("{}\tsynthetic\tgene\t{}\t{}\t.\t{}\t.\tID={};Name={}\n".format(scaffold, genestart, geneend, strand, geneid, geneid) )
+			transcripts = ["t1", "t2"] if rng.random() < 0.1 else ["t1"]
+			for transcript in transcripts:
+				mrnaid = "{}.{}".format(geneid, transcript)
+				mrnaline = "{}\tsynthetic\tmRNA\t{}\t{}\t.\t{}\t.\tID={};Parent={}\n".format(scaffold, genestart, geneend, strand, mrnaid, geneid)
+				exonlines = ["{}\tsynthetic\texon\t{}\t{}\t.\t{}\t.\tParent={}\n".format(scaffold, start, end, strand, mrnaid) for start, end in exons]
+				cdslines = ["{}\tsynthetic\tCDS\t{}\t{}\t.\t{}\t0\tParent={}\n".format(scaffold, start, end, strand, mrnaid) for start, end in exons]
+				gh.write(mrnaline + "".join(exonlines) + "".join(cdslines))
+				if mh and transcript=="t1":
+					mh.write(mrnaline)
+					eh.write("".join(exonlines))
+	gh.close()
+	if mh:
+		mh.close()
+		eh.close()
+
+def write_proteins(rng, scaffolds, fastafile):
+	'''write random proteins for the first transcript of each gene'''
+	with open(fastafile, 'wb') as fh:
+		for scaffold, length, genes in scaffolds:
+			for geneid, strand, exons in genes:
+				fh.write(fasta_record("{}.t1".format(geneid), random_protein(rng, protein_length(exons))))
+
+def make_orthologs(rng, genelist):
+	'''return list of the same length as genelist, where each item is an index in genelist or None
+	    as blocks of genes in shuffled order, some reversed, with some genes lost'''
+	blocks = []
+	blockstart = 0
+	while blockstart < len(genelist):
+		blockend = min(len(genelist), blockstart + rng.randint(3, 30))
+		block = list(range(blockstart, blockend))
+		if rng.random() < 0.5:
+			block.reverse()
+		blocks.append(block)
+		blockstart = blockend
+	rng.shuffle(blocks)
+	orthologs = [index if rng.random() < 0.8 else None for block in blocks for index in block]
+	return orthologs
+
+def write_blastp_table(rng, agenes, bgenes, orthologs, blastfile):
+	'''write tabular blastp of A proteins against B proteins, with one ortholog hit and some weaker hits per query'''
+	hitsbyquery = [[] for i in range(len(agenes))]
+	for bindex, aindex in enumerate(orthologs):
+		if aindex is not None:
+			hitsbyquery[aindex].append( (bindex, True) )
+	with open(blastfile, 'w') as bh:
+		for aindex, hits in enumerate(hitsbyquery):
+			for i in range(rng.randint(0, 2)):
+				hits.append( (rng.randrange(len(bgenes)), False) )
+			querylength = protein_length(agenes[aindex][2])
+			for bindex, isortholog in hits:
+				subjectlength = protein_length(bgenes[bindex][2])
+				alignlength = max(10, int(min(querylength, subjectlength) * rng.uniform(0.6, 1.0)))
+				qstart = rng.randint(1, querylength - alignlength + 1)
+				sstart = rng.randint(1, subjectlength - alignlength + 1)
+				if isortholog:
+					pident, evalue, bitscore = rng.uniform(50, 95), 10 ** -rng.randint(30, 180), alignlength * rng.uniform(1.0, 2.0)
+				else:
+					pident, evalue, bitscore = rng.uniform(20, 40), 10 ** -rng.randint(5, 20), alignlength * rng.uniform(0.2, 0.5)
+				bh.write("{}.t1\t{}.t1\t{:.2f}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{:.2e}\t{:.1f}\n".format(agenes[aindex][0], bgenes[bindex][0], pident, alignlength, int(alignlength * (100 - pident) / 100), rng.randint(0, 3), qstart, qstart + alignlength - 1, sstart, sstart + alignlength - 1, evalue, bitscore) )
+
+def write_tblastn_table(rng, agenes, ascaffoldof, bgenes, orthologs, blastfile, hitsfile):
+	'''write tabular tblastn of B proteins against the A genome, with one HSP for each exon of the ortholog
+	    and the same HSPs as GFF, where all HSPs of one hit share an ID'''
+	with open(blastfile, 'w') as bh, open(hitsfile, 'w') as hh:
+		for bindex, aindex in enumerate(orthologs):
+			if aindex is None:
+				continue
+			geneid, strand, exons = agenes[aindex]
+			querystart = 1
+			for start, end in (exons if strand=="+" else reversed(exons)):
+				hsplength = (end - start + 1) // 3
+				subjectstart, subjectend = (start, start + hsplength * 3 - 1) if strand=="+" else (end, end - hsplength * 3 + 1)
+				pident = rng.uniform(40, 95)
+				bitscore = hsplength * rng.uniform(1.0, 2.0)
+				hh.write("{}\ttblastn\tmatch_part\t{}\t{}\t{}\t{}\t.\tID={}.t1\n".format(ascaffoldof[geneid], min(subjectstart, subjectend), max(subjectstart, subjectend), int(bitscore), strand, bgenes[bindex][0]) )
+				bh.write("{}.t1\t{}\t{:.2f}\t{}\t{}\t0\t{}\t{}\t{}\t{}\t{:.2e}\t{:.1f}\n".format(bgenes[bindex][0], ascaffoldof[geneid], pident, hsplength, int(hsplength * (100 - pident) / 100), querystart, querystart + hsplength - 1, subjectstart, subjectend, 10 ** -rng.randint(5, 60), bitscore) )
+				querystart += hsplength
+
+def write_pfam_tables(rng, agenes, familycount, domtblfile, clanfile):
+	'''write hmmscan domtblout of domains on A proteins, and the clan table for the domain families'''
+	familylengths = [rng.randint(30, 200) for i in range(familycount)]
+	with open(clanfile, 'w') as ch:
+		for family in range(familycount):
+			clan = "CL{:04d}".format(family // 5) if rng.random() < 0.7 else ""
+			ch.write("PF{:05d}\t{}\t{}\tDom{}\tsynthetic domain family {}\n".format(family + 1, clan, "clan{}".format(family // 5) if clan else "", family + 1, family + 1) )
+	with open(domtblfile, 'w') as dh:
+		dh.write("# target name        accession   tlen query name           accession   qlen   E-value  score  bias   #  of  c-Evalue  i-Evalue  score  bias  from    to  from    to  from    to  acc description of target\n")
+		for geneid, strand, exons in agenes:
+			if rng.random() > 0.6:
+				continue
+			querylength = protein_length(exons)
+			domains = []
+			position = 1
+			for i in range(rng.randint(1, 3)):
+				family = rng.randrange(familycount)
+				alignlength = int(familylengths[family] * rng.uniform(0.5, 1.0))
+				if position + alignlength > querylength:
+					break
+				alignstart = rng.randint(position, querylength - alignlength)
+				domains.append( (family, alignstart, alignstart + alignlength - 1) )
+				position = alignstart + alignlength // 2 # domains may overlap
+			for domnumber, (family, alignstart, alignend) in enumerate(domains):
+				evalue = 10 ** -rng.randint(3, 50)
+				score = rng.uniform(20, 200)
+				dh.write("{:<20} {:<10} {:>5} {:<20} {:<10} {:>5} {:9.1e} {:6.1f} {:5.1f} {:>3} {:>3} {:9.1e} {:9.1e} {:6.1f} {:5.1f} {:>5} {:>5} {:>5} {:>5} {:>5} {:>5} {:4.2f} synthetic domain family {}\n".format("Dom{}".format(family + 1), "PF{:05d}.1".format(family + 1), familylengths[family], "{}.t1".format(geneid), "-", querylength, evalue, score, 0.1, domnumber + 1, len(domains), evalue, evalue, score, 0.1, 1, alignend - alignstart + 1, alignstart, alignend, alignstart, alignend, 0.9, family + 1) )
+
+def write_alignment(rng, seqcount, alignlength, alignfile):
+	'''write protein alignment in fasta format, with gaps'''
+	with open(alignfile, 'wb') as ah:
+		for i in range(seqcount):
+			sequence = bytearray(random_protein(rng, alignlength))
+			for j in range(alignlength // 50):
+				gapstart = rng.randrange(alignlength)
+				gapend = min(alignlength, gapstart + rng.randint(1, 20))
+				sequence[gapstart:gapend] = b"-" * (gapend - gapstart)
+			ah.write(fasta_record("seq{:05d}".format(i + 1), bytes(sequence)))
+
+def generate_data(datadir, genecount, seed):
+	'''generate all synthetic input files in datadir'''
+	rng = random.Random(seed)
+	scaffoldcount = max(5, genecount // 200)
+	sys.stderr.write("# Generating {} genes on {} scaffolds for each genome in {}  ".format(genecount, scaffoldcount, datadir) + time.asctime() + os.linesep)
+	ascaffolds = make_genome(rng, "A", genecount, scaffoldcount)
+	bscaffolds = make_genome(rng, "B", genecount, scaffoldcount)
+	agenes = [gene for scaffold in ascaffolds for gene in scaffold[2]]
+	bgenes = [gene for scaffold in bscaffolds for gene in scaffold[2]]
+	ascaffoldof = {gene[0]:scaffold[0] for scaffold in ascaffolds for gene in scaffold[2]}
+	orthologs = make_orthologs(rng, agenes)
+
+	write_genome_fasta(rng, ascaffolds, os.path.join(datadir, "A.fasta"))
+	write_genome_fasta(rng, bscaffolds, os.path.join(datadir, "B.fasta"))
+	write_genome_gff(rng, ascaffolds, os.path.join(datadir, "A.gff"), os.path.join(datadir, "A.mrna.gff"), os.path.join(datadir, "A.exons.gff"))
+	write_genome_gff(rng, bscaffolds, os.path.join(datadir, "B.gff"))
+	write_proteins(rng, ascaffolds, os.path.join(datadir, "A.prots.fasta"))
+	write_proteins(rng, bscaffolds, os.path.join(datadir, "B.prots.fasta"))
+	write_blastp_table(rng, agenes, bgenes, orthologs, os.path.join(datadir, "A_vs_B.blastp.tab"))
+	write_tblastn_table(rng, agenes, ascaffoldof, bgenes, orthologs, os.path.join(datadir, "B_vs_A.tblastn.tab"), os.path.join(datadir, "B_vs_A.hits.gff"))
+	write_pfam_tables(rng, agenes, 500, os.path.join(datadir, "A.pfam.tab"), os.path.join(datadir, "Pfam-A.clans.tsv"))
+	write_alignment(rng, max(20, genecount // 200), 2000, os.path.join(datadir, "prots.aln"))
+	with open(os.path.join(datadir, "A.conversions.tab"), 'w') as ch:
+		for number, (scaffold, length, genes) in enumerate(sorted(ascaffolds, key=lambda x: x[1], reverse=True)):
+			ch.write("{}\tA_chr{}\n".format(scaffold, number + 1) )
+	sys.stderr.write("# Finished generating data  " + time.asctime() + os.linesep)
+
+# each step is started from a small python process, since the peak memory of a forked process
+# would otherwise start from the memory of this one, which holds the generated data
+RUSAGE_WRAPPER = """import os, sys, time
+starttime = time.time()
+pid = os.fork()
+if pid==0:
+	os.execv(sys.argv[2], sys.argv[2:])
+pid, status, usage = os.wait4(pid, 0)
+with open(sys.argv[1], 'w') as uh:
+	uh.write("{} {} {} {}".format(os.waitstatus_to_exitcode(status), time.time() - starttime, usage.ru_utime + usage.ru_stime, usage.ru_maxrss))
+"""
+
+def run_step(command, outfile, errfile):
+	'''run one command, return tuple of exit code, wall time, cpu time and peak memory in kb'''
+	usagefile = "{}.rusage".format(errfile)
+	with open(outfile, 'w') as oh, open(errfile, 'w') as eh:
+		subprocess.call([sys.executable, "-c", RUSAGE_WRAPPER, usagefile] + command, stdout=oh, stderr=eh)
+	with open(usagefile) as uh:
+		exitcode, walltime, cputime, maxrss = uh.read().split()
+	os.remove(usagefile)
+	maxrss = int(maxrss) // 1024 if sys.platform=="darwin" else int(maxrss) # darwin gives bytes
+	return int(exitcode), float(walltime), float(cputime), maxrss
+
+def count_lines(filename):
+	with open(filename, 'rb') as fh:
+		return sum(block.count(b"\n") for block in iter(lambda: fh.read(1 << 20), b""))
+
+def get_commit(repodir):
+	try:
+		return subprocess.check_output(["git", "-C", repodir, "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def compare_results(oldresults, newresults, tolerance, wayout):
+	'''print table of time and memory ratios for steps in both results'''
+	if (oldresults["genes"], oldresults["seed"]) != (newresults["genes"], newresults["seed"]):
+		sys.stderr.write("WARNING: comparing runs with different data, {} genes seed {} and {} genes seed {}\n".format(oldresults["genes"], oldresults["seed"], newresults["genes"], newresults["seed"]) )
+	wayout.write("step\told_seconds\tnew_seconds\ttime_ratio\told_rss_kb\tnew_rss_kb\trss_ratio\tnote\n")
+	slowercount = 0
+	for name, newstep in newresults["steps"].items():
+		oldstep = oldresults["steps"].get(name)
+		if oldstep is None or oldstep["exit_code"] or newstep["exit_code"]:
+			continue
+		timeratio = newstep["best_seconds"] / max(oldstep["best_seconds"], 0.001)
+		rssratio = newstep["max_rss_kb"] * 1.0 / max(oldstep["max_rss_kb"], 1)
+		note = ""
+		if timeratio > tolerance:
+			note = "SLOWER"
+			slowercount += 1
+		elif timeratio < 1.0 / tolerance:
+			note = "faster"
+		wayout.write("{}\t{:.3f}\t{:.3f}\t{:.2f}\t{}\t{}\t{:.2f}\t{}\n".format(name, oldstep["best_seconds"], newstep["best_seconds"], timeratio, oldstep["max_rss_kb"], newstep["max_rss_kb"], rssratio, note) )
+	sys.stderr.write("# {} steps were slower than {} ({}) by more than {:.2f}x\n".format(slowercount, oldresults["commit"], oldresults["date"], tolerance) )
+
+def main(argv, wayout):
+	if not len(argv):
+		argv.append("-h")
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=__doc__)
+	parser.add_argument('-g','--genes', type=int, default=5000, help="number of genes in each synthetic genome [5000]")
+	parser.add_argument('-o','--output', help="JSON file of results")
+	parser.add_argument('-c','--compare', help="JSON file of earlier results, to compare with this run")
+	parser.add_argument('-r','--repeats', type=int, default=1, help="number of times to run each step, keeping the fastest time [1]")
+	parser.add_argument('-t','--steps', nargs='+', help="only run these steps")
+	parser.add_argument('-w','--work-dir', help="folder to keep and reuse data and outputs, otherwise a temporary folder")
+	parser.add_argument('-l','--list-steps', action="store_true", help="print the names of all steps and exit")
+	parser.add_argument('--seed', type=int, default=2026, help="random seed for data generation [2026]")
+	parser.add_argument('--tolerance', type=float, default=1.2, help="time ratio to report a step as slower with -c [1.2]")
+	args = parser.parse_args(argv)
+
+	if args.list_steps:
+		for step in BENCHMARK_STEPS:
+			wayout.write("{}\t{} {}\n".format(step.name, step.script, " ".join(step.arguments)) )
+		return
+	if not args.output and not args.compare:
+		sys.exit("ERROR: must give -o for results, or -c to compare")
+	steps = BENCHMARK_STEPS
+	if args.steps:
+		stepnames = set(step.name for step in BENCHMARK_STEPS)
+		for name in args.steps:
+			if name not in stepnames:
+				sys.exit("ERROR: unknown step {}, see -l for all steps".format(name) )
+		steps = [step for step in BENCHMARK_STEPS if step.name in args.steps]
+
+	repodir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	if args.work_dir:
+		workdir = args.work_dir
+		if not os.path.isdir(workdir):
+			os.makedirs(workdir)
+	else:
+		workdir = tempfile.mkdtemp(prefix="gtftools_benchmark_")
+	datadir = os.path.join(workdir, "data")
+	outdir = os.path.join(workdir, "outputs")
+	for folder in [datadir, outdir]:
+		if not os.path.isdir(folder):
+			os.makedirs(folder)
+
+	# data are only made again if the parameters changed
+	paramsfile = os.path.join(datadir, "parameters.json")
+	dataparams = {"genes":args.genes, "seed":args.seed}
+	if os.path.isfile(paramsfile) and json.load(open(paramsfile))==dataparams:
+		sys.stderr.write("# Using existing data in {}\n".format(datadir) )
+	else:
+		generate_data(datadir, args.genes, args.seed)
+		with open(paramsfile, 'w') as ph:
+			json.dump(dataparams, ph)
+
+	results = {"commit":get_commit(repodir), "date":time.strftime("%Y-%m-%d %H:%M:%S"),
+		"python":platform.python_version(), "platform":platform.platform(), "processors":os.cpu_count(),
+		"genes":args.genes, "seed":args.seed, "repeats":args.repeats, "steps":{} }
+	for step in steps:
+		command = [sys.executable, os.path.join(repodir, step.script)] + [argument.format(data=datadir, out=outdir) for argument in step.arguments]
+		outfile = os.path.join(outdir, "{}.out".format(step.name))
+		errfile = os.path.join(outdir, "{}.log".format(step.name))
+		sys.stderr.write("# Running {}  ".format(step.name) + time.asctime() + os.linesep)
+		walltimes, cputimes, maxrss = [], [], 0
+		for i in range(args.repeats):
+			exitcode, walltime, cputime, rss = run_step(command, outfile, errfile)
+			walltimes.append(walltime)
+			cputimes.append(cputime)
+			maxrss = max(maxrss, rss)
+			if exitcode:
+				sys.stderr.write("WARNING: {} failed with exit code {}, see {}\n".format(step.name, exitcode, errfile) )
+				break
+		results["steps"][step.name] = {"command":" ".join([step.script] + step.arguments),
+			"exit_code":exitcode, "seconds":[round(t, 4) for t in walltimes], "best_seconds":round(min(walltimes), 4),
+			"cpu_seconds":round(min(cputimes), 4), "max_rss_kb":maxrss, "output_lines":count_lines(outfile) }
+		sys.stderr.write("# {} took {:.2f}s with {} kb peak memory\n".format(step.name, min(walltimes), maxrss) )
+
+	if args.output:
+		with open(args.output, 'w') as rh:
+			json.dump(results, rh, indent=1)
+		sys.stderr.write("# Wrote results for {} steps to {}  ".format(len(results["steps"]), args.output) + time.asctime() + os.linesep)
+	if args.compare:
+		compare_results(json.load(open(args.compare)), results, args.tolerance, wayout)
+	if not args.work_dir:
+		shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+	main(sys.argv[1:], sys.stdout)
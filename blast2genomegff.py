@@ -8,7 +8,7 @@
 # for SOFA terms:
 # https://github.com/The-Sequence-Ontology/SO-Ontologies/blob/master/subsets/SOFA.obo
 
-'''blast2genomegff.py  last modified 2020-02-17
+'''blast2genomegff.py  last modified 2026-10-18
     convert blast output to gff format for genome annotation
     blastx of a transcriptome (genome guided or de novo) against a protein DB:
 
@@ -34,6 +34,16 @@ blast2genomegff.py -b blastn_output.tab -p BLASTN -t EST_match > output.gff
     the reported score (column 6) is the bitscore
 
     for blastp, if GFF contains both exon and CDS features, use -x and -K
+
+    output can be sorted, bgzipped and indexed for tabix, with --bgzip-out
+blast2genomegff.py -b blastx_out6.tab -d protein_db.fasta -g transcripts.gtf --bgzip-out output.gff.gz
+
+    or written directly as a JBrowse track, with --jbrowse-out
+blast2genomegff.py -b blastx_out6.tab -d protein_db.fasta -g transcripts.gtf --jbrowse-out jbrowse/data/tracks/blastx
+
+    or written unsorted to a file with -o, gzipped as BGZF if the name
+    ends in .gz, where compression runs on a background thread
+blast2genomegff.py -b blastx_out6.tab -d protein_db.fasta -g transcripts.gtf -o output.gff.gz
 '''
 
 import sys
@@ -41,10 +51,15 @@ import argparse
 import time
 import re
 import os
-import gzip
 from collections import defaultdict,Counter
 from itertools import chain
-from Bio import SeqIO
+from array import array
+from genomegtf.features import GffFeature, write_features
+from genomegtf.inputs import open_input, describe_input
+from genomegtf.symbols import SymbolTable, grow
+from genomegtf.outputs import BufferedLineWriter, open_output
+from genomegtf.instrument import RunReport
+from genomegtf.profiling import run_main
 
 def make_seq_length_dict(sequencefile, is_swissprot, get_description):
 	sys.stderr.write("# Parsing target sequences from {}  ".format(sequencefile) + time.asctime() + os.linesep)
@@ -52,7 +67,8 @@ def make_seq_length_dict(sequencefile, is_swissprot, get_description):
 	otherdict = {}
 	if get_description:
 		sys.stderr.write("# Taking length and descriptions from sequences\n")
-	for seqrec in SeqIO.parse(sequencefile,'fasta'):
+	from Bio import SeqIO # slow to import, so only when reading sequences
+	for seqrec in SeqIO.parse(open_input(sequencefile),'fasta'):
 		lengthdict[seqrec.id] = len(seqrec.seq)
 		if get_description: #
 			sseqid = seqrec.id
@@ -69,12 +85,14 @@ def get_max_frequency(intervals):
 	max_counts = max(interval_counts.values())
 	return max_counts
 
-def gtf_to_intervals(gtffile, keepcds, skipexons, transdecoder, nogenemode, genesplit):
-	'''convert protein or gene intervals from gff to dictionary where mrna IDs are keys and lists of intervals are values'''
+def gtf_to_intervals(gtffile, keepcds, skipexons, transdecoder, nogenemode, genesplit, report=None):
+	'''convert protein or gene intervals from gff to lists indexed by mrna ID, return lists of intervals, strands and scaffold IDs, and SymbolTable of mrna names and of scaffold names, adding line counts to RunReport report'''
 	# this should probably be a class
-	geneintervals = defaultdict(list)
-	genestrand = {}
-	genescaffold = {}
+	genenames = SymbolTable() # mrna ID is index of the lists
+	scaffoldnames = SymbolTable()
+	geneintervals = [] # list of intervals for each mrna
+	genestrand = [] # strand of each mrna, or None
+	genescaffold = array('i') # scaffold ID of each mrna, or -1
 
 	commentlines = 0 # comment lines
 	linecounter = 0 # all lines that are not comments, even if ignored later
@@ -84,12 +102,7 @@ def gtf_to_intervals(gtffile, keepcds, skipexons, transdecoder, nogenemode, gene
 
 	allowed_features = ["gene", "mRNA", "transcript", "exon", "CDS"]
 
-	if gtffile.rsplit('.',1)[-1]=="gz": # autodetect gzip format
-		opentype = gzip.open
-		sys.stderr.write("# Parsing gff from {} as gzipped  ".format(gtffile) + time.asctime() + os.linesep)
-	else: # otherwise assume normal open for fasta format
-		opentype = open
-		sys.stderr.write("# Parsing gff from {}  ".format(gtffile) + time.asctime() + os.linesep)
+	sys.stderr.write("# Parsing gff from {}{}  ".format(gtffile, describe_input(gtffile)) + time.asctime() + os.linesep)
 	if skipexons: #
 		sys.stderr.write("# exon features WILL BE IGNORED\n")
 	if keepcds: # alert user to the flags that have been set
@@ -98,7 +111,7 @@ def gtf_to_intervals(gtffile, keepcds, skipexons, transdecoder, nogenemode, gene
 		sys.stderr.write("# gene name and strand will be read for each exon\n")
 
 	# begin parsing file
-	for line in opentype(gtffile,'rt'):
+	for line in open_input(gtffile):
 		line = line.strip()
 		if line: # ignore empty lines
 			if line[0]=="#": # count comment lines, just in case
@@ -128,18 +141,23 @@ def gtf_to_intervals(gtffile, keepcds, skipexons, transdecoder, nogenemode, gene
 				# universally split all gene IDs
 				if genesplit:
 					geneid = geneid.rsplit(genesplit,1)[0]
+				geneid = genenames.add(geneid)
+				if geneid == len(geneintervals): # new mrna, so add to each list
+					geneintervals.append([])
+					genestrand.append(None)
+					genescaffold.append(-1)
 
 				if feature=="transcript" or feature=="mRNA": # or (aqumode and feature=="gene"):
 					transcounter += 1
 					genestrand[geneid] = strand
-					genescaffold[geneid] = scaffold
+					genescaffold[geneid] = scaffoldnames.add(scaffold)
 				elif (feature=="exon" and not skipexons) or (keepcds and feature=="CDS"):
 					exoncounter += 1
 					boundaries = ( int(lsplits[3]), int(lsplits[4]) )
 					if nogenemode: # gtf contains only exon and CDS, so get gene info from each CDS
 						# strand and scaffold should be the same for each exon
 						genestrand[geneid] = strand
-						genescaffold[geneid] = scaffold
+						genescaffold[geneid] = scaffoldnames.add(scaffold)
 					geneintervals[geneid].append(boundaries)
 	sys.stderr.write("# Counted {} lines and {} comments  ".format(linecounter, commentlines) + time.asctime() + os.linesep)
 	if ignoredfeatures:
@@ -147,14 +165,18 @@ def gtf_to_intervals(gtffile, keepcds, skipexons, transdecoder, nogenemode, gene
 	if transcounter:
 		sys.stderr.write("# Counted {} exons for {} inferred transcripts\n".format(exoncounter, transcounter) )
 	else: # no mRNA or transcript features were given, count was 0
-		transcounter = len(genescaffold)
+		transcounter = sum(1 for scaffoldid in genescaffold if scaffoldid >= 0)
 		sys.stderr.write("# Counted {} exons for {} inferred transcripts\n".format(exoncounter, transcounter) )
 	if exoncounter==0:
 		sys.stderr.write("WARNING: NO suitable exons counted, check options -x or -G\n" )
-	return geneintervals, genestrand, genescaffold
-
-def parse_tabular_blast(blastfile, lengthcutoff, evaluecutoff, bitscutoff, maxtargets, programname, outputtype, report_percent, donamechop, is_swissprot, seqlengthdict, descdict, get_accession, geneintervals, genestrand, genescaffold, debugmode=False):
-	'''parse blast hits from tabular blast and write each hit independently to stdout as genome gff'''
+	if report is not None:
+		report.count("GFF lines", linecounter)
+		report.count("GFF features ignored", ignoredfeatures)
+		report.count("exons", exoncounter)
+	return geneintervals, genestrand, genescaffold, genenames, scaffoldnames
+
+def blast_hit_features(blastfile, lengthcutoff, evaluecutoff, bitscutoff, maxtargets, programname, outputtype, report_percent, donamechop, is_swissprot, seqlengthdict, descdict, get_accession, geneintervals, genestrand, genescaffold, genenames, scaffoldnames, debugmode=False, report=None):
+	'''parse blast hits from tabular blast and yield GffFeature of each hit and its parts in genome coordinates, using the lists and SymbolTables from gtf_to_intervals(), adding line and filter counts to RunReport report'''
 	querynamedict = defaultdict(int) # counter of unique queries
 	# count results to filter
 	shortRemovals = 0
@@ -168,7 +190,8 @@ def parse_tabular_blast(blastfile, lengthcutoff, evaluecutoff, bitscutoff, maxta
 	# count other general stats
 	intervalcounts = 0
 	backframecounts = 0
-	hitDictCounter = defaultdict(int)
+	subjectnames = SymbolTable()
+	hitDictCounter = [] # count of hits, indexed by subject ID
 	linecounter = 0
 	accession = None
 
@@ -182,13 +205,8 @@ def parse_tabular_blast(blastfile, lengthcutoff, evaluecutoff, bitscutoff, maxta
 		multiplier = 3
 
 
-	if blastfile.rsplit('.',1)[-1]=="gz": # autodetect gzip format
-		opentype = gzip.open
-		sys.stderr.write("# Starting BLAST parsing on {} as gzipped  ".format(blastfile) + time.asctime() + os.linesep)
-	else: # otherwise assume normal open for fasta format
-		opentype = open
-		sys.stderr.write("# Starting BLAST parsing on {}  ".format(blastfile) + time.asctime() + os.linesep)
-	for line in opentype(blastfile, 'r'):
+	sys.stderr.write("# Starting BLAST parsing on {}{}  ".format(blastfile, describe_input(blastfile)) + time.asctime() + os.linesep)
+	for line in open_input(blastfile):
 		line = line.strip()
 		if not line or line[0]=="#": # skip comment lines
 			continue # also catch for empty line, which would cause IndexError
@@ -231,7 +249,10 @@ def parse_tabular_blast(blastfile, lengthcutoff, evaluecutoff, bitscutoff, maxta
 			sseqid = sseqid.split("|")[2] # should change to TPC2B_HUMAN
 		else:
 			sseqid = sseqid.replace("|","")
-		hitDictCounter[sseqid] += 1
+		subjectid = subjectnames.add(sseqid)
+		if subjectid == len(hitDictCounter):
+			hitDictCounter.append(0)
+		hitDictCounter[subjectid] += 1
 
 		# skip if there are already enough targets, default is 10
 		# increment is several lines above, so must be greater than max
@@ -250,23 +271,25 @@ def parse_tabular_blast(blastfile, lengthcutoff, evaluecutoff, bitscutoff, maxta
 		hitstart = (hitstart - 1) * multiplier + 1
 		hitend = hitend * multiplier # end is necessarily the end of a codon
 		hitlength = abs(hitend - hitstart) + 1 # bases 1 to 6 should have length 6
-		scaffold = genescaffold.get(qseqid, None)
-		if scaffold is None:
+		geneid = genenames.get(qseqid)
+		scaffoldid = -1 if geneid is None else genescaffold[geneid]
+		if scaffoldid < 0:
 			missingscaffolds += 1
 			if missingscaffolds < 10:
 				sys.stderr.write("WARNING: cannot get scaffold for {}\n".format( qseqid ) )
 			elif missingscaffolds == 10:
 				sys.stderr.write("WARNING: cannot get scaffold for {}, will not print further warnings\n".format( qseqid ) )
 			continue
-		strand = genestrand.get(qseqid, None)
+		scaffold = scaffoldnames.names[scaffoldid]
+		strand = genestrand[geneid]
 		genomeintervals = [] # to have empty iterable
 		if backframe: # reassign strand if match is backwards
 			strand = "+" if strand=="-" else "-"
 		# convert transcript nucleotide to genomic nucleotide, and split at exon bounds
 		if strand=='+':
-			genomeintervals = get_intervals(geneintervals[qseqid], hitstart, hitlength, doreverse=False)
+			genomeintervals = get_intervals(geneintervals[geneid], hitstart, hitlength, doreverse=False)
 		elif strand=='-': # implies '-'
-			genomeintervals = get_intervals(geneintervals[qseqid], hitstart, hitlength, doreverse=True)
+			genomeintervals = get_intervals(geneintervals[geneid], hitstart, hitlength, doreverse=True)
 		elif strand=='.': # no strand is given by the input GFF
 			sys.stderr.write("WARNING: strand is undefined . for {} on {}\n".format(qseqid, scaffold) )
 			continue
@@ -298,28 +321,27 @@ def parse_tabular_blast(blastfile, lengthcutoff, evaluecutoff, bitscutoff, maxta
 		if report_percent: # show target as percent, like CALM1_HUMAN 2.6 98.0 +
 			S_env_start = float(lsplits[8]) * 100 / subjectlength
 			S_env_end = float(lsplits[9]) * 100 / subjectlength
-			parentattrs = "ID={0}.{1}.{2};Target={1} {3:.1f} {4:.1f} {5};same_sense={6}".format(qseqid, sseqid, hitDictCounter[sseqid], S_env_start, S_env_end, "-" if backframe else "+", "0" if backframe else "1")
+			parentattrs = "ID={0}.{1}.{2};Target={1} {3:.1f} {4:.1f} {5};same_sense={6}".format(qseqid, sseqid, hitDictCounter[subjectid], S_env_start, S_env_end, "-" if backframe else "+", "0" if backframe else "1")
 		else:
-			parentattrs = "ID={0}.{1}.{2};Target={1} {3} {4} {5};same_sense={6}".format(qseqid, sseqid, hitDictCounter[sseqid], lsplits[8], lsplits[9], "-" if backframe else "+", "0" if backframe else "1")
+			parentattrs = "ID={0}.{1}.{2};Target={1} {3} {4} {5};same_sense={6}".format(qseqid, sseqid, hitDictCounter[subjectid], lsplits[8], lsplits[9], "-" if backframe else "+", "0" if backframe else "1")
 		# add additional tags
 		if descdict: # if making the description tag
 			hitdescription = descdict.get(sseqid,"None")
 			parentattrs += ";Description={}".format(hitdescription)
 		if get_accession and accession is not None: # if adding accession
 			parentattrs += ";Accession={}".format(accession)
-		# final line to print
-		outline = "{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\t.\t{7}\n".format(scaffold, programname, outputtype, parentstart, parentend, bitscore, strand, parentattrs)
-		sys.stdout.write( outline )
+		# parent feature of the whole hit, score is kept as text, as for GffFeature read from a file
+		scoretext = str(bitscore)
+		yield GffFeature(scaffold, programname, outputtype, parentstart, parentend, scoretext, strand, ".", parentattrs)
 		# make child features for each interval
 		for interval in genomeintervals:
 		# thus ID appears as qseqid.sseqid.number, so avic1234.avGFP.1, and uses ID in most browsers
-			outline = "{0}\t{1}\tmatch_part\t{3}\t{4}\t{5}\t{6}\t.\tParent={7}.{8}.{9}\n".format(scaffold, programname, outputtype, interval[0], interval[1], bitscore, strand, qseqid, sseqid, hitDictCounter[sseqid] )
-			sys.stdout.write( outline )
+			yield GffFeature(scaffold, programname, "match_part", interval[0], interval[1], scoretext, strand, ".", "Parent={0}.{1}.{2}".format(qseqid, sseqid, hitDictCounter[subjectid]) )
 	sys.stderr.write("# Removed {} hits by shortness\n".format(shortRemovals) )
 	sys.stderr.write("# Removed {} hits by bitscore\n".format(bitsRemovals) )
 	sys.stderr.write("# Removed {} hits by evalue\n".format(evalueRemovals) )
 	sys.stderr.write("# Removed {} hits that exceeded query max\n".format(maxremovals) )
-	sys.stderr.write("# Found {} hits for {} queries  ".format(sum(hitDictCounter.values()), len(querynamedict) ) + time.asctime() + os.linesep)
+	sys.stderr.write("# Found {} hits for {} queries  ".format(sum(hitDictCounter), len(querynamedict) ) + time.asctime() + os.linesep)
 	if backframecounts:
 		sys.stderr.write("# {} hits are antisense  ".format(backframecounts) + time.asctime() + os.linesep)
 	if intervalcounts:
@@ -332,6 +354,18 @@ def parse_tabular_blast(blastfile, lengthcutoff, evaluecutoff, bitscutoff, maxta
 		sys.stderr.write("# WARNING: {} matches have hits extending beyond gene bounds  ".format(intervalproblems) + time.asctime() + os.linesep)
 	if duplicateintervals:
 		sys.stderr.write("# WARNING: {} matches have duplicate intervals  ".format(duplicateintervals) + time.asctime() + os.linesep)
+	if report is not None:
+		report.count("blast lines", linecounter)
+		report.count("hits removed by shortness", shortRemovals)
+		report.count("hits removed by bitscore", bitsRemovals)
+		report.count("hits removed by evalue", evalueRemovals)
+		report.count("hits removed over maximum per query", maxremovals)
+		report.count("hits with missing scaffold", missingscaffolds)
+		report.count("blast hits kept", sum(hitDictCounter) )
+
+def parse_tabular_blast(blastfile, lengthcutoff, evaluecutoff, bitscutoff, maxtargets, programname, outputtype, report_percent, donamechop, is_swissprot, seqlengthdict, descdict, get_accession, geneintervals, genestrand, genescaffold, genenames, scaffoldnames, debugmode=False, wayout=sys.stdout, report=None):
+	'''parse blast hits from tabular blast and write each hit independently to stdout as genome gff'''
+	write_features(blast_hit_features(blastfile, lengthcutoff, evaluecutoff, bitscutoff, maxtargets, programname, outputtype, report_percent, donamechop, is_swissprot, seqlengthdict, descdict, get_accession, geneintervals, genestrand, genescaffold, genenames, scaffoldnames, debugmode, report), wayout)
 	# NO RETURN
 
 def parse_swissprot_header(hitstring):
@@ -455,19 +489,54 @@ def main(argv, wayout):
 	parser.add_argument('-x','--cds-exons', action="store_true", help="use CDS features as exons")
 	parser.add_argument('-K','--skip-exons', action="store_true", help="skip exon features if exon and CDS are in the same file")
 	parser.add_argument('-v','--verbose', action="store_true", help="extra output")
+	parser.add_argument('--bgzip-out', help="write position-sorted, bgzipped GFF with tabix index to this file, instead of stdout")
+	parser.add_argument('--sort-lines', type=int, default=2000000, help="lines of --bgzip-out to sort in memory, more are sorted in temporary files [2000000]")
+	parser.add_argument('--temp-dir', help="directory for temporary sort files of --bgzip-out [system default]")
+	parser.add_argument('--jbrowse-out', help="write JBrowse NCList track to this directory, with one folder per scaffold, instead of stdout")
+	parser.add_argument('-o','--output', help="write GFF to this file instead of stdout, as BGZF if ending in .gz")
+	parser.add_argument('--buffer-size', type=int, default=1048576, help="characters of output to hold before each write [1048576]")
+	parser.add_argument('--report', help="write JSON report of time, counts and peak memory of each stage to this file")
 	args = parser.parse_args(argv)
+	report = RunReport("blast2genomegff.py", argv)
 
 	# read database, make a length dict, and possibly also a description dict
 	if args.database is not None and os.path.exists(args.database):
-		protlendb, descdict = make_seq_length_dict(args.database, args.swissprot, args.add_description)
+		with report.stage("read database"):
+			protlendb, descdict = make_seq_length_dict(args.database, args.swissprot, args.add_description)
+			report.count("database sequences", len(protlendb) )
 	else:
 		sys.exit("ERROR: cannot find database file -d {}, exiting".format(args.database) )
 
 	# read the GFF
-	geneintervals, genestrand, genescaffold =  gtf_to_intervals(args.genes, args.cds_exons, args.skip_exons, args.transdecoder, args.no_genes, args.gff_delimiter)
+	with report.stage("read GFF"):
+		geneintervals, genestrand, genescaffold, genenames, scaffoldnames = gtf_to_intervals(args.genes, args.cds_exons, args.skip_exons, args.transdecoder, args.no_genes, args.gff_delimiter, report)
+		report.count("transcripts", sum(1 for intervals in geneintervals if intervals) )
 
 	# read the blast output
-	parse_tabular_blast(args.blast, args.coverage_cutoff, args.evalue_cutoff, args.score_cutoff, args.max_targets, args.program, args.type, args.percent_target, args.blast_delimiter, args.swissprot, protlendb, descdict, args.add_accession, geneintervals, genestrand, genescaffold)
+	if sum(1 for outarg in (args.output, args.bgzip_out, args.jbrowse_out) if outarg) > 1:
+		sys.exit("ERROR: can only use one of -o, --bgzip-out and --jbrowse-out")
+	if args.bgzip_out:
+		from genomegtf.bgzf import SortedBgzfSink
+		wayout = SortedBgzfSink(args.bgzip_out, args.sort_lines, args.temp_dir)
+	elif args.jbrowse_out:
+		from genomegtf.jbrowse import NCListSink
+		wayout = NCListSink(args.jbrowse_out)
+	elif args.output:
+		wayout = open_output(args.output)
+	if not args.jbrowse_out: # NCListSink takes the GffFeature records directly, so needs no text buffer
+		# lines are joined and written in blocks, and -o is compressed on another thread
+		wayout = BufferedLineWriter(report.count_output(wayout), args.buffer_size, closeoutput=bool(args.output or args.bgzip_out))
+	with report.stage("convert blast hits"):
+		parse_tabular_blast(args.blast, args.coverage_cutoff, args.evalue_cutoff, args.score_cutoff, args.max_targets, args.program, args.type, args.percent_target, args.blast_delimiter, args.swissprot, protlendb, descdict, args.add_accession, geneintervals, genestrand, genescaffold, genenames, scaffoldnames, wayout=wayout, report=report)
+	if args.bgzip_out or args.jbrowse_out:
+		with report.stage("write sorted output"):
+			wayout.close()
+	else:
+		wayout.close()
+	if args.jbrowse_out:
+		report.count("lines written", wayout.featurecount)
+	if args.report:
+		report.write(args.report)
 
 if __name__ == "__main__":
-	main(sys.argv[1:],sys.stdout)
+	run_main(main, sys.argv[1:], sys.stdout)
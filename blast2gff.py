@@ -11,10 +11,14 @@
 # https://www.sanger.ac.uk/resources/software/gff/spec.html
 # http://www.sequenceontology.org/gff3.shtml
 
-'''blast2gff.py last modified 2019-10-04
+'''blast2gff.py last modified 2026-10-18
 
 blast2gff.py -b tblastn_output.tab > output.gff3
 
+    blast tables can be gzipped, bgzipped or zstd, or read from stdin with -b -
+
+tblastn -query refprots.fa -db target_genome.fa -outfmt 6 | blast2gff.py -b - > output.gff3
+
     change the second and third fields in the gff output with -p and -t
 
 blast2gff.py -b blastn_output.tab -p BLASTN -t EST_match > output.gff3
@@ -35,6 +39,8 @@ import os
 import argparse
 import time
 from collections import defaultdict
+from genomegtf.inputs import open_input, describe_input
+from genomegtf.profiling import run_main
 #
 ### BLAST OUTPUTS
 # default blastn or tblastn output for -outfmt 6 is printed tabular of:
@@ -74,21 +80,18 @@ from collections import defaultdict
 # to calculate identity % as on ncbi, subject length might have to be absolute value, and 1 must be added as the first base is position 1
 # however on ncbi it is calculated as identities / subject length
 
-def write_line(outlist, wayout):
-	outline = "{}\n".format( "\t".join(outlist) )
-	wayout.write(outline)
-
 def main(argv, wayout):
 	if not len(argv):
 		argv.append("-h")
 
 	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=__doc__)
-	parser.add_argument('-b','--blast', help="blast results file")
+	parser.add_argument('-b','--blast', help="blast results file, can be compressed, or - for stdin")
 	parser.add_argument('-p','--program', help="blast program for 2nd column in output [TBLASTN]", default="TBLASTN")
 	parser.add_argument('-t','--type', help="gff type or method [match_part]", default="match_part")
 	parser.add_argument('-e','--evalue-cutoff', type=float, help="evalue cutoff [1]", default=1.0)
 	parser.add_argument('-s','--score-cutoff', type=float, help="bitscore/length cutoff for filtering [0.1], use with -f", default=0.1)
 	parser.add_argument('-l','--length-cutoff', type=int, help="minimum match length cutoff for filtering [1]", default=1)
+	parser.add_argument('-B','--buffer-lines', type=int, default=50000, help="number of output lines to hold before each write [50000]")
 	parser.add_argument('-A','--augustus', action="store_true", help="print source information for AUGUSTUS hints")
 	parser.add_argument('-F','--filter', action="store_true", help="filter low quality matches, set value with -s")
 	parser.add_argument('-S','--swissprot', action="store_true", help="query sequences have swissprot headers")
@@ -103,63 +106,79 @@ def main(argv, wayout):
 	shorthits = 0
 
 	hitDictCounter = defaultdict(int)
-	sys.stderr.write("# Starting BLAST parsing on {}  ".format(args.blast) + time.asctime() + os.linesep)
-	for line in open(args.blast, 'r'):
+	cleannames = {} # key is raw query ID from blast, value is cleaned ID, so cleaning is done once per query
+	outlines = [] # buffer of output lines, written in blocks of --buffer-lines
+	blastfile = "-" if args.blast is None else args.blast # read from pipe if not given
+	sys.stderr.write("# Starting BLAST parsing on {}{}  ".format("stdin" if blastfile=="-" else blastfile, describe_input(blastfile)) + time.asctime() + os.linesep)
+	blasthandle = open_input(blastfile)
+	for line in blasthandle:
+		if not line or line[0]=="#": # skip comment lines
+			continue
 		linecounter += 1
-		line = line.strip()
-		lsplits = line.split("\t")
+		lsplits = line.rstrip().split("\t")
+		if len(lsplits) < 12: # also catch for empty line, which would cause IndexError
+			continue
 		# 0       1       2       3       4         5        6       7     8       9     10      11
-		qseqid, sseqid, pident, length, mismatch, gapopen, qstart, qend, sstart, send, evalue, bitscore = line.rstrip().split("\t")
-
-		# remove stray characters
-		if args.swissprot:
-		# blast outputs swissprot proteins as: sp|P0DI82|TPC2B_HUMAN
-			qseqid = qseqid.split("|")[2]
-		else:
-			qseqid = qseqid.replace("|","")
+		# qseqid, sseqid, pident, length, mismatch, gapopen, qstart, qend, sstart, send, evalue, bitscore
+
+		# hits are counted for every line, including filtered ones, so ID numbers are unaffected by filters
+		rawqseqid = lsplits[0]
+		qseqid = cleannames.get(rawqseqid, None)
+		if qseqid is None: # remove stray characters
+			if args.swissprot:
+			# blast outputs swissprot proteins as: sp|P0DI82|TPC2B_HUMAN
+				qseqid = rawqseqid.split("|")[2]
+			else:
+				qseqid = rawqseqid.replace("|","")
+			cleannames[rawqseqid] = qseqid
 		hitDictCounter[qseqid] += 1
-		# currently 'attributes' is only query id
-		# ID only appears to not work for visualization, as the gene should be the blast query
-		#attributes = "ID={}".format(qseqid)
-		if args.augustus:
-			attributes = "source=P;ID={0}.{1}-{2}".format(qseqid, qstart, qend)
-		else:
-			attributes = "ID={0}.{1}{2};Target={0} {3} {4}".format(qseqid, args.type, hitDictCounter[qseqid], qstart, qend)
-		# if verbose, display the current attributes format for debugging
-		if args.verbose and linecounter == 1:
-			sys.stderr.write( "{}\n".format(attributes) )
-
-		# convert strings of start and end to integers for calculations
-		isend = int(send)
-		isstart = int(sstart)
-		# as start must always be less or equal to end, reverse them for opposite strand hits
-		if isstart <= isend:
-			strand = "+"
-			outlist = [sseqid, args.program, args.type, sstart, send, bitscore, strand, ".", attributes]
+		# strands are also counted for every line, before filters
+		subjectstart, subjectend = int(lsplits[8]), int(lsplits[9])
+		if subjectstart <= subjectend:
 			plusstrand += 1
 		else:
-			strand = "-"
-			outlist = [sseqid, args.program, args.type, send, sstart, bitscore, strand, ".", attributes]
 			minusstrand += 1
 
+		# do all removals before any formatting
 		# if filtering, check if bits/length is above threshold
 		if args.filter:
-			fl = abs(isend-isstart)
-			nbs = float(bitscore)/fl
+			fl = abs(subjectend-subjectstart)
+			nbs = float(lsplits[11])/fl
 			if nbs < args.score_cutoff:
 				badhits += 1
 				continue
 		# check here for low evalues
-		if float(evalue) > args.evalue_cutoff:
+		if float(lsplits[10]) > args.evalue_cutoff:
 			badhits += 1
 			continue
 		# check for short matches
-		matchlength = int(length)
-		if matchlength < args.length_cutoff:
+		if int(lsplits[3]) < args.length_cutoff:
 			shorthits += 1
 			continue
+
+		sseqid, qstart, qend, sstart, send, bitscore = lsplits[1], lsplits[6], lsplits[7], lsplits[8], lsplits[9], lsplits[11]
+		# currently 'attributes' is only query id
+		# ID only appears to not work for visualization, as the gene should be the blast query
+		#attributes = "ID={}".format(qseqid)
+		if args.augustus:
+			attributes = "source=P;ID={0}.{1}-{2}".format(qseqid, qstart, qend)
+		else:
+			attributes = "ID={0}.{1}{2};Target={0} {3} {4}".format(qseqid, args.type, hitDictCounter[qseqid], qstart, qend)
+		# if verbose, display the current attributes format for debugging
+		if args.verbose and writecounter == 0:
+			sys.stderr.write( "{}\n".format(attributes) )
+
+		# as start must always be less or equal to end, reverse them for opposite strand hits
+		if subjectstart <= subjectend:
+			outlines.append("{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t+\t.\t{6}\n".format(sseqid, args.program, args.type, sstart, send, bitscore, attributes) )
+		else:
+			outlines.append("{0}\t{1}\t{2}\t{4}\t{3}\t{5}\t-\t.\t{6}\n".format(sseqid, args.program, args.type, sstart, send, bitscore, attributes) )
 		writecounter += 1
-		write_line(outlist, wayout)
+		if len(outlines) >= args.buffer_lines: # write out the whole block at once
+			wayout.write( "".join(outlines) )
+			outlines = []
+	if outlines: # write any remaining lines
+		wayout.write( "".join(outlines) )
 	sys.stderr.write("# Parsed {} lines  ".format( linecounter ) + time.asctime() + os.linesep)
 	sys.stderr.write("# Found {} forward and {} reverse hits\n".format(plusstrand, minusstrand) )
 	if shorthits:
@@ -169,4 +188,4 @@ def main(argv, wayout):
 	sys.stderr.write("# Wrote {} matches  ".format(writecounter) + time.asctime() + os.linesep)
 
 if __name__ == "__main__":
-	main(sys.argv[1:],sys.stdout)
+	run_main(main, sys.argv[1:], sys.stdout)
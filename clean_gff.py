@@ -1,7 +1,7 @@
 #! /usr/bin/env python
 # cleangff.py modified from reformatgmapgff.py
 
-'''clean_gff.py  last modified 2019-09-26
+'''clean_gff.py  last modified 2026-10-18
 
   operation will:
     remove comment lines
@@ -11,39 +11,138 @@
       five_prime_UTR, three_prime_UTR, CDS
 
 clean_gff.py gmap.gff > new.gff
+
+    input can be gzipped, bgzipped or zstd, or stdin as -, and output
+    is gzipped if -o ends with .gz
+    for large files, the input is split into chunks of -c MB
+    which are cleaned in -p processes, and written in order
+
+clean_gff.py gmap.gff.gz -p 8 -o new.gff.gz
 '''
 
 import sys
+import os
+import time
+import gzip
+import argparse
+from genomegtf.inputs import open_input, detect_compression
+from genomegtf.profiling import run_main
+
+def clean_lines(lines):
+	'''clean a list of gff lines, return a single string of output lines'''
+	outlines = []
+	for line in lines:
+		line = line.strip()
+		line = line.split("#")[0] # this should remove all in line comments
+		if line:
+			lsplits = line.split("\t")
+			if int(lsplits[3]) > int(lsplits[4]) and lsplits[6]=="-":
+				lsplits[3], lsplits[4] = lsplits[4], lsplits[3]
+			if lsplits[2]=="5'-UTR":
+				lsplits[2] = "five_prime_UTR"
+			elif lsplits[2]=="3'-UTR":
+				lsplits[2] = "three_prime_UTR"
+			elif lsplits[2]=="cds":
+				lsplits[2] = "CDS"
+			outlines.append("\t".join(lsplits))
+				# Name=comp12345 is always second position from gmap
+			#	trans_name = splits[8].split(";")[1].split("=")[1]
+			#	contig = splits[0]
+			#	target = "Target={}".format(contig)
+			#	tc = [contig, trans_name]
+			#	tc.extend(splits[2:])
+			#	print >> sys.stdout, "{};{}".format(line.rstrip(), target)
+	if outlines:
+		outlines.append("") # for final newline
+	return "\n".join(outlines)
+
+def get_byte_ranges(infile, chunksize):
+	'''return list of tuples of start and end bytes, split only at line breaks'''
+	filesize = os.path.getsize(infile)
+	byteranges = []
+	with open(infile,'rb') as ih:
+		chunkstart = 0
+		while chunkstart < filesize:
+			ih.seek(min(chunkstart + chunksize, filesize))
+			ih.readline() # move to the end of the current line
+			chunkend = min(ih.tell(), filesize)
+			byteranges.append( (chunkstart, chunkend) )
+			chunkstart = chunkend
+	return byteranges
+
+def iterate_line_chunks(infile, chunksize):
+	'''read compressed file or stdin, yield lists of lines of about chunksize bytes'''
+	with open_input(infile) as ih:
+		lines = ih.readlines(chunksize)
+		while lines:
+			yield lines
+			lines = ih.readlines(chunksize)
+
+worker_state = {}
+
+def init_clean_worker(infile, gzip_out):
+	worker_state["infile"] = infile
+	worker_state["gzip"] = gzip_out
+
+def finish_chunk(lines):
+	'''clean lines, return string, or compressed bytes as a separate gzip member'''
+	outtext = clean_lines(lines)
+	if worker_state["gzip"]:
+		return gzip.compress(outtext.encode(), compresslevel=6)
+	return outtext
+
+def clean_byte_range(byterange):
+	'''read and clean one chunk of the input file'''
+	chunkstart, chunkend = byterange
+	with open(worker_state["infile"],'rb') as ih:
+		ih.seek(chunkstart)
+		chunktext = ih.read(chunkend - chunkstart).decode()
+	return finish_chunk(chunktext.split("\n"))
+
+def main(argv, wayout):
+	if not len(argv):
+		argv.append("-h")
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=__doc__)
+	parser.add_argument('input', help="gff format file, can be compressed, or - for stdin")
+	# mode from older versions, as clean_gff.py gmap.gff n, which did nothing, kept so old commands still run
+	parser.add_argument('mode', nargs='?', help=argparse.SUPPRESS)
+	parser.add_argument('-n', dest='mode', action='store_const', const='n', help=argparse.SUPPRESS)
+	parser.add_argument('-c','--chunk-size', type=int, default=32, help="size of each chunk in MB [32]")
+	parser.add_argument('-o','--output', help="output file, gzipped if ending in .gz [stdout]")
+	parser.add_argument('-p','--processors', type=int, default=1, help="number of processes to clean chunks [1]")
+	args = parser.parse_args(argv)
+
+	infile = args.input
+	chunksize = args.chunk_size * 1000000
+	gzip_out = bool(args.output) and args.output.rsplit('.',1)[-1]=="gz"
+	sys.stderr.write("# Reformatting {}  ".format(infile) + time.asctime() + os.linesep)
+	if infile=="-" or detect_compression(infile): # cannot seek in gzip or stdin, so chunks are read here and sent to workers
+		chunkjobs = iterate_line_chunks(infile, chunksize)
+		chunkfunction = finish_chunk
+	else:
+		chunkjobs = get_byte_ranges(infile, chunksize)
+		chunkfunction = clean_byte_range
+	if args.processors > 1:
+		import multiprocessing # slow to import, so only when using several processes
+		workerpool = multiprocessing.Pool(args.processors, init_clean_worker, (infile, gzip_out))
+		# imap returns chunks in order of the file
+		cleanedchunks = workerpool.imap(chunkfunction, chunkjobs)
+	else:
+		init_clean_worker(infile, gzip_out)
+		cleanedchunks = map(chunkfunction, chunkjobs)
 
-if len(sys.argv) < 2:
-	sys.stderr.write( __doc__ )
-else:
-	infile = sys.argv[1]
-	mode = "n"
-	if len(sys.argv) > 2:
-		mode = sys.argv[2].replace("-","")
-	sys.stderr.write("# Reformatting {}\n".format(infile) )
-	with open(infile) as go:
-		for line in go:
-			line = line.strip()
-			line = line.split("#")[0] # this should remove all in line comments
-			if line:
-				lsplits = line.split("\t")
-				if int(lsplits[3]) > int(lsplits[4]) and lsplits[6]=="-":
-					lsplits[3], lsplits[4] = lsplits[4], lsplits[3]
-				if lsplits[2]=="5'-UTR":
-					lsplits[2] = "five_prime_UTR"
-				elif lsplits[2]=="3'-UTR":
-					lsplits[2] = "three_prime_UTR"
-				elif lsplits[2]=="cds":
-					lsplits[2] = "CDS"
-				sys.stdout.write("{}\n".format( "\t".join(lsplits) ) )
-					# Name=comp12345 is always second position from gmap
-				#	trans_name = splits[8].split(";")[1].split("=")[1]
-				#	contig = splits[0]
-				#	target = "Target={}".format(contig)
-				#	tc = [contig, trans_name]
-				#	tc.extend(splits[2:])
-				#	print >> sys.stdout, "{};{}".format(line.rstrip(), target)
-	sys.stderr.write("# Done reformatting {}\n".format(infile) )
+	if args.output: # bytes are written directly, gzip chunks are already compressed
+		outhandle = open(args.output,'wb')
+		for chunk in cleanedchunks:
+			outhandle.write(chunk if gzip_out else chunk.encode())
+		outhandle.close()
+	else:
+		for chunk in cleanedchunks:
+			wayout.write(chunk)
+	if args.processors > 1:
+		workerpool.close()
+		workerpool.join()
+	sys.stderr.write("# Done reformatting {}  ".format(infile) + time.asctime() + os.linesep)
 
+if __name__ == "__main__":
+	run_main(main, sys.argv[1:], sys.stdout)
@@ -3,37 +3,257 @@
 '''
 collate_features.py parent_features.gff child_features.gff > combined.gff
 
+    by default, all child features are kept in memory
+
+    IF BOTH FILES ARE SORTED THE SAME WAY, STREAM BOTH WITH -s
+    by ID (as with LC_ALL=C sort), or by scaffold then start position
+
+collate_features.py -s id parent_features.gff child_features.gff > combined.gff
+collate_features.py -s position parent_features.gff child_features.gff > combined.gff
+
+    FOR UNSORTED FILES TOO LARGE FOR MEMORY, SPLIT INTO TEMPORARY BUCKETS
+
+collate_features.py -b 64 parent_features.gff child_features.gff > combined.gff
+
+    all buckets are open at once only for the final merge, so -b is
+    lowered if it is above the limit of open files (ulimit -n)
+
 '''
 
 import sys
+import os
 import re
+import time
+import zlib
+import heapq
+import argparse
+import tempfile
+import resource
 from collections import defaultdict
+from genomegtf.inputs import open_input
+from genomegtf.profiling import run_main
 
-if len(sys.argv) < 2:
-	sys.stderr.write(__doc__)
-else:
-	subfeature_dict = defaultdict(list)
-	for line in open(sys.argv[2],'r'):
-		line = line.strip()
-		if line:
-			lsplits = line.split("\t")
-			attributes = lsplits[8]
-			if attributes.find("Parent")==0: # gff3 format but no ID
-				geneid = re.search('Parent=([\w.|-]+)', attributes).group(1)
-				subfeature_dict[geneid].append(line)
-			else:
-				sys.stderr.write("WARNING CANNOT FIND PARENT ID FOR {}\n".format(attributes) )
+parent_id_re = re.compile(r'Parent=([\w.|-]+)')
+gene_id_re = re.compile(r'ID=([\w.|-]+)')
 
-	for line in open(sys.argv[1],'r'):
+BUCKET_BUFFER_LINES = 262144 # lines held for all buckets before appending each to its file
+OPEN_FILE_MARGIN = 16 # open files kept for the inputs, output and python itself when merging buckets
+
+def iterate_features(featurefile, idtag, idpattern):
+	'''read gff lines, yield tuples of ID, scaffold, start, end, and line, for features where attributes start with idtag'''
+	for line in open_input(featurefile):
 		line = line.strip()
 		if line:
 			lsplits = line.split("\t")
 			attributes = lsplits[8]
-			if attributes.find("ID")==0: # gff3 format but no ID
-				geneid = re.search('ID=([\w.|-]+)', attributes).group(1)
-				sys.stdout.write( line + os.linesep )
-				for outline in subfeature_dict.get(geneid):
-					sys.stdout.write( outline + os.linesep )
+			if attributes.find(idtag)==0: # gff3 format but no ID
+				geneid = idpattern.search(attributes).group(1)
+				yield geneid, lsplits[0], int(lsplits[3]), int(lsplits[4]), line
 			else:
 				sys.stderr.write("WARNING CANNOT FIND PARENT ID FOR {}\n".format(attributes) )
 
+def iterate_parents(parentfile):
+	return iterate_features(parentfile, "ID", gene_id_re)
+
+def iterate_children(childfile):
+	return iterate_features(childfile, "Parent", parent_id_re)
+
+def collate_in_memory(parentfile, childfile):
+	'''load all child features into a dict, yield tuples of parent line and list of child lines'''
+	subfeature_dict = defaultdict(list)
+	for geneid, scaffold, start, end, line in iterate_children(childfile):
+		subfeature_dict[geneid].append(line)
+	for geneid, scaffold, start, end, line in iterate_parents(parentfile):
+		yield line, subfeature_dict.get(geneid, [])
+
+def collate_sorted_by_id(parentfile, childfile):
+	'''merge join of parents and children both sorted by ID, yield tuples of parent line and list of child lines'''
+	children = iterate_children(childfile)
+	nextchild = next(children, None)
+	lastparentid, lastchildid = "", ""
+	for geneid, scaffold, start, end, line in iterate_parents(parentfile):
+		if geneid < lastparentid:
+			sys.exit("ERROR: parent ID {} comes after {}, file is not sorted by ID".format(geneid, lastparentid) )
+		lastparentid = geneid
+		childlines = []
+		while nextchild is not None and nextchild[0] <= geneid:
+			if nextchild[0] < lastchildid:
+				sys.exit("ERROR: child parent ID {} comes after {}, file is not sorted by ID".format(nextchild[0], lastchildid) )
+			lastchildid = nextchild[0]
+			if nextchild[0]==geneid:
+				childlines.append(nextchild[4])
+			nextchild = next(children, None)
+		yield line, childlines
+
+def parent_scaffold_order(parentfile):
+	'''read only the scaffold column of the parents, return dict where key is scaffold and value is its order in the file'''
+	scaffoldorder = {}
+	lastscaffold = None
+	for line in open_input(parentfile):
+		scaffold = line.split("\t",1)[0].strip()
+		if not scaffold or scaffold[0]=="#" or scaffold==lastscaffold:
+			continue
+		if scaffold in scaffoldorder:
+			sys.exit("ERROR: parent scaffold {} appears twice, file is not sorted by position".format(scaffold) )
+		scaffoldorder[scaffold] = len(scaffoldorder)
+		lastscaffold = scaffold
+	return scaffoldorder
+
+def collate_sorted_by_position(parentfile, childfile):
+	'''stream parents and children both sorted by scaffold then start, yield tuples of parent line and list of child lines'''
+	if parentfile=="-":
+		sys.exit("ERROR: -s position reads the parent file twice, cannot use stdin for parents")
+	# scaffold order of the parents is needed to know if a child scaffold will still come, or never
+	scaffoldorder = parent_scaffold_order(parentfile)
+	children = iterate_children(childfile)
+	nextchild = next(children, None)
+	pending = defaultdict(list) # key is parent ID, value is child lines read ahead, from overlapping parents
+	currentscaffold, currentrank = None, -1
+	lastchildscaffold, lastchildrank = None, -1
+	noparentcount = 0 # children on scaffolds without parents, or after the last parent of their scaffold
+	for geneid, scaffold, start, end, line in iterate_parents(parentfile):
+		if scaffold != currentscaffold:
+			currentscaffold, currentrank = scaffold, scaffoldorder[scaffold]
+			pending.clear() # children left from the last scaffold have no parent
+		# all children of this parent must start before the parent ends
+		while nextchild is not None:
+			childscaffold, childstart = nextchild[1], nextchild[2]
+			childrank = scaffoldorder.get(childscaffold)
+			if childrank is None: # no parent on this scaffold at all
+				noparentcount += 1
+				nextchild = next(children, None)
+				continue
+			if childscaffold != lastchildscaffold:
+				if childrank < lastchildrank:
+					sys.exit("ERROR: child scaffold {} comes after {}, in a different order than the parent file".format(childscaffold, lastchildscaffold) )
+				lastchildscaffold, lastchildrank = childscaffold, childrank
+			if childrank < currentrank: # parents of this scaffold are finished
+				noparentcount += 1
+				nextchild = next(children, None)
+				continue
+			if childrank > currentrank or childstart > end: # wait for later parents
+				break
+			pending[nextchild[0]].append(nextchild[4])
+			nextchild = next(children, None)
+		yield line, pending.pop(geneid, [])
+	while nextchild is not None: # after the last parent
+		noparentcount += 1
+		nextchild = next(children, None)
+	if noparentcount:
+		sys.stderr.write("# Skipped {} child features with no parent on their scaffold  ".format(noparentcount) + time.asctime() + os.linesep)
+
+class BucketFiles:
+	'''lines split into numbered files in a folder, held in memory and appended in blocks, so only one file is open at a time'''
+	def __init__(self, folder, name, bucketcount):
+		self.filenames = [os.path.join(folder, "{}.{}".format(name, i)) for i in range(bucketcount)]
+		self.buffers = [[] for i in range(bucketcount)]
+		self.buffered = 0
+	def add(self, bucket, line):
+		self.buffers[bucket].append(line)
+		self.buffered += 1
+		if self.buffered >= BUCKET_BUFFER_LINES:
+			self.flush()
+	def flush(self):
+		for filename, buffer in zip(self.filenames, self.buffers):
+			if buffer:
+				with open(filename, 'a') as bucketfile:
+					bucketfile.write("".join(buffer))
+				del buffer[:]
+		self.buffered = 0
+	def read(self, bucket):
+		'''yield lines of one bucket, then remove the file'''
+		filename = self.filenames[bucket]
+		if not os.path.isfile(filename): # nothing was added to this bucket
+			return
+		with open(filename, 'r') as bucketfile:
+			for bucketline in bucketfile:
+				yield bucketline
+		os.remove(filename)
+
+def limit_bucket_count(bucketcount):
+	'''return bucketcount, or fewer if all buckets would be more files than can be open at once for the final merge'''
+	softlimit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+	if softlimit==resource.RLIM_INFINITY or bucketcount <= softlimit - OPEN_FILE_MARGIN:
+		return bucketcount
+	maxbuckets = max(1, softlimit - OPEN_FILE_MARGIN)
+	sys.stderr.write("WARNING: limit of {} open files is too low for {} buckets, using {}\n".format(softlimit, bucketcount, maxbuckets) )
+	return maxbuckets
+
+def collate_by_buckets(parentfile, childfile, bucketcount, tempdir):
+	'''split parents and children into buckets by ID on disk, yield tuples of parent line and list of child lines in parent order'''
+	bucketcount = limit_bucket_count(bucketcount)
+	with tempfile.TemporaryDirectory(prefix="collate_", dir=tempdir) as bucketfolder:
+		childbuckets = BucketFiles(bucketfolder, "children", bucketcount)
+		for geneid, scaffold, start, end, line in iterate_children(childfile):
+			childbuckets.add(zlib.crc32(geneid.encode()) % bucketcount, "{}\t{}\n".format(geneid, line) )
+		childbuckets.flush()
+		parentbuckets = BucketFiles(bucketfolder, "parents", bucketcount)
+		for linenumber, (geneid, scaffold, start, end, line) in enumerate(iterate_parents(parentfile)):
+			parentbuckets.add(zlib.crc32(geneid.encode()) % bucketcount, "{}\t{}\t{}\n".format(linenumber, geneid, line) )
+		parentbuckets.flush()
+		sys.stderr.write("# Split features into {} buckets  ".format(bucketcount) + time.asctime() + os.linesep)
+		# join each bucket separately, where each output line is tagged with the parent line number
+		joinedfiles = []
+		for bucket in range(bucketcount):
+			subfeature_dict = defaultdict(list)
+			for bucketline in childbuckets.read(bucket):
+				geneid, line = bucketline.rstrip("\n").split("\t",1)
+				subfeature_dict[geneid].append(line)
+			joinedfile = os.path.join(bucketfolder, "joined.{}".format(bucket))
+			with open(joinedfile, 'w') as joinedbucket:
+				for bucketline in parentbuckets.read(bucket):
+					linenumber, geneid, line = bucketline.rstrip("\n").split("\t",2)
+					joinedbucket.write("{}\t{}\n".format(linenumber, line) )
+					for childline in subfeature_dict.get(geneid, []):
+						joinedbucket.write("{}\t{}\n".format(linenumber, childline) )
+			joinedfiles.append(joinedfile)
+		def read_bucket(joinedbucket):
+			for bucketline in joinedbucket:
+				linenumber, line = bucketline.rstrip("\n").split("\t",1)
+				yield int(linenumber), line
+		# only the merge needs all buckets open at once
+		joinedbuckets = [open(joinedfile, 'r') for joinedfile in joinedfiles]
+		try:
+			# the first line for each number is the parent
+			currentnumber = -1
+			parentline, childlines = None, []
+			for linenumber, line in heapq.merge(*[read_bucket(jb) for jb in joinedbuckets], key=lambda x: x[0]):
+				if linenumber != currentnumber:
+					if parentline is not None:
+						yield parentline, childlines
+					currentnumber = linenumber
+					parentline, childlines = line, []
+				else:
+					childlines.append(line)
+			if parentline is not None:
+				yield parentline, childlines
+		finally:
+			for joinedbucket in joinedbuckets:
+				joinedbucket.close()
+
+def main(argv, wayout):
+	if not len(argv):
+		argv.append("-h")
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=__doc__)
+	parser.add_argument('parents', help="gff format file of parent features, with ID=")
+	parser.add_argument('children', help="gff format file of child features, with Parent=")
+	parser.add_argument('-s','--sorted', choices=["id","position"], help="both files are sorted by ID or by position, stream both")
+	parser.add_argument('-b','--buckets', type=int, help="split unsorted files into this many temporary buckets")
+	parser.add_argument('-T','--temp-dir', help="directory for temporary bucket files [system default]")
+	args = parser.parse_args(argv)
+
+	if args.sorted=="id":
+		collated = collate_sorted_by_id(args.parents, args.children)
+	elif args.sorted=="position":
+		collated = collate_sorted_by_position(args.parents, args.children)
+	elif args.buckets:
+		collated = collate_by_buckets(args.parents, args.children, args.buckets, args.temp_dir)
+	else:
+		collated = collate_in_memory(args.parents, args.children)
+	for line, childlines in collated:
+		wayout.write( line + os.linesep )
+		for outline in childlines:
+			wayout.write( outline + os.linesep )
+
+if __name__ == "__main__":
+	run_main(main, sys.argv[1:], sys.stdout)
@@ -0,0 +1,6 @@
+'''genomegtf  last modified 2026-10-18
+    shared input and output layers for the genomeGTFtools scripts
+
+    the scripts in the main folder import from here, so it must stay
+    in the same folder as the scripts
+'''
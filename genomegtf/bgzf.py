@@ -0,0 +1,275 @@
+'''genomegtf/bgzf.py  last modified 2026-10-18
+    position-sorted, bgzipped GFF output with a tabix index
+
+    any script that writes GFF lines to wayout can instead write to
+    a SortedBgzfSink, which sorts by scaffold then start position,
+    writes BGZF blocks, and builds the .tbi index in the same pass
+    if any position is beyond 2^29, a .csi index with more levels is
+    made instead, from the same pass, and an old index of the other
+    type is removed
+
+    lines are sorted in memory, or if there are more than max_lines,
+    sorted in chunks in temporary files in tempdir and then merged,
+    which scripts set with --sort-lines and --temp-dir
+
+    the output can be used by JBrowse or other tools as:
+tabix output.gff.gz scaffold_1:10000-20000
+'''
+
+import sys
+import os
+import time
+import zlib
+import heapq
+import struct
+import tempfile
+
+# each block holds at most 64kb, htslib uses 0xff00 so compressed data always fits
+BGZF_BLOCK_SIZE = 0xff00
+BGZF_EOF = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+TBI_MIN_SHIFT = 14 # linear index and smallest bins are 16kb
+TBI_DEPTH = 5 # 5 levels of bins covers 2^29 bases
+
+def compress_block(data, level=6):
+	'''compress bytes as one BGZF block, return bytes of the block'''
+	compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+	cdata = compressor.compress(data) + compressor.flush()
+	# header with extra field BC giving total block size minus 1
+	header = struct.pack("<4BI2BH2BHH", 0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6, 66, 67, 2, len(cdata) + 25)
+	return header + cdata + struct.pack("<II", zlib.crc32(data), len(data))
+
+class BgzfWriter:
+	'''write BGZF blocks to a binary file, and give virtual offsets of the current position'''
+	def __init__(self, filehandle, level=6):
+		self.handle = filehandle
+		self.level = level
+		self.blockaddress = 0 # compressed offset of the start of the current block
+		self.buffer = bytearray()
+	def tell(self):
+		'''return virtual offset, as compressed offset of the block shifted by 16, plus offset in the block'''
+		return (self.blockaddress << 16) | len(self.buffer)
+	def write(self, data):
+		self.buffer.extend(data)
+		while len(self.buffer) >= BGZF_BLOCK_SIZE:
+			self.flush_block(BGZF_BLOCK_SIZE)
+	def flush_block(self, size):
+		block = compress_block(bytes(self.buffer[:size]), self.level)
+		self.handle.write(block)
+		self.blockaddress += len(block)
+		del self.buffer[:size]
+	def close(self):
+		while self.buffer:
+			self.flush_block(min(len(self.buffer), BGZF_BLOCK_SIZE))
+		self.handle.write(BGZF_EOF)
+		self.handle.close()
+
+def reg2bin(beg, end, min_shift, depth):
+	'''return bin number for 0-based half-open interval, as hts_reg2bin from htslib'''
+	return level_to_bin(reg2level(beg, end, min_shift), depth)
+
+def reg2level(beg, end, min_shift):
+	'''return tuple of levels above the smallest bins and index of the smallest bin that holds the 0-based half-open interval, for any depth'''
+	end -= 1
+	levelsup, shift = 0, min_shift
+	while beg >> shift != end >> shift:
+		levelsup += 1
+		shift += 3
+	return levelsup, beg >> shift
+
+def level_to_bin(binlevel, depth):
+	'''return bin number for a tuple from reg2level() in an index of depth levels, or bin 0 if it is above all levels'''
+	levelsup, binindex = binlevel
+	if levelsup >= depth:
+		return 0
+	level = depth - levelsup
+	return ((1 << level*3) - 1) // 7 + binindex
+
+class TabixIndexer:
+	'''collect bins, chunks and linear index for each scaffold, in the order written
+
+	bins are kept by level and index from reg2level(), so the depth of the index
+	can be chosen after all records are added, as tbi if it fits 2^29, or csi
+	'''
+	def __init__(self, min_shift=TBI_MIN_SHIFT):
+		self.min_shift = min_shift
+		self.names = []
+		self.bins = [] # for each scaffold, dict where key is tuple from reg2level() and value is list of [start, end] chunks
+		self.linear = [] # for each scaffold, list of the first virtual offset in each window
+		self.maxend = 0
+	def add(self, seqname, beg, end, vstart, vend):
+		'''add one record, as 0-based half-open interval, with the virtual offsets of the start and end of the line'''
+		if not self.names or self.names[-1]!=seqname:
+			self.names.append(seqname)
+			self.bins.append({})
+			self.linear.append([])
+		end = max(end, beg+1)
+		if end > self.maxend:
+			self.maxend = end
+		chunks = self.bins[-1].setdefault(reg2level(beg, end, self.min_shift), [])
+		if chunks and chunks[-1][1] >> 16 == vstart >> 16: # merge with previous chunk in the same block
+			chunks[-1][1] = vend
+		else:
+			chunks.append([vstart, vend])
+		linear = self.linear[-1]
+		lastwindow = (end - 1) >> self.min_shift
+		if len(linear) <= lastwindow:
+			linear.extend([None] * (lastwindow + 1 - len(linear)) )
+		for window in range(beg >> self.min_shift, lastwindow+1):
+			if linear[window] is None:
+				linear[window] = vstart
+	def index_depth(self):
+		'''return number of levels needed for the largest position, which is TBI_DEPTH if it can be a tbi index'''
+		depth = TBI_DEPTH
+		while self.maxend >= (1 << (self.min_shift + 3*depth)):
+			depth += 1
+		return depth
+	def depth_bins(self, bins, depth):
+		'''return dict where key is bin number for depth and value is list of chunks, where all levels above depth are joined in bin 0'''
+		depthbins = {}
+		for binlevel, chunks in bins.items():
+			depthbins.setdefault(level_to_bin(binlevel, depth), []).extend(chunks)
+		if 0 in depthbins: # chunks from several levels, so merge again in order of the file
+			mergedchunks = []
+			for chunk in sorted(depthbins[0]):
+				if mergedchunks and mergedchunks[-1][1] >> 16 == chunk[0] >> 16:
+					mergedchunks[-1][1] = chunk[1]
+				else:
+					mergedchunks.append(list(chunk))
+			depthbins[0] = mergedchunks
+		return depthbins
+	def tabix_header(self):
+		'''return bytes of tabix settings for GFF, as tabix -p gff'''
+		names = b"".join(name.encode() + b"\0" for name in self.names)
+		# format 0 is generic, columns are 1-based, meta character is #, no lines skipped
+		return struct.pack("<7i", 0, 1, 4, 5, ord("#"), 0, len(names)) + names
+	def filled_linear(self, linear):
+		'''return linear index where empty windows take the offset of the previous window'''
+		filled = []
+		lastoffset = next((voffset for voffset in linear if voffset is not None), 0)
+		for voffset in linear:
+			lastoffset = voffset if voffset is not None else lastoffset
+			filled.append(lastoffset)
+		return filled
+	def bin_first_window(self, binnumber, depth):
+		'''return index of the first window of the linear index inside a bin, as hts_bin_bot from htslib'''
+		level, parent = 0, binnumber
+		while parent:
+			level += 1
+			parent = (parent - 1) >> 3
+		return (binnumber - ((1 << 3*level) - 1) // 7) << (depth - level) * 3
+	def to_tbi(self):
+		'''return bytes of .tbi index, before BGZF compression'''
+		parts = [b"TBI\1", struct.pack("<i", len(self.names)), self.tabix_header()]
+		for bins, linear in zip(self.bins, self.linear):
+			depthbins = self.depth_bins(bins, TBI_DEPTH)
+			parts.append(struct.pack("<i", len(depthbins)) )
+			for binnumber, chunks in depthbins.items():
+				parts.append(struct.pack("<Ii", binnumber, len(chunks)) )
+				parts.extend(struct.pack("<QQ", *chunk) for chunk in chunks)
+			filled = self.filled_linear(linear)
+			parts.append(struct.pack("<i", len(filled)) + struct.pack("<{}Q".format(len(filled)), *filled) )
+		return b"".join(parts)
+	def to_csi(self, depth=None):
+		'''return bytes of .csi index, before BGZF compression, with enough levels for the largest position if depth is not given'''
+		if depth is None:
+			depth = self.index_depth()
+		auxdata = self.tabix_header()
+		parts = [b"CSI\1", struct.pack("<3i", self.min_shift, depth, len(auxdata)), auxdata, struct.pack("<i", len(self.names))]
+		for bins, linear in zip(self.bins, self.linear):
+			# csi has no linear index, instead each bin has the lowest offset of any line overlapping it
+			filled = self.filled_linear(linear)
+			depthbins = self.depth_bins(bins, depth)
+			parts.append(struct.pack("<i", len(depthbins)) )
+			for binnumber, chunks in depthbins.items():
+				firstwindow = self.bin_first_window(binnumber, depth)
+				loffset = filled[firstwindow] if firstwindow < len(filled) else 0
+				parts.append(struct.pack("<IQi", binnumber, loffset, len(chunks)) )
+				parts.extend(struct.pack("<QQ", *chunk) for chunk in chunks)
+		return b"".join(parts)
+
+def gff_sort_key(line):
+	'''return tuple of scaffold and start position for a GFF line'''
+	lsplits = line.split("\t",5)
+	return lsplits[0], int(lsplits[3])
+
+class SortedBgzfSink:
+	'''file-like object for GFF text, which is sorted, bgzipped and indexed on close()'''
+	def __init__(self, filename, max_lines=2000000, tempdir=None):
+		self.filename = filename
+		self.max_lines = max_lines
+		self.tempdir = tempdir
+		self.partial = "" # text after the last line break, until the rest of the line is written
+		self.headerlines = [] # comment lines, which are written first
+		self.records = [] # tuples of scaffold, start, line number, line
+		self.chunkfiles = []
+		self.linecount = 0
+	def write(self, text):
+		lines = (self.partial + text).split("\n")
+		self.partial = lines.pop()
+		for line in lines:
+			self.add_line(line.rstrip("\r"))
+	def add_line(self, line):
+		if not line:
+			return
+		if line[0]=="#":
+			self.headerlines.append(line)
+			return
+		scaffold, start = gff_sort_key(line)
+		self.records.append( (scaffold, start, self.linecount, line) )
+		self.linecount += 1
+		if len(self.records) >= self.max_lines:
+			self.write_chunk()
+	def write_chunk(self):
+		'''sort records in memory and write them to a temporary file'''
+		self.records.sort()
+		chunkfile = tempfile.TemporaryFile(mode='w+', dir=self.tempdir)
+		chunkfile.write("".join("{}\t{}\n".format(linenumber, line) for scaffold, start, linenumber, line in self.records) )
+		chunkfile.seek(0)
+		self.chunkfiles.append(chunkfile)
+		self.records = []
+	def flush(self):
+		pass
+	def sorted_records(self):
+		'''return iterator of sorted tuples, from memory or by merging temporary files'''
+		if not self.chunkfiles:
+			self.records.sort()
+			return iter(self.records)
+		if self.records:
+			self.write_chunk()
+		sys.stderr.write("# Merging {} sorted chunks for {}  ".format(len(self.chunkfiles), self.filename) + time.asctime() + os.linesep)
+		def read_chunk(chunkfile):
+			for chunkline in chunkfile:
+				linenumber, line = chunkline.rstrip("\n").split("\t",1)
+				scaffold, start = gff_sort_key(line)
+				yield scaffold, start, int(linenumber), line
+		return heapq.merge(*[read_chunk(cf) for cf in self.chunkfiles])
+	def close(self):
+		if self.partial:
+			self.add_line(self.partial.rstrip("\r"))
+			self.partial = ""
+		sys.stderr.write("# Sorting and compressing {} lines to {}  ".format(self.linecount, self.filename) + time.asctime() + os.linesep)
+		writer = BgzfWriter(open(self.filename, 'wb'))
+		for line in self.headerlines:
+			writer.write(line.encode() + b"\n")
+		tabixindex = TabixIndexer()
+		for scaffold, start, linenumber, line in self.sorted_records():
+			end = int(line.split("\t",5)[4])
+			vstart = writer.tell()
+			writer.write(line.encode() + b"\n")
+			# positions in the index are 0-based half-open, so the start is 1 less
+			tabixindex.add(scaffold, start-1, end, vstart, writer.tell())
+		writer.close()
+		for chunkfile in self.chunkfiles:
+			chunkfile.close()
+		# tbi can only index positions up to 2^29, otherwise use csi with more levels
+		if tabixindex.index_depth()==TBI_DEPTH:
+			indexfile, indexdata, staleindex = self.filename + ".tbi", tabixindex.to_tbi(), self.filename + ".csi"
+		else:
+			indexfile, indexdata, staleindex = self.filename + ".csi", tabixindex.to_csi(), self.filename + ".tbi"
+		indexwriter = BgzfWriter(open(indexfile, 'wb'))
+		indexwriter.write(indexdata)
+		indexwriter.close()
+		# an index of the other type from an earlier run would no longer match this file
+		if os.path.isfile(staleindex):
+			os.remove(staleindex)
+		sys.stderr.write("# Wrote index {}  ".format(indexfile) + time.asctime() + os.linesep)
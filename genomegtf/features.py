@@ -0,0 +1,111 @@
+'''genomegtf/features.py  last modified 2026-10-18
+    GFF feature records, to pass features between tools without text
+
+    each tool has generator functions that take or yield GffFeature,
+    and the script only reads the input and writes the output, so
+    several steps can run in one process, such as pfam2gff.py then
+    pfamgff2clans.py, from the main folder of genomeGTFtools:
+
+import sys
+import pfam2gff, pfamgff2clans
+from genomegtf.features import write_features
+pfamtoclan, pfamannot = pfamgff2clans.parse_clan_links("Pfam-A.clans.tsv")
+domains = pfam2gff.pfam_domain_features("prots.pfam.tab", 0.1, 0.3, "hmmscan", "PFAM", None)
+domainsbyprot = pfamgff2clans.merge_pfam_domains(domains, 0.67)
+write_features(pfamgff2clans.clan_domain_features(domainsbyprot, "hmmscan", pfamtoclan, pfamannot), sys.stdout)
+
+    start and end are integers, other columns are kept as given, so
+    writing a feature that was read gives back the same line, and the
+    score is always text, as in the file
+
+    to keep many features in memory, each feature uses __slots__, and
+    scaffold, source and type are interned when read, so all features
+    on one scaffold share one string, and attributes are only decoded
+    when asked for with get_attribute()
+'''
+
+import sys
+from sys import intern
+from genomegtf.inputs import open_input
+
+class GffFeature:
+	'''one GFF feature, start and end are int, attributes are the text of column 9, or None if missing or not kept'''
+	__slots__ = ("seqid", "source", "type", "start", "end", "score", "strand", "phase", "attributes")
+	def __init__(self, seqid, source, featuretype, start, end, score=".", strand=".", phase=".", attributes=None):
+		self.seqid = seqid
+		self.source = source
+		self.type = featuretype
+		self.start = start
+		self.end = end
+		self.score = score
+		self.strand = strand
+		self.phase = phase
+		self.attributes = attributes
+	@classmethod
+	def from_line(cls, line):
+		'''return GffFeature from one line of GFF without line break, or None if there are fewer than 8 columns'''
+		try: # unpacking is faster than indexing the list
+			seqid, source, featuretype, start, end, score, strand, phase, attributes = line.split("\t", 8)
+		except ValueError: # fewer than 9 columns
+			lsplits = line.split("\t")
+			if len(lsplits) < 8:
+				return None
+			seqid, source, featuretype, start, end, score, strand, phase = lsplits
+			attributes = None
+		return cls(intern(seqid), intern(source), intern(featuretype), int(start), int(end), score, strand, phase, attributes)
+	def get_attribute(self, key):
+		'''return value of key from GFF3 key=value or GTF key "value" attributes, or None if not found'''
+		if not self.attributes:
+			return None
+		for attr in self.attributes.split(";"):
+			attr = attr.strip()
+			if attr.startswith(key + "="):
+				return attr[len(key)+1:]
+			if attr.startswith(key + " "):
+				return attr[len(key)+1:].strip().strip('"')
+		return None
+	def to_line(self):
+		'''return GFF line without line break'''
+		# % is faster than format for many short fields
+		if self.attributes is None:
+			return "%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s" % (self.seqid, self.source, self.type, self.start, self.end, self.score, self.strand, self.phase)
+		return "%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s" % (self.seqid, self.source, self.type, self.start, self.end, self.score, self.strand, self.phase, self.attributes)
+	__str__ = to_line
+	def __repr__(self):
+		return "GffFeature({!r})".format(self.to_line())
+
+def read_gff(gfffile):
+	'''yield GffFeature for each line of a GFF file, which can be compressed, or - for stdin, skipping comments and short lines'''
+	gffhandle = open_input(gfffile)
+	for line in gffhandle:
+		line = line.strip()
+		if not line or line[0]=="#":
+			continue
+		try: # same as GffFeature.from_line, without the extra call for each line
+			seqid, source, featuretype, start, end, score, strand, phase, attributes = line.split("\t", 8)
+		except ValueError:
+			feature = GffFeature.from_line(line)
+			if feature is not None:
+				yield feature
+			continue
+		yield GffFeature(intern(seqid), intern(source), intern(featuretype), int(start), int(end), score, strand, phase, attributes)
+	if gffhandle is not sys.stdin:
+		gffhandle.close()
+
+def write_features(features, wayout, batchsize=10000):
+	'''write each GffFeature as one line to wayout, joined in batches of batchsize lines, or give them to wayout.add_features() if it has one, as NCListSink, return the number written'''
+	add_features = getattr(wayout, "add_features", None)
+	if add_features is not None: # takes the records directly, without text
+		return add_features(features)
+	writecount = 0
+	lines = []
+	for feature in features:
+		lines.append(feature.to_line())
+		if len(lines) >= batchsize:
+			wayout.write("\n".join(lines) + "\n")
+			writecount += len(lines)
+			lines = []
+	if lines:
+		wayout.write("\n".join(lines) + "\n")
+		writecount += len(lines)
+	return writecount
@@ -0,0 +1,292 @@
+'''genomegtf/inputs.py  last modified 2026-10-18
+    one opener for all input files, plain, gzip, BGZF, zstd, or stdin
+
+    every parser reads through open_input(), which detects the format
+    from the first bytes of the file, not the file name, so:
+microsynteny.py -b blast.tab.gz ...
+microsynteny.py -b blast.tab.zst ...
+zcat blast.tab.gz | microsynteny.py -b - ...
+    all read the same table
+
+    when there is more than one CPU, decompression runs on other threads
+    while the script parses lines, and BGZF files, as made by bgzip or
+    by --bgzip-out, are split into blocks that are decompressed in
+    parallel, so the large gzipped blast tables should be made with:
+bgzip -@ 8 blast.tab
+
+    zstd needs the python module zstandard, or the zstd program
+'''
+
+import sys
+import os
+import io
+import zlib
+import struct
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+BGZF_BATCH_BLOCKS = 64 # blocks decompressed by one task, about 4Mb of text
+READ_SIZE = 1048576 # bytes of compressed input read at a time
+
+def default_threads():
+	'''return number of CPUs this process may use, up to 8'''
+	try:
+		cpus = len(os.sched_getaffinity(0))
+	except AttributeError: # not on linux
+		cpus = os.cpu_count() or 1
+	return min(cpus, 8)
+
+def raw_input_handle(filename):
+	'''return binary handle of filename, or of stdin for -'''
+	if filename=="-":
+		return sys.stdin.buffer
+	return open(filename, 'rb')
+
+def detect_compression(filename):
+	'''return "bgzf", "gzip" or "zstd" from the first bytes of filename, or None for uncompressed'''
+	if filename=="-":
+		firstbytes = sys.stdin.buffer.peek(18)[:18] # peek does not remove bytes from stdin
+	else:
+		with open(filename, 'rb') as fh:
+			firstbytes = fh.read(18)
+	if firstbytes[:2]==GZIP_MAGIC:
+		# BGZF is gzip with an extra field BC of the block size, see the SAM spec
+		if len(firstbytes)==18 and firstbytes[3] & 4 and firstbytes[12:14]==b"BC":
+			return "bgzf"
+		return "gzip"
+	if firstbytes[:4]==ZSTD_MAGIC:
+		return "zstd"
+	return None
+
+def describe_input(filename, threads=None):
+	'''return text for stderr messages, as " as gzipped", or "" for uncompressed files'''
+	compression = detect_compression(filename)
+	if compression is None:
+		return ""
+	if threads is None:
+		threads = default_threads()
+	description = {"bgzf":" as bgzipped", "gzip":" as gzipped", "zstd":" as zstd"}[compression]
+	if compression=="bgzf" and threads > 1:
+		description += " with {} threads".format(threads)
+	return description
+
+def open_input(filename, mode='rt', threads=None):
+	'''return handle to read filename, or stdin for -, decompressing gzip, BGZF and zstd, as text for rt or bytes for rb'''
+	if threads is None:
+		threads = default_threads()
+	compression = detect_compression(filename)
+	if compression is None:
+		if filename=="-":
+			return sys.stdin if mode=='rt' else sys.stdin.buffer
+		return open(filename, mode)
+	if compression!="zstd" and threads < 2: # with one CPU, threads would only add overhead
+		import gzip
+		binaryhandle = gzip.GzipFile(fileobj=sys.stdin.buffer, mode='rb') if filename=="-" else gzip.open(filename, 'rb')
+		return binaryhandle if mode=='rb' else io.TextIOWrapper(binaryhandle)
+	rawhandle = raw_input_handle(filename)
+	if compression=="zstd":
+		binaryhandle = open_zstd(rawhandle, filename)
+	elif compression=="bgzf":
+		binaryhandle = io.BufferedReader(ChunkReader(iterate_bgzf_batches(rawhandle, threads), rawhandle, queuesize=threads*2), READ_SIZE)
+	else: # single gzip stream cannot be split, but can be decompressed on another thread
+		binaryhandle = io.BufferedReader(ChunkReader(iterate_gzip_chunks(rawhandle), rawhandle), READ_SIZE)
+	if mode=='rb':
+		return binaryhandle
+	return io.TextIOWrapper(binaryhandle)
+
+class ChunkReader(io.RawIOBase):
+	'''binary stream of the chunks from an iterator, which runs on a background thread
+
+	chunks can be bytes, or futures of bytes, which are waited for in order
+	'''
+	def __init__(self, chunks, rawhandle, queuesize=4):
+		import queue
+		import threading
+		self.rawhandle = rawhandle
+		self.chunkqueue = queue.Queue(queuesize)
+		self.queuefull = queue.Full
+		self.current = memoryview(b"")
+		self.finished = False
+		self.stopped = threading.Event()
+		self.thread = threading.Thread(target=self.fill_queue, args=(chunks,), daemon=True)
+		self.thread.start()
+	def fill_queue(self, chunks):
+		try:
+			for chunk in chunks:
+				if not self.put(chunk):
+					return
+		except Exception as readerror: # raised again in the main thread
+			self.put(readerror)
+			return
+		finally: # if closed early, also stop the thread pool
+			chunks.close()
+		self.put(None) # end of input
+	def put(self, item):
+		'''put item in the queue unless the reader was closed, return False if closed'''
+		while not self.stopped.is_set():
+			try:
+				self.chunkqueue.put(item, timeout=0.1)
+				return True
+			except self.queuefull: # check again if closed
+				pass
+		return False
+	def readable(self):
+		return True
+	def readinto(self, buffer):
+		while not len(self.current):
+			if self.finished:
+				return 0
+			chunk = self.chunkqueue.get()
+			if chunk is None:
+				self.finished = True
+				return 0
+			if isinstance(chunk, Exception):
+				self.finished = True
+				raise chunk
+			if not isinstance(chunk, bytes): # a future from the thread pool
+				chunk = chunk.result()
+			self.current = memoryview(chunk)
+		size = min(len(buffer), len(self.current))
+		buffer[:size] = self.current[:size]
+		self.current = self.current[size:]
+		return size
+	def close(self):
+		if not self.closed:
+			self.stopped.set()
+			self.thread.join()
+			if self.rawhandle is not sys.stdin.buffer:
+				self.rawhandle.close()
+		super().close()
+
+def iterate_gzip_chunks(rawhandle):
+	'''yield decompressed bytes of a gzip file, which can have several members, as from bgzip or pigz'''
+	decompressor = zlib.decompressobj(31) # 31 is gzip header and trailer, and checks the crc
+	memberstarted = False
+	while True:
+		cdata = rawhandle.read(READ_SIZE)
+		if not cdata:
+			break
+		while cdata:
+			if not memberstarted:
+				cdata = cdata.lstrip(b"\x00") # some tools pad the end with zeroes
+				if not cdata:
+					break
+				memberstarted = True
+			data = decompressor.decompress(cdata)
+			if data:
+				yield data
+			cdata = b""
+			if decompressor.eof: # start of the next member
+				cdata = decompressor.unused_data
+				decompressor = zlib.decompressobj(31)
+				memberstarted = False
+	if memberstarted:
+		raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+
+def read_bgzf_block(rawhandle):
+	'''return tuple of compressed data, crc and length of the next BGZF block, or None at the end'''
+	header = rawhandle.read(12)
+	if not header:
+		return None
+	if len(header) < 12 or header[:2]!=GZIP_MAGIC or not header[3] & 4:
+		raise OSError("not a BGZF block, file may be truncated or a mix of gzip and BGZF")
+	extralength = struct.unpack("<H", header[10:12])[0]
+	extra = rawhandle.read(extralength)
+	blocksize = None
+	offset = 0
+	while offset + 4 <= len(extra): # find subfield BC among any others
+		subfieldlength = struct.unpack("<H", extra[offset+2:offset+4])[0]
+		if extra[offset:offset+2]==b"BC" and subfieldlength==2:
+			blocksize = struct.unpack("<H", extra[offset+4:offset+6])[0] + 1
+		offset += 4 + subfieldlength
+	if blocksize is None:
+		raise OSError("not a BGZF block, file may be a mix of gzip and BGZF")
+	rest = rawhandle.read(blocksize - 12 - extralength)
+	if len(rest) < blocksize - 12 - extralength:
+		raise EOFError("BGZF file ended in the middle of a block")
+	crc, datalength = struct.unpack("<II", rest[-8:])
+	return rest[:-8], crc, datalength
+
+def inflate_bgzf_blocks(blocks):
+	'''return decompressed bytes of a list of BGZF blocks, checking the crc of each'''
+	chunks = []
+	for cdata, crc, datalength in blocks:
+		data = zlib.decompress(cdata, -15) # zlib releases the GIL, so blocks are decompressed in parallel
+		if len(data)!=datalength or zlib.crc32(data)!=crc:
+			raise OSError("BGZF block failed crc check")
+		chunks.append(data)
+	return b"".join(chunks)
+
+def iterate_bgzf_batches(rawhandle, threads):
+	'''read BGZF blocks and yield futures of decompressed batches, in order of the file'''
+	from concurrent.futures import ThreadPoolExecutor
+	with ThreadPoolExecutor(threads) as threadpool:
+		batch = []
+		block = read_bgzf_block(rawhandle)
+		while block is not None:
+			batch.append(block)
+			if len(batch)==BGZF_BATCH_BLOCKS:
+				yield threadpool.submit(inflate_bgzf_blocks, batch)
+				batch = []
+			block = read_bgzf_block(rawhandle)
+		if batch:
+			yield threadpool.submit(inflate_bgzf_blocks, batch)
+
+def open_zstd(rawhandle, filename):
+	'''return binary handle of decompressed zstd, using module zstandard, or the zstd program'''
+	try:
+		import zstandard
+		return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(rawhandle, read_across_frames=True, closefd=True), READ_SIZE)
+	except ImportError:
+		pass
+	import shutil
+	if shutil.which("zstd") is None:
+		sys.exit("ERROR: cannot read zstd file {}, install python module zstandard or program zstd".format(filename) )
+	import subprocess
+	if filename=="-": # start of stdin was already read by peek, so copy bytes from python
+		import threading
+		zstdcall = subprocess.Popen(["zstd", "-dc"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+		threading.Thread(target=copy_to_pipe, args=(rawhandle, zstdcall.stdin), daemon=True).start()
+	else:
+		rawhandle.close()
+		zstdcall = subprocess.Popen(["zstd", "-dc", filename], stdout=subprocess.PIPE)
+	return io.BufferedReader(ProcessReader(zstdcall, "zstd", filename), READ_SIZE)
+
+class ProcessReader(io.RawIOBase):
+	'''binary stream of the output of a subprocess, which raises OSError at the end if the program failed, so truncated or corrupt input is not read as partial input'''
+	def __init__(self, process, programname, filename):
+		self.process = process
+		self.programname = programname
+		self.filename = filename
+		self.finished = False
+	def readable(self):
+		return True
+	def readinto(self, buffer):
+		if self.finished:
+			return 0
+		size = self.process.stdout.readinto(buffer)
+		if not size: # end of output, so check the exit status
+			self.finished = True
+			returncode = self.process.wait()
+			if returncode:
+				raise OSError("{} failed with exit status {} on {}, file may be truncated or corrupt".format(self.programname, returncode, self.filename) )
+		return size
+	def close(self):
+		if not self.closed:
+			self.process.stdout.close()
+			if not self.finished: # closed before the end, so the program is not needed
+				self.process.kill()
+			self.process.wait()
+		super().close()
+
+def copy_to_pipe(rawhandle, pipe):
+	'''copy all bytes from rawhandle to pipe, then close the pipe'''
+	try:
+		cdata = rawhandle.read(READ_SIZE)
+		while cdata:
+			pipe.write(cdata)
+			cdata = rawhandle.read(READ_SIZE)
+	except BrokenPipeError: # zstd stopped early
+		pass
+	finally:
+		pipe.close()
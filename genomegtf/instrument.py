@@ -0,0 +1,88 @@
+'''genomegtf/instrument.py  last modified 2026-10-18
+    timing, counters and peak memory for each stage of a script
+
+    a RunReport collects the time of each stage, counts of lines read,
+    hits filtered and features written, and the peak memory, and then
+    can be written as a JSON file next to the output, such as:
+
+report = RunReport("microsynteny.py", argv)
+with report.stage("read blast"):
+	blastdict = parse_tabular_blast(...)
+	report.count("blast queries", len(blastdict))
+wayout = report.count_output(wayout)
+...
+report.write("microsynteny.report.json")
+
+    counts during a stage are kept for that stage, and as totals
+    rates are given for each stage as counts per second
+'''
+
+import sys
+import os
+import time
+import resource
+from collections import Counter
+from contextlib import contextmanager
+
+def peak_rss_kb():
+	'''return peak resident memory of this process in kb'''
+	maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return maxrss // 1024 if sys.platform=="darwin" else maxrss # darwin gives bytes
+
+class CountingWriter:
+	'''file-like object that counts lines written to the wrapped output'''
+	def __init__(self, wayout, report, countname):
+		self.wayout = wayout
+		self.report = report
+		self.countname = countname
+	def write(self, text):
+		self.report.count(self.countname, text.count("\n"))
+		return self.wayout.write(text)
+	def __getattr__(self, name): # flush, close and others go to the wrapped output
+		return getattr(self.wayout, name)
+
+class RunReport:
+	'''collects stages and counters of one run, written as JSON by write()'''
+	def __init__(self, program, argv=None):
+		self.program = program
+		self.argv = list(argv) if argv is not None else sys.argv[1:]
+		self.starttime = time.time()
+		self.startcpu = time.process_time()
+		self.stages = []
+		self.counters = Counter()
+		self.stagecounters = None # counter of the current stage
+	@contextmanager
+	def stage(self, name):
+		'''context manager to time one stage, counts inside the stage are kept for the stage'''
+		outercounters = self.stagecounters
+		self.stagecounters = Counter()
+		starttime, startcpu = time.time(), time.process_time()
+		try:
+			yield self
+		finally:
+			seconds = time.time() - starttime
+			stagecounts = self.stagecounters
+			self.stagecounters = outercounters
+			self.stages.append( {"name":name, "seconds":round(seconds, 4),
+				"cpu_seconds":round(time.process_time() - startcpu, 4), "peak_rss_kb":peak_rss_kb(),
+				"counters":dict(stagecounts),
+				"per_second":{k:round(v / seconds, 1) for k, v in stagecounts.items()} if seconds > 0 else {} } )
+	def count(self, name, n=1):
+		'''add n to counter name, for the current stage and the total'''
+		self.counters[name] += n
+		if self.stagecounters is not None:
+			self.stagecounters[name] += n
+	def count_output(self, wayout, countname="lines written"):
+		'''return output wrapped to count lines written'''
+		return CountingWriter(wayout, self, countname)
+	def summary(self):
+		'''return dict of the whole run'''
+		return {"program":self.program, "arguments":self.argv, "pid":os.getpid(),
+			"start":time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.starttime)),
+			"seconds":round(time.time() - self.starttime, 4), "cpu_seconds":round(time.process_time() - self.startcpu, 4),
+			"peak_rss_kb":peak_rss_kb(), "stages":self.stages, "counters":dict(self.counters) }
+	def write(self, filename):
+		import json # only imported when writing, to keep startup fast
+		with open(filename, 'w') as rh:
+			json.dump(self.summary(), rh, indent=1)
+		sys.stderr.write("# Wrote run report to {}  ".format(filename) + time.asctime() + os.linesep)
@@ -0,0 +1,260 @@
+'''genomegtf/jbrowse.py  last modified 2026-10-18
+    JBrowse 1 NCList track output, without flatfile-to-json.pl
+
+    any script that writes GFF3 lines to wayout can instead write to
+    an NCListSink, which collects features, joins children to parents
+    by ID and Parent, and on close() writes one folder per scaffold
+    containing trackData.json, lazy-loaded lf-N.json feature chunks
+    and hist-N-N.json feature density histograms
+
+    scripts that make GffFeature records pass them to add_features(),
+    usually through write_features(), so the features are not formatted
+    as text only to be split and parsed again
+
+    the output folder should be inside the tracks folder of the jbrowse
+    data, then the trackList.json entry is set up as:
+      "storeClass" : "JBrowse/Store/SeqFeature/NCList",
+      "urlTemplate" : "tracks/PFAM/{refseq}/trackData.json"
+'''
+
+import sys
+import os
+import time
+import json
+
+# histogram bin sizes, same as used by flatfile-to-json.pl
+HIST_MULTIPLES = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000]
+HIST_CHUNK_SIZE = 10000
+BASE_ATTRIBUTES = ["Start", "End", "Strand", "Source", "Phase", "Type", "Score"]
+LAZY_ATTRIBUTES = ["Start", "End", "Chunk"]
+STRAND_CODES = {"+":1, "-":-1}
+
+def parse_score(score):
+	'''return GFF score as int or float, or None if missing'''
+	if score==".":
+		return None
+	try:
+		return int(score)
+	except ValueError:
+		return float(score)
+
+def parse_attributes(attributes):
+	'''return list of tuples of key and value from GFF3 or GTF attributes'''
+	attrlist = []
+	for attr in attributes.split(";"):
+		attr = attr.strip()
+		if not attr:
+			continue
+		if attr.find("=") > 0: # GFF3 as ID=gene1
+			key, value = attr.split("=",1)
+		else: # GTF as gene_id "gene1"
+			key, value = (attr.split(" ",1) + [""])[:2]
+			value = value.strip().strip('"')
+		attrlist.append( (key, value) )
+	return attrlist
+
+class FeatureRecord:
+	'''one GFF feature, and any subfeatures joined by Parent'''
+	__slots__ = ("start", "end", "strand", "source", "phase", "type", "score", "attributes", "subfeatures")
+	def __init__(self, lsplits):
+		self.start = int(lsplits[3]) - 1 # JBrowse uses 0-based starts
+		self.end = int(lsplits[4])
+		self.strand = STRAND_CODES.get(lsplits[6], 0)
+		self.source = lsplits[1]
+		self.phase = None if lsplits[7]=="." else int(lsplits[7])
+		self.type = lsplits[2]
+		self.score = parse_score(lsplits[5])
+		self.attributes = parse_attributes(lsplits[8]) if len(lsplits) > 8 else []
+		self.subfeatures = []
+	@classmethod
+	def from_feature(cls, feature):
+		'''return FeatureRecord from a GffFeature, without formatting it as text'''
+		record = cls.__new__(cls)
+		record.start = feature.start - 1
+		record.end = feature.end
+		record.strand = STRAND_CODES.get(feature.strand, 0)
+		record.source = feature.source
+		record.phase = None if feature.phase=="." else int(feature.phase)
+		record.type = feature.type
+		record.score = parse_score(feature.score)
+		record.attributes = parse_attributes(feature.attributes) if feature.attributes else []
+		record.subfeatures = []
+		return record
+
+class ClassTable:
+	'''array representation classes for one trackData.json, one per set of attributes'''
+	def __init__(self):
+		self.classes = []
+		self.class_index = {} # key is tuple of attribute names, value is index in classes
+	def get_index(self, attributes, is_array=None):
+		key = tuple(attributes)
+		index = self.class_index.get(key)
+		if index is None:
+			index = len(self.classes)
+			self.class_index[key] = index
+			self.classes.append( {"attributes":list(attributes), "isArrayAttr":is_array or {}} )
+		return index
+
+def feature_to_array(record, classtable):
+	'''convert FeatureRecord to JBrowse array, recursively for subfeatures'''
+	attrnames = list(BASE_ATTRIBUTES)
+	values = [record.start, record.end, record.strand, record.source, record.phase, record.type, record.score]
+	for key, value in record.attributes:
+		attrname = key.lower().capitalize() # as ID to Id, flatfile-to-json does the same
+		if key=="Parent" or attrname in attrnames:
+			continue
+		attrnames.append(attrname)
+		values.append(value)
+	if record.subfeatures:
+		attrnames.append("Subfeatures")
+		values.append( [feature_to_array(sub, classtable) for sub in sorted(record.subfeatures, key=lambda x: (x.start, -x.end))] )
+		classindex = classtable.get_index(attrnames, {"Subfeatures":1})
+	else:
+		classindex = classtable.get_index(attrnames)
+	return [classindex] + values
+
+def make_nclist(arrays):
+	'''nest arrays sorted by start then reverse end, return top level list, contained features go in Sublist'''
+	toplist = []
+	stack = [] # arrays that can still contain the next one, as tuples of end and sublist
+	for array in arrays:
+		while stack and stack[-1][0] < array[2]:
+			stack.pop()
+		if stack:
+			stack[-1][1].append(array)
+		else:
+			toplist.append(array)
+		sublist = []
+		stack.append( (array[2], sublist) )
+		array.append( {"Sublist":sublist} ) # ad hoc attribute after the class attributes
+	# remove empty sublists, meaning features that contain nothing
+	for array in arrays:
+		if not array[-1]["Sublist"]:
+			array.pop()
+	return toplist
+
+def make_histograms(arrays, refend):
+	'''count features per bin at several bin sizes, return list of tuples of bases per bin and list of counts'''
+	histbinbases = HIST_MULTIPLES[0]
+	histbinthreshold = refend * 2.5 / len(arrays)
+	for multiple in HIST_MULTIPLES:
+		histbinbases = multiple
+		if multiple > histbinthreshold:
+			break
+	histograms = []
+	for multiple in HIST_MULTIPLES:
+		binbases = histbinbases * multiple
+		histograms.append( (binbases, [0] * (refend // binbases + 1) ) )
+		if binbases * 100 > refend: # cut off at 100 bins
+			break
+	for array in arrays:
+		start = max(0, min(array[1], refend))
+		end = min(array[2], refend)
+		for binbases, counts in histograms:
+			for binnumber in range(start // binbases, end // binbases + 1):
+				counts[binnumber] += 1
+	return histograms
+
+def write_json(filename, data):
+	with open(filename, 'w') as jf:
+		json.dump(data, jf, separators=(',',':'))
+
+class NCListSink:
+	'''file-like object for GFF3 text or GffFeature, which are written as JBrowse NCList track folders on close()'''
+	def __init__(self, trackdir, chunk_bytes=200000):
+		self.trackdir = trackdir
+		self.chunk_bytes = chunk_bytes
+		self.partial = "" # text after the last line break, until the rest of the line is written
+		self.toplevel = {} # key is scaffold, value is list of FeatureRecord without parents
+		self.features_by_id = {} # key is ID, value is FeatureRecord
+		self.orphans = [] # tuples of scaffold, parent ID and FeatureRecord, where the parent was not yet seen
+		self.featurecount = 0
+	def write(self, text):
+		lines = (self.partial + text).split("\n")
+		self.partial = lines.pop()
+		for line in lines:
+			self.add_line(line.rstrip("\r"))
+	def add_line(self, line):
+		if not line or line[0]=="#":
+			return
+		lsplits = line.split("\t")
+		if len(lsplits) < 8:
+			return
+		self.add_record(lsplits[0], FeatureRecord(lsplits))
+	def add_features(self, features):
+		'''add each GffFeature, return the number added'''
+		startcount = self.featurecount
+		for feature in features:
+			self.add_record(feature.seqid, FeatureRecord.from_feature(feature))
+		return self.featurecount - startcount
+	def add_record(self, scaffold, record):
+		self.featurecount += 1
+		attrdict = dict(record.attributes)
+		featureid = attrdict.get("ID")
+		if featureid is not None:
+			self.features_by_id[featureid] = record
+		parentid = attrdict.get("Parent")
+		if parentid is None:
+			self.toplevel.setdefault(scaffold, []).append(record)
+		else:
+			parentid = parentid.split(",")[0] # only the first of several parents
+			parent = self.features_by_id.get(parentid)
+			if parent is None:
+				self.orphans.append( (scaffold, parentid, record) )
+			else:
+				parent.subfeatures.append(record)
+	def flush(self):
+		pass
+	def close(self):
+		if self.partial:
+			self.add_line(self.partial.rstrip("\r"))
+			self.partial = ""
+		for scaffold, parentid, record in self.orphans:
+			parent = self.features_by_id.get(parentid)
+			if parent is None: # parent never appeared, so treat as top level
+				self.toplevel.setdefault(scaffold, []).append(record)
+			else:
+				parent.subfeatures.append(record)
+		self.features_by_id, self.orphans = {}, []
+		sys.stderr.write("# Writing {} features on {} scaffolds to JBrowse track {}  ".format(self.featurecount, len(self.toplevel), self.trackdir) + time.asctime() + os.linesep)
+		for scaffold in sorted(self.toplevel):
+			self.write_refseq(scaffold, self.toplevel[scaffold])
+		self.toplevel = {}
+	def write_refseq(self, scaffold, records):
+		'''write trackData.json, feature chunks and histograms for one scaffold'''
+		refseqdir = os.path.join(self.trackdir, scaffold)
+		if not os.path.isdir(refseqdir):
+			os.makedirs(refseqdir)
+		classtable = ClassTable()
+		records.sort(key=lambda x: (x.start, -x.end))
+		arrays = [feature_to_array(record, classtable) for record in records]
+		refend = max(array[2] for array in arrays)
+		histograms = make_histograms(arrays, refend)
+		lazyclass = classtable.get_index(LAZY_ATTRIBUTES, {"Sublist":1})
+
+		# split features in order into chunks, each chunk is nested separately and loaded when needed
+		lazyarrays = []
+		chunkarrays, chunkbytes = [], 0
+		for array in arrays + [None]:
+			if chunkarrays and (array is None or chunkbytes >= self.chunk_bytes):
+				chunknumber = len(lazyarrays)
+				lazyarrays.append( [lazyclass, chunkarrays[0][1], max(a[2] for a in chunkarrays), chunknumber] )
+				write_json(os.path.join(refseqdir, "lf-{}.json".format(chunknumber)), make_nclist(chunkarrays) )
+				chunkarrays, chunkbytes = [], 0
+			if array is not None:
+				chunkarrays.append(array)
+				chunkbytes += len(json.dumps(array, separators=(',',':')))
+
+		histmeta, histstats = [], []
+		for binbases, counts in histograms:
+			for chunknumber, chunkstart in enumerate(range(0, len(counts), HIST_CHUNK_SIZE)):
+				write_json(os.path.join(refseqdir, "hist-{}-{}.json".format(binbases, chunknumber)), counts[chunkstart:chunkstart+HIST_CHUNK_SIZE] )
+			histmeta.append( {"basesPerBin":str(binbases), "arrayParams":{"length":len(counts), "urlTemplate":"hist-{}-{{Chunk}}.json".format(binbases), "chunkSize":HIST_CHUNK_SIZE} } )
+			histstats.append( {"basesPerBin":str(binbases), "max":max(counts), "mean":sum(counts)*1.0/len(counts)} )
+
+		trackdata = {"featureCount":len(arrays), "formatVersion":1,
+			"histograms":{"meta":histmeta, "stats":histstats},
+			"intervals":{"classes":classtable.classes, "count":len(arrays), "lazyClass":lazyclass,
+				"maxEnd":refend, "minStart":arrays[0][1],
+				"nclist":make_nclist(lazyarrays), "urlTemplate":"lf-{Chunk}.json"} }
+		write_json(os.path.join(refseqdir, "trackData.json"), trackdata)
@@ -0,0 +1,110 @@
+'''genomegtf/outputs.py  last modified 2026-10-18
+    buffered output, and compressed output on a background thread
+
+    scripts write each line to a BufferedLineWriter, which only keeps
+    the text in a list, and joins and writes it to the real output once
+    there are at least --buffer-size characters, so the output sees
+    few large writes instead of one for each line:
+
+wayout = BufferedLineWriter(wayout, 1048576)
+for feature in features:
+	wayout.write(feature.to_line() + "\\n")
+wayout.close()
+
+    output files from -o that end in .gz are written as BGZF blocks,
+    the same as bgzip, so they can be read by zcat, and read in parallel
+    by open_input(), and when there is more than one CPU the compression
+    runs on a background thread while the script formats the next lines
+'''
+
+import sys
+from genomegtf.inputs import default_threads
+
+BUFFER_SIZE = 1048576 # characters held before each write
+QUEUE_CHUNKS = 8 # buffers waiting to be compressed, before the script waits
+
+class BufferedLineWriter:
+	'''file-like object that holds written text, and writes it to the wrapped output in blocks of at least buffersize characters'''
+	def __init__(self, wayout, buffersize=BUFFER_SIZE, closeoutput=False):
+		self.wayout = wayout
+		self.buffersize = buffersize
+		self.closeoutput = closeoutput # otherwise only flushed, as for stdout
+		self.pieces = []
+		self.size = 0
+	def write(self, text):
+		self.pieces.append(text)
+		self.size += len(text)
+		if self.size >= self.buffersize:
+			self.write_block()
+		return len(text)
+	def writelines(self, lines):
+		for line in lines:
+			self.write(line)
+	def write_block(self):
+		if self.pieces:
+			self.wayout.write("".join(self.pieces))
+			self.pieces = []
+			self.size = 0
+	def flush(self):
+		self.write_block()
+		self.wayout.flush()
+	def close(self):
+		self.write_block()
+		if self.closeoutput:
+			self.wayout.close()
+		else:
+			self.wayout.flush()
+
+class CompressedWriter:
+	'''file-like object for text, which is written to filename as BGZF, compressed on a background thread if threads is more than 1'''
+	def __init__(self, filename, threads=None, level=6):
+		from genomegtf.bgzf import BgzfWriter
+		self.bgzfwriter = BgzfWriter(open(filename, 'wb'), level)
+		if threads is None:
+			threads = default_threads()
+		self.chunkqueue = None
+		self.error = None
+		if threads > 1:
+			import queue
+			import threading
+			self.chunkqueue = queue.Queue(QUEUE_CHUNKS)
+			self.thread = threading.Thread(target=self.compress_queue, daemon=True)
+			self.thread.start()
+	def compress_queue(self):
+		'''compress bytes from the queue until None, keeping any error to raise in the main thread'''
+		data = self.chunkqueue.get()
+		while data is not None:
+			if self.error is None: # after an error, the queue is still emptied so the main thread does not wait
+				try:
+					self.bgzfwriter.write(data)
+				except Exception as writeerror:
+					self.error = writeerror
+			data = self.chunkqueue.get()
+	def raise_error(self):
+		if self.error is not None:
+			writeerror, self.error = self.error, None
+			raise writeerror
+	def write(self, text):
+		if self.chunkqueue is None:
+			self.bgzfwriter.write(text.encode())
+		else:
+			self.raise_error()
+			self.chunkqueue.put(text.encode()) # zlib releases the GIL, so this overlaps with formatting
+		return len(text)
+	def flush(self):
+		pass
+	def close(self):
+		if self.chunkqueue is not None:
+			self.chunkqueue.put(None)
+			self.thread.join()
+			self.chunkqueue = None
+			if self.error is not None:
+				self.bgzfwriter.handle.close()
+				self.raise_error()
+		self.bgzfwriter.close()
+
+def open_output(filename, threads=None):
+	'''return text handle to write filename, compressed as BGZF if the name ends in .gz'''
+	if filename.endswith(".gz"):
+		return CompressedWriter(filename, threads)
+	return open(filename, 'w')
@@ -0,0 +1,160 @@
+'''genomegtf/profiling.py  last modified 2026-10-18
+    opt-in profiling of any script, without editing the script
+
+    each script runs main() through run_main(), which removes these
+    options from the arguments before main() sees them:
+
+  --profile FILE            run main() in cProfile, write pstats to FILE
+  --profile-stacks FILE     sample the stack of main() and write
+                            collapsed stacks to FILE, as for flamegraph.pl
+  --profile-interval MS     milliseconds between stack samples [5]
+  --profile-calls NAMES     comma separated functions to count calls and
+                            time, as synteny_walk,get_intervals
+
+    for example:
+microsynteny.py -b blast.tab -q query.gff -d db.gff --profile ms.pstats > ms.tab
+python -m pstats ms.pstats
+microsynteny.py -b blast.tab -q query.gff -d db.gff --profile-stacks ms.folded > ms.tab
+flamegraph.pl ms.folded > ms.svg
+
+    names in --profile-calls are functions in the script, or in another
+    module given as module.function, as genomegtf.jbrowse.feature_to_array,
+    which is also replaced where the script imported it by name, but not
+    where other modules imported it
+    time is inclusive of functions called from that function, and for
+    generators is only the time to create the generator, not to iterate
+
+    only the main process is profiled, not worker processes of --processors
+'''
+
+import sys
+import os
+import time
+import argparse
+import importlib
+import functools
+from collections import Counter, defaultdict
+
+def profile_parser():
+	'''return parser of the profiling options, which ignores all other arguments'''
+	parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+	parser.add_argument('--profile', help="write cProfile stats of main to this file")
+	parser.add_argument('--profile-stacks', help="write collapsed stacks sampled from main to this file")
+	parser.add_argument('--profile-interval', type=float, default=5.0, help="milliseconds between stack samples [5]")
+	parser.add_argument('--profile-calls', help="comma separated names of functions to count calls")
+	return parser
+
+class CallCounter:
+	'''replaces named functions with wrappers that count calls and time'''
+	def __init__(self):
+		self.calls = Counter()
+		self.seconds = defaultdict(float)
+		self.replaced = [] # tuples of namespace dict and name and original function, to restore later
+	def wrap(self, name, function):
+		@functools.wraps(function)
+		def counted_function(*args, **kwargs):
+			starttime = time.perf_counter()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				self.calls[name] += 1
+				self.seconds[name] += time.perf_counter() - starttime
+		return counted_function
+	def add(self, name, mainglobals):
+		'''replace function name in the script globals, or module.function in that module, and in the script globals if imported from there'''
+		if name.find(".") > 0:
+			modulename, functionname = name.rsplit(".",1)
+			try:
+				namespace = vars(importlib.import_module(modulename))
+			except ImportError:
+				sys.exit("ERROR: cannot import module {} for --profile-calls {}".format(modulename, name))
+		else:
+			functionname, namespace = name, mainglobals
+		function = namespace.get(functionname)
+		if not callable(function):
+			sys.exit("ERROR: no function named {} for --profile-calls".format(name))
+		self.calls[name] = 0
+		countedfunction = self.wrap(name, function)
+		self.replaced.append( (namespace, functionname, function) )
+		namespace[functionname] = countedfunction
+		if namespace is not mainglobals: # names from "from module import function" are copies, so replace those too
+			for globalname, globalvalue in list(mainglobals.items()):
+				if globalvalue is function:
+					self.replaced.append( (mainglobals, globalname, function) )
+					mainglobals[globalname] = countedfunction
+	def restore(self):
+		for namespace, functionname, function in self.replaced:
+			namespace[functionname] = function
+		self.replaced = []
+	def write_counts(self, wayout):
+		for name, calls in self.calls.items():
+			seconds = self.seconds[name]
+			wayout.write("# profile: {} called {} times, {:.3f}s total, {:.2f}us per call{}".format(name, calls, seconds, seconds * 1000000.0 / calls if calls else 0.0, os.linesep) )
+
+class StackSampler:
+	'''background thread that counts the stacks of one thread at regular intervals'''
+	def __init__(self, thread_id, interval):
+		import threading # only imported when sampling, to keep startup fast
+		self.thread_id = thread_id
+		self.interval = interval
+		self.stacks = Counter() # key is collapsed stack, as file:function;file:function
+		self.stopped = threading.Event()
+		self.thread = threading.Thread(target=self.run, daemon=True)
+	def start(self):
+		self.thread.start()
+	def run(self):
+		while not self.stopped.wait(self.interval):
+			frame = sys._current_frames().get(self.thread_id)
+			framenames = []
+			while frame is not None:
+				code = frame.f_code
+				framenames.append("{}:{}".format(os.path.basename(code.co_filename), code.co_name) )
+				frame = frame.f_back
+			if framenames:
+				self.stacks[";".join(reversed(framenames))] += 1
+	def stop(self):
+		self.stopped.set()
+		self.thread.join()
+	def write(self, filename):
+		with open(filename, 'w') as sf:
+			for stack, samples in sorted(self.stacks.items()):
+				sf.write("{} {}\n".format(stack, samples))
+		sys.stderr.write("# Wrote {} stack samples to {}  ".format(sum(self.stacks.values()), filename) + time.asctime() + os.linesep)
+
+def run_main(main, argv, wayout):
+	'''run main(argv, wayout) with any profiling options removed from argv, return the result of main'''
+	profargs, mainargv = profile_parser().parse_known_args(argv)
+	if not (profargs.profile or profargs.profile_stacks or profargs.profile_calls):
+		return main(argv, wayout)
+
+	callcounter = None
+	if profargs.profile_calls:
+		callcounter = CallCounter()
+		for name in profargs.profile_calls.split(","):
+			if name.strip():
+				callcounter.add(name.strip(), main.__globals__)
+	sampler = None
+	if profargs.profile_stacks:
+		if profargs.profile_interval <= 0:
+			sys.exit("ERROR: --profile-interval must be more than 0, given {}".format(profargs.profile_interval) )
+		import threading
+		sampler = StackSampler(threading.get_ident(), profargs.profile_interval / 1000.0)
+		sampler.start()
+	profiler = None
+	if profargs.profile:
+		import cProfile
+		profiler = cProfile.Profile()
+		profiler.enable()
+	try: # write profiles even if main exits with an error
+		return main(mainargv, wayout)
+	finally:
+		if profiler is not None:
+			profiler.disable()
+			profiler.dump_stats(profargs.profile)
+			sys.stderr.write("# Wrote profile to {}, view with:  python -m pstats {}  ".format(profargs.profile, profargs.profile) + time.asctime() + os.linesep)
+		if sampler is not None:
+			sampler.stop()
+			sampler.write(profargs.profile_stacks)
+		if callcounter is not None:
+			callcounter.restore()
+			callcounter.write_counts(sys.stderr)
@@ -0,0 +1,225 @@
+'''genomegtf/spill.py  last modified 2026-10-18
+    memory budget for --max-memory, with tables that move to disk
+
+    the large tables of a script, such as blast hits by query gene, are
+    made from a MemoryBudget, and stay in memory while the process is
+    under the budget, then are moved to a temporary sqlite database
+    when the process comes near it, so a job runs slower instead of
+    being killed for using too much memory:
+
+budget = MemoryBudget.from_option(args.max_memory, args.temp_dir)
+blasthits = new_table(budget, "blast hits") # a plain list if budget is None
+...
+blasthits[queryid] = {subjectid:bitscore}
+...
+blasthits = finish_table(blasthits) # a list again if never moved
+
+    without --max-memory nothing is checked, so scripts run as before
+
+    memory is checked every CHECK_INTERVAL uses of a table, and when it
+    is over, all entries in memory are moved, which repeats as long as
+    memory stays over, since python reuses freed memory for the next
+    entries but rarely gives it back, so the process stays near the
+    budget instead of growing past it
+
+    values are stored with marshal, so can be dicts, lists, tuples,
+    numbers, strings or bytes, but not other objects
+'''
+
+import sys
+import os
+import time
+import marshal
+import argparse
+from genomegtf.instrument import peak_rss_kb
+
+SPILL_FRACTION = 0.8 # move tables at this fraction of the budget, leaving room for the rest of the script
+CHECK_INTERVAL = 65536 # uses of a table between memory checks
+READ_CACHE = 4096 # entries kept after reading from disk, as nearby genes are read several times
+MEMORY_UNITS = {"K":1, "M":1024, "G":1024*1024, "T":1024*1024*1024}
+
+def parse_memory_size(text):
+	'''return kb from a size as 4G, 500M or 800000K, or Mb if there is no unit, for argparse type'''
+	text = text.strip().upper().rstrip("B")
+	unit = "M"
+	if text and text[-1] in MEMORY_UNITS:
+		text, unit = text[:-1], text[-1]
+	try:
+		size = float(text)
+	except ValueError:
+		raise argparse.ArgumentTypeError("cannot read memory size {}, use as 4G or 500M".format(text) )
+	if size <= 0:
+		raise argparse.ArgumentTypeError("memory size must be more than 0")
+	return int(size * MEMORY_UNITS[unit])
+
+def current_rss_kb():
+	'''return resident memory of this process in kb, or the peak if not on linux'''
+	try:
+		with open("/proc/self/statm") as sm:
+			return int(sm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+	except (OSError, ValueError):
+		return peak_rss_kb()
+
+def open_temp_database(tempdir, schema):
+	'''return sqlite connection to a new temporary file, made with the schema statements, which is removed when closed'''
+	import sqlite3 # only imported when a table is moved to disk
+	import tempfile
+	dbhandle, dbfile = tempfile.mkstemp(suffix=".sqlite", dir=tempdir)
+	os.close(dbhandle)
+	database = sqlite3.connect(dbfile)
+	# only this process uses the file, and it is not needed after a crash
+	database.execute("PRAGMA journal_mode=OFF")
+	database.execute("PRAGMA synchronous=OFF")
+	for statement in schema:
+		database.execute(statement)
+	try: # the open database can still be used, as for tempfile.TemporaryFile
+		os.remove(dbfile)
+	except OSError: # not allowed on windows, left for the system to clean
+		pass
+	return database
+
+class MemoryBudget:
+	'''memory limit of the process in kb, which makes tables that move to disk near the limit'''
+	def __init__(self, maxkb, tempdir=None):
+		self.maxkb = maxkb
+		self.limitkb = int(maxkb * SPILL_FRACTION)
+		self.tempdir = tempdir
+		self.moved = set() # names of tables already moved, to only write one message for each
+	@classmethod
+	def from_option(cls, maxkb, tempdir=None):
+		'''return MemoryBudget, or None if maxkb is None, for which new_table() and new_set() give plain types'''
+		if maxkb is None:
+			return None
+		return cls(maxkb, tempdir)
+	def is_over(self):
+		return current_rss_kb() >= self.limitkb
+	def note_move(self, name, entries):
+		if name not in self.moved:
+			self.moved.add(name)
+			sys.stderr.write("# Memory is {} Mb, near --max-memory of {} Mb, moving {} {} to disk  ".format(current_rss_kb()//1024, self.maxkb//1024, entries, name) + time.asctime() + os.linesep)
+
+def new_table(budget, name="entries"):
+	'''return SpillTable from budget, or a plain list if budget is None'''
+	return [] if budget is None else SpillTable(budget, name)
+
+def new_set(budget, name="keys"):
+	'''return SpillSet from budget, or a plain set if budget is None'''
+	return set() if budget is None else SpillSet(budget, name)
+
+def finish_table(table):
+	'''call after all entries are added, return a list if the table was never moved to disk, otherwise the table for reading'''
+	if isinstance(table, SpillTable):
+		return table.finish()
+	return table
+
+class SpillTable:
+	'''list-like table of values by integer ID, where missing values are None, kept in memory until over the budget, then moved to a temporary sqlite database
+
+	values from [] can be changed in place until the next use of the table,
+	as the memory is only checked before looking up a value
+	'''
+	def __init__(self, budget, name="entries"):
+		self.budget = budget
+		self.name = name
+		self.memory = {} # key is ID, value is value, for values not yet moved or read back to be changed
+		self.ondisk = bytearray() # 1 for each ID with a value on disk
+		self.size = 0
+		self.database = None
+		self.uses = 0
+		self.finished = False
+		self.cache = {} # values read from disk after finish()
+	def __len__(self):
+		return self.size
+	def extend(self, values):
+		'''add IDs with no value, as from grow()'''
+		self.size += len(values)
+	def check_memory(self):
+		self.uses += 1
+		if self.uses >= CHECK_INTERVAL:
+			self.uses = 0
+			if self.memory and self.budget.is_over():
+				self.move_to_disk()
+	def move_to_disk(self):
+		if self.database is None:
+			self.budget.note_move(self.name, len(self.memory))
+			self.database = open_temp_database(self.budget.tempdir, ["CREATE TABLE entries (id INTEGER PRIMARY KEY, value BLOB)"])
+		self.database.executemany("INSERT OR REPLACE INTO entries VALUES (?,?)", ((key, marshal.dumps(value)) for key, value in self.memory.items()) )
+		self.database.commit()
+		if len(self.ondisk) < self.size:
+			self.ondisk.extend(bytes(self.size - len(self.ondisk)) )
+		for key in self.memory:
+			self.ondisk[key] = 1
+		self.memory = {} # new dict, so the old one is freed
+	def read_from_disk(self, key):
+		row = self.database.execute("SELECT value FROM entries WHERE id=?", (key,)).fetchone()
+		return marshal.loads(row[0])
+	def __getitem__(self, key):
+		if self.finished:
+			value = self.cache.get(key)
+			if value is None and key < len(self.ondisk) and self.ondisk[key]:
+				if len(self.cache) >= READ_CACHE:
+					self.cache = {}
+				value = self.cache[key] = self.read_from_disk(key)
+			return value
+		self.check_memory() # before the lookup, so the value stays in memory while it is changed
+		value = self.memory.get(key)
+		if value is None and key < len(self.ondisk) and self.ondisk[key]:
+			value = self.memory[key] = self.read_from_disk(key) # moved again with any changes
+		return value
+	def __setitem__(self, key, value):
+		if self.finished:
+			raise TypeError("cannot change {} after finish()".format(self.name) )
+		self.memory[key] = value
+	def __iter__(self):
+		'''yield values in order of ID, including None for IDs without a value'''
+		if not self.finished or self.database is None:
+			for key in range(self.size):
+				yield self[key]
+			return
+		nextkey = 0
+		for key, value in self.database.execute("SELECT id, value FROM entries ORDER BY id"):
+			for _ in range(key - nextkey):
+				yield None
+			yield marshal.loads(value)
+			nextkey = key + 1
+		for _ in range(self.size - nextkey):
+			yield None
+	def finish(self):
+		'''stop moving to disk, return list of values if never moved, otherwise self, which is read from disk'''
+		if self.database is None:
+			values = [self.memory.get(key) for key in range(self.size)]
+			self.memory = {}
+			return values
+		if self.memory:
+			self.move_to_disk()
+		self.finished = True
+		return self
+
+class SpillSet:
+	'''set of bytes or string keys, kept in memory until over the budget, then moved to a temporary sqlite database'''
+	def __init__(self, budget, name="keys"):
+		self.budget = budget
+		self.name = name
+		self.memory = set()
+		self.database = None
+		self.uses = 0
+	def add(self, key):
+		self.uses += 1
+		if self.uses >= CHECK_INTERVAL:
+			self.uses = 0
+			if self.memory and self.budget.is_over():
+				self.move_to_disk()
+		self.memory.add(key)
+	def move_to_disk(self):
+		if self.database is None:
+			self.budget.note_move(self.name, len(self.memory))
+			self.database = open_temp_database(self.budget.tempdir, ["CREATE TABLE keys (key BLOB PRIMARY KEY) WITHOUT ROWID"])
+		self.database.executemany("INSERT OR IGNORE INTO keys VALUES (?)", ((key,) for key in self.memory) )
+		self.database.commit()
+		self.memory = set()
+	def __contains__(self, key):
+		if key in self.memory:
+			return True
+		if self.database is None:
+			return False
+		return self.database.execute("SELECT 1 FROM keys WHERE key=?", (key,)).fetchone() is not None
@@ -0,0 +1,50 @@
+'''genomegtf/symbols.py  last modified 2026-10-18
+    dense integer IDs for scaffold and gene names
+
+    names are given an ID when they are first parsed, starting from 0,
+    so anything kept for each gene can be a list or array indexed by ID
+    instead of a dict by name, and each name is stored only once:
+
+genenames = SymbolTable()
+genestrand = []
+for ...
+	geneid = genenames.add(name)
+	grow(genestrand, geneid + 1)
+	genestrand[geneid] = strand
+...
+sys.stdout.write(genenames.name(geneid))
+
+    lookups of a name that was never added return None from get(),
+    so values of other files can be matched without adding names
+'''
+
+class SymbolTable:
+	'''assigns each name an integer ID, in order of first appearance'''
+	__slots__ = ("ids", "names")
+	def __init__(self):
+		self.ids = {} # key is name, value is ID
+		self.names = [] # names indexed by ID
+	def add(self, name):
+		'''return ID of name, adding it if it is new'''
+		symbolid = self.ids.get(name)
+		if symbolid is None:
+			symbolid = len(self.names)
+			self.ids[name] = symbolid
+			self.names.append(name)
+		return symbolid
+	def get(self, name, default=None):
+		'''return ID of name, or default if it was never added'''
+		return self.ids.get(name, default)
+	def name(self, symbolid):
+		'''return the name of an ID'''
+		return self.names[symbolid]
+	def __len__(self):
+		return len(self.names)
+	def __contains__(self, name):
+		return name in self.ids
+
+def grow(values, size, default=None):
+	'''extend list or array values with default until it has size items, so all IDs below size can be indexed, return values'''
+	if len(values) < size:
+		values.extend([default] * (size - len(values)))
+	return values
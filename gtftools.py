@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#
+# gtftools.py created 2026-10-18
+
+'''gtftools.py  last modified 2026-10-18
+    run any of the genomeGTFtools scripts as a subcommand
+
+gtftools.py microsynteny -b blast.tab -q query.gff -d db.gff > synteny.tab
+
+    all arguments after the subcommand are given to that script, so
+  gtftools.py pfam2gff -h
+    shows the same options as pfam2gff.py -h
+
+    only the script of the subcommand is imported, and slow libraries
+    such as Bio are only imported by the step that reads sequences,
+    so starting is fast when running many small jobs, such as shards
+    of a large genome, measure the startup time with:
+gtftools.py microsynteny --startup-time
+
+    to use as a command, link it into the path, as:
+ln -s ~/genomeGTFtools/gtftools.py ~/bin/gtftools
+'''
+
+import sys
+import time
+import importlib
+
+# key is subcommand, which is also the script module, value is a short description
+# descriptions are kept here so listing them does not import every script
+SUBCOMMANDS = {
+"alignmentpos2gff": "convert sites in a protein alignment to protein GFF",
+"blast2genomegff": "convert blast hits of proteins to genomic GFF using gene models",
+"blast2gff": "convert tabular blast hits against a genome to GFF",
+"clean_gff": "remove comments and fix positions and feature names in GFF",
+"collate_features": "add child features from one GFF under parent features of another",
+"make_parent_features": "add gene and mRNA parents to blast hit GFF",
+"microsynteny": "find blocks of conserved gene order between two genomes",
+"number_contigs_by_length": "rename and sort contigs by length",
+"pfam2gff": "convert hmmscan PFAM domains to protein or genomic GFF",
+"pfamgff2clans": "rename PFAM domain GFF by clan and merge overlaps",
+"pfampipeline": "run hmmscan, pfam2gff and pfamgff2clans on proteins",
+"removeredundantgff": "remove identical gene predictions from GFF",
+"rename_gtf_contigs": "rename contigs in GFF from a conversion table",
+"repeat2gtf": "find repeats or N gaps in contigs, as GFF",
+"scaffold_synteny": "table of gene matches between scaffolds of two genomes, for dotplots",
+}
+
+def print_subcommands(wayout):
+	wayout.write(__doc__.split("\n",1)[1].split("\n\n",1)[0].strip() + "\n\n")
+	wayout.write("usage: gtftools.py <subcommand> [options]\n\nsubcommands:\n")
+	for subcommand in sorted(SUBCOMMANDS):
+		wayout.write("  {:<26}{}\n".format(subcommand, SUBCOMMANDS[subcommand]) )
+	wayout.write("\nfor options of one subcommand, use:  gtftools.py <subcommand> -h\n")
+
+def main(argv, wayout):
+	if not argv or argv[0] in ("-h","--help"):
+		print_subcommands(wayout)
+		return
+	subcommand = argv[0].replace(".py","").replace("-","_") # as pfam2gff.py or clean-gff
+	if subcommand not in SUBCOMMANDS:
+		sys.exit("ERROR: unknown subcommand {}, use -h to list subcommands".format(argv[0]) )
+	subargv = argv[1:]
+	starttime = time.perf_counter()
+	script = importlib.import_module(subcommand)
+	if "--startup-time" in subargv: # only import the script, and report the time
+		sys.stderr.write("# importing {} took {:.1f} ms\n".format(subcommand, (time.perf_counter() - starttime) * 1000) )
+		return
+	from genomegtf.profiling import run_main
+	sys.argv = ["gtftools.py " + subcommand] + subargv # so usage of the script shows the subcommand
+	return run_main(script.main, subargv, wayout)
+
+if __name__ == "__main__":
+	main(sys.argv[1:], sys.stdout)
@@ -3,52 +3,148 @@
 '''
 make_parent_features.py features.gff > features_w_parent.gff
 
+    parent start, end, score and strand are counted in one pass
+    child features are kept in memory up to -m lines, and beyond that
+    the file is read a second time and sorted on disk in chunks
+    stdin or a pipe cannot be read twice, so is copied to a file in -T
+
+make_parent_features.py -m 1000000 -T /scratch/tmp features.gff > features_w_parent.gff
+
 '''
 
 import sys
 import os
 import re
 import time
+import heapq
+import argparse
+import tempfile
 from collections import defaultdict,Counter
+from itertools import groupby
+from operator import itemgetter
+from genomegtf.features import GffFeature
+from genomegtf.inputs import open_input
+from genomegtf.profiling import run_main
 
-if len(sys.argv) < 2:
-	sys.stderr.write( __doc__ )
-else:
-	ID_order = defaultdict(dict) # key is scaffold, then ID, then start position
-	feature_dict = defaultdict(list)
-	linecounter = 0
-	sys.stderr.write("# Reading features from {}".format(sys.argv[1]) + time.asctime() + os.linesep)
-	for line in open(sys.argv[1],'r'):
+def iterate_features(featurefile, copyhandle=None):
+	'''read gff features, yield tuples of scaffold, gene ID, and the split line with ID changed to Parent, and write each line unchanged to copyhandle if given'''
+	geneid = None
+	for line in open_input(featurefile):
+		if copyhandle is not None:
+			copyhandle.write(line)
 		line = line.strip()
 		if line and line[0]!="#":
-			linecounter += 1
 			lsplits = line.split("\t")
-			scaffold = lsplits[0]
-			program = lsplits[1]
 			lsplits[2] = "exon"
-			start = int(lsplits[3])
 			attributes = lsplits[8]
 			if attributes.find("ID")==0: # gff3 format but no ID
-				geneid = re.search('ID=([\w.|-]+)', attributes).group(1)
+				geneid = re.search(r'ID=([\w.|-]+)', attributes).group(1)
 			lsplits[8] = lsplits[8].replace("ID=","Parent=")
-			if geneid not in ID_order[scaffold]:
-				ID_order[scaffold][geneid] = start
+			yield lsplits[0], geneid, lsplits
+
+def rank_parents(parentstats):
+	'''return dict where key is scaffold and ID, value is output order, sorted by scaffold then start'''
+	scaffoldorder = defaultdict(list)
+	for idkey, parent in parentstats.items(): # dict keeps order of first appearance for ties
+		scaffoldorder[idkey[0]].append( (parent.start, idkey) )
+	parentrank = {}
+	for scaffold in sorted(scaffoldorder.keys()):
+		for start, idkey in sorted(scaffoldorder[scaffold], key=lambda x: x[0]):
+			parentrank[idkey] = len(parentrank)
+	return parentrank
+
+def external_sort_children(featurefile, parentrank, chunklines, tempdir):
+	'''sort child lines by parent rank in chunks on disk, yield tuples of rank and line'''
+	chunkfiles = []
+	chunk = []
+	def write_chunk():
+		chunk.sort()
+		chunkfile = tempfile.TemporaryFile(mode='w+', dir=tempdir)
+		chunkfile.write("".join( "{}\t{}\t{}\n".format(rank, linenumber, outline) for rank, linenumber, outline in chunk ) )
+		chunkfile.seek(0)
+		chunkfiles.append(chunkfile)
+		del chunk[:]
+	for linenumber, (scaffold, geneid, lsplits) in enumerate(iterate_features(featurefile)):
+		chunk.append( (parentrank[(scaffold,geneid)], linenumber, "\t".join(lsplits)) )
+		if len(chunk) >= chunklines:
+			write_chunk()
+	if chunk:
+		write_chunk()
+	sys.stderr.write("# Sorted child features into {} temporary files  ".format(len(chunkfiles)) + time.asctime() + os.linesep)
+	def read_chunk(chunkfile):
+		for line in chunkfile:
+			rank, linenumber, outline = line.rstrip("\n").split("\t",2)
+			yield int(rank), int(linenumber), outline
+	for rank, linenumber, outline in heapq.merge(*[read_chunk(cf) for cf in chunkfiles]):
+		yield rank, outline
+	for chunkfile in chunkfiles:
+		chunkfile.close()
+
+def main(argv, wayout):
+	if not len(argv):
+		argv.append("-h")
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=__doc__)
+	parser.add_argument('features', help="gff format file of features to group by ID")
+	parser.add_argument('-m','--max-lines', type=int, default=10000000, help="keep at most this many lines in memory, otherwise sort on disk [10000000]")
+	parser.add_argument('-T','--temp-dir', help="directory for temporary sort files [system default]")
+	args = parser.parse_args(argv)
+
+	parentstats = {} # key is scaffold and ID, value is GffFeature of the parent, strand is set when writing
+	childlines = defaultdict(list) # key is scaffold and ID, value is list of output lines
+	inmemory = True
+	linecounter = 0
+	sortfile = args.features # read again if sorting on disk
+	inputcopy = None
+	if args.features=="-" or not os.path.isfile(args.features): # stdin or pipe can only be read once
+		inputcopy = tempfile.NamedTemporaryFile(mode='w', suffix=".gff", dir=args.temp_dir, delete=False)
+		sortfile = inputcopy.name
+	try: # the copy of stdin is removed even after an error
+		sys.stderr.write("# Reading features from {}  ".format(args.features) + time.asctime() + os.linesep)
+		for scaffold, geneid, lsplits in iterate_features(args.features, inputcopy):
+			linecounter += 1
+			idkey = (scaffold, geneid)
+			start, end, score = int(lsplits[3]), int(lsplits[4]), int(lsplits[5])
+			parent = parentstats.get(idkey)
+			if parent is None:
+				parentstats[idkey] = GffFeature(sys.intern(scaffold), sys.intern(lsplits[1]), "mRNA", start, end, score, ".", ".", "ID={0};Name={0}".format(geneid) )
 			else:
-				if ID_order[scaffold].get(geneid) > start:
-					ID_order[scaffold][geneid] = start
-			feature_dict[geneid].append(lsplits)
-	sys.stderr.write("# Counted {} lines for {} features\n".format(linecounter, len(feature_dict)) )
-	sys.stderr.write("# Generating parent features" + time.asctime() + os.linesep)
-	for scaffold in sorted(ID_order.keys()):
-		for geneid, pos in sorted(ID_order[scaffold].items(), key=lambda x: x[1]):
-			allstarts = map(int,[ls[3] for ls in feature_dict[geneid]])
-			allends = map(int,[ls[4] for ls in feature_dict[geneid]])
-			parentstart = min(allstarts)
-			parentend = max(allends)
-			topscore = max(map(int,[ls[5] for ls in feature_dict[geneid]]))
-			mainstrand = Counter([ls[6] for ls in feature_dict[geneid]]).most_common(1)[0][0]
-			outline = "{0}\t{1}\tmRNA\t{2}\t{3}\t{4}\t{5}\t.\tID={6};Name={6}\n".format( scaffold, program, parentstart, parentend, topscore, mainstrand, geneid)
-			sys.stdout.write( outline )
-			for outsplits in feature_dict.get(geneid):
-				outline = "{}\n".format( "\t".join(outsplits) )
-				sys.stdout.write( outline )
+				if start < parent.start:
+					parent.start = start
+				if end > parent.end:
+					parent.end = end
+				if score > parent.score:
+					parent.score = score
+			if inmemory:
+				childlines[idkey].append("\t".join(lsplits))
+				if linecounter > args.max_lines:
+					sys.stderr.write("# More than {} lines, sorting on disk  ".format(args.max_lines) + time.asctime() + os.linesep)
+					inmemory = False
+					childlines.clear()
+		sys.stderr.write("# Counted {} lines for {} features\n".format(linecounter, len(parentstats)) )
+		if inputcopy is not None:
+			inputcopy.close()
+			if inmemory: # copy was not needed
+				os.remove(sortfile)
+
+		sys.stderr.write("# Generating parent features  " + time.asctime() + os.linesep)
+		parentrank = rank_parents(parentstats)
+		rankedids = sorted(parentrank.keys(), key=parentrank.get)
+		if inmemory:
+			sortedchildren = ( (parentrank[idkey], outline) for idkey in rankedids for outline in childlines[idkey] )
+		else:
+			sortedchildren = external_sort_children(sortfile, parentrank, args.max_lines, args.temp_dir)
+		# children of one parent come together, so strand of the parent is the most common strand of those
+		for rank, rankedchildren in groupby(sortedchildren, key=itemgetter(0)):
+			outlines = [outline for rank, outline in rankedchildren]
+			parent = parentstats[rankedids[rank]]
+			parent.strand = Counter(outline.split("\t",7)[6] for outline in outlines).most_common(1)[0][0]
+			wayout.write(parent.to_line() + "\n")
+			wayout.write("".join( "{}\n".format(outline) for outline in outlines) )
+	finally:
+		if inputcopy is not None:
+			inputcopy.close()
+			if os.path.exists(sortfile):
+				os.remove(sortfile)
+
+if __name__ == "__main__":
+	run_main(main, sys.argv[1:], sys.stdout)
@@ -2,14 +2,17 @@
 # microsynteny.py
 # v1.0 2015-10-09
 
-'''microsynteny.py v1.3 last modified 2019-09-27
+'''microsynteny.py v1.3 last modified 2026-10-18
 
 microsynteny.py -q query.gtf -d ref_species.gtf -b query_vs_ref_blast.tab -E ../bad_contigs -g -D '_' --blast-query-delimiter '.' > query_vs_ref_microsynteny.tab
 
     FOR GENERATION OF BLAST DATA TO LINK SETS
 blastx -query query.fasta -db ref_prots.fasta -outfmt 6 -evalue 1e-5 > query_vs_ref_blast.tab
 
-    large blast.tab files can be gzipped as .gz
+    large blast.tab files can be gzipped as .gz, or bgzipped to read faster
+    with several CPUs, or compressed with zstd, or read from stdin as -b -
+    if memory is limited, use --max-memory, as 8G, and blast hits are moved
+    to a temporary database in -T when near that, which is slower
 
     IN CASE OF NO OUTPUT, CHECK THAT -Q AND -D ARE SET CORRECTLY
     from gtf files, gene_id is extracted
@@ -28,6 +31,16 @@ query-scaffold  ref-scaffold  block-number
     for match_part feature:
     score is bitscore of the blast hit
 
+    GFF can be sorted, bgzipped and indexed for tabix, with --bgzip-out
+microsynteny.py -q query.gtf -d ref_species.gtf -b query_vs_ref_blast.tab -G --bgzip-out query_vs_ref_microsynteny.gff.gz
+
+    or written directly as a JBrowse track, with --jbrowse-out
+microsynteny.py -q query.gtf -d ref_species.gtf -b query_vs_ref_blast.tab -G --jbrowse-out jbrowse/data/tracks/microsynteny
+
+    or written unsorted to a file with -o, gzipped as BGZF if the name
+    ends in .gz, where compression runs on a background thread
+microsynteny.py -q query.gtf -d ref_species.gtf -b query_vs_ref_blast.tab -o query_vs_ref_microsynteny.tab.gz
+
     THIS CANNOT DETECT ERRONEOUS FUSION OR SPLITTING OF GENES
     i.e. three collinear genes in the query that are erroneously fused
     in the ref species will still count as a block of three
@@ -42,31 +55,33 @@ import re
 import os
 import time
 import argparse
-import random
-import gzip
 from collections import namedtuple,defaultdict
-
+from genomegtf.inputs import open_input, describe_input
+from genomegtf.symbols import SymbolTable, grow
+from genomegtf.outputs import BufferedLineWriter, open_output
+from genomegtf.spill import MemoryBudget, parse_memory_size, new_table, finish_table
+from genomegtf.instrument import RunReport
+from genomegtf.profiling import run_main
+
+# genes are kept as small tuples, as only position and strand are needed, not all GFF columns
 querygene = namedtuple("querygene", "start end strand")
 refgene = namedtuple("refgene", "scaffold start end strand")
 
-def parse_gtf(gtffile, exonstogenes, excludedict, delimiter, isref=False):
-	'''from a gtf, return a dict of dicts where keys are scaffold names, then gene names, and values are gene info as a tuple of start end and strand direction'''
-	if gtffile.rsplit('.',1)[-1]=="gz": # autodetect gzip format
-		opentype = gzip.open
-		sys.stderr.write("# Parsing {} as gzipped  ".format(gtffile) + time.asctime() + os.linesep)
-	else: # otherwise assume normal open for fasta format
-		opentype = open
-		sys.stderr.write("# Parsing {}  ".format(gtffile) + time.asctime() + os.linesep)
-
-	if isref: # meaning is db/subject, thus get normal dictionary
-		genesbyscaffold = {}
+def parse_gtf(gtffile, exonstogenes, excludedict, delimiter, genenames, isref=False, report=None):
+	'''from a gtf, return a dict of dicts where keys are scaffold names, then gene IDs from SymbolTable genenames, and values are querygene tuples of start end and strand, or for isref a list of refgene tuples indexed by gene ID, adding line counts to RunReport report'''
+	sys.stderr.write("# Parsing {}{}  ".format(gtffile, describe_input(gtffile)) + time.asctime() + os.linesep)
+
+	if isref: # meaning is db/subject, thus get list by gene ID
+		genesbyscaffold = []
 	else:
-		genesbyscaffold = defaultdict(dict) # scaffolds as key, then gene name, then genemapping tuple
+		genesbyscaffold = defaultdict(dict) # scaffolds as key, then gene ID, then querygene tuple
 	if exonstogenes:
 		nametoscaffold = {} # in order to get transcript boundaries, store names to scaffolds
 		nametostrand = {} # store strand by gene ID
-		exonboundaries = defaultdict(list) # make list of tuples of exons by transcript, to determine genes
-	for line in opentype(gtffile,'rt'):
+		exonboundaries = {} # key is gene ID, value is list of first start and last end of exons, to determine genes
+		exoncount = 0
+	linecount = 0
+	for linecount, line in enumerate(open_input(gtffile), 1):
 		line = line.strip()
 		if line and not line[0]=="#": # ignore empty lines and comments
 			lsplits = line.split("\t")
@@ -83,55 +98,64 @@ def parse_gtf(gtffile, exonstogenes, excludedict, delimiter, isref=False):
 				# if a delimiter is given for either query or db, then split
 				if delimiter:
 					geneid = geneid.rsplit(delimiter,1)[0]
+				geneid = genenames.add(geneid)
 
 				# generate tuple differently for query and db
-				if isref:
-					refbounds = refgene(scaffold=lsplits[0], start=int(lsplits[3]), end=int(lsplits[4]), strand=lsplits[6] )
-					genesbyscaffold[geneid] = refbounds
+				if isref: # db genes are indexed by ID, not scaffold
+					grow(genesbyscaffold, geneid + 1)
+					genesbyscaffold[geneid] = refgene(sys.intern(scaffold), int(lsplits[3]), int(lsplits[4]), lsplits[6] )
 				else:
-					boundstrand = querygene(start=int(lsplits[3]), end=int(lsplits[4]), strand=lsplits[6] )
-					genesbyscaffold[scaffold][geneid] = boundstrand
+					genesbyscaffold[scaffold][geneid] = querygene(int(lsplits[3]), int(lsplits[4]), lsplits[6] )
 			# if using exons only, then start collecting exons
 			elif (exonstogenes and feature=="exon"):
 				try:
 					geneid = re.search('gene_id "([\w.|-]+)"', attributes).group(1)
 				except AttributeError: # in case re fails and group does not exist
 					geneid = re.search('name "([\w.|-]+)"', attributes).group(1)
-				nametoscaffold[geneid] = scaffold
+				geneid = genenames.add(geneid)
+				nametoscaffold[geneid] = sys.intern(scaffold)
 				nametostrand[geneid] = lsplits[6]
-				exonbounds = (int(lsplits[3]), int(lsplits[4]))
-				exonboundaries[geneid].append(exonbounds) # for calculating gene boundaries
+				exoncount += 1
+				# only the outer bounds are kept, instead of every exon
+				exonstart, exonend = int(lsplits[3]), int(lsplits[4])
+				genebounds = exonboundaries.get(geneid)
+				if genebounds is None:
+					exonboundaries[geneid] = [exonstart, exonend]
+				else:
+					if exonstart < genebounds[0]:
+						genebounds[0] = exonstart
+					if exonend > genebounds[1]:
+						genebounds[1] = exonend
+	if report is not None:
+		report.count("GFF lines", linecount)
 
 	if len(genesbyscaffold) > 0: # even if no-genes was set, this should be more than 0 if genes were in one gtf
 		if isref:
-			sys.stderr.write("# Found {} genes  ".format( len(genesbyscaffold) ) + time.asctime() + os.linesep)
+			sys.stderr.write("# Found {} genes  ".format( sum(1 for gene in genesbyscaffold if gene is not None) ) + time.asctime() + os.linesep)
 		else:
 			sys.stderr.write("# Found {} genes  ".format(sum( list(map( len,genesbyscaffold.values())) ) ) + time.asctime() + os.linesep)
 		return genesbyscaffold
 	else: # generate gene boundaries by scaffold
-		sys.stderr.write("# Estimated {} genes from {} exons  ".format(len(exonboundaries), sum(len(x) for x in exonboundaries.values() ) ) + time.asctime() + os.linesep)
-		for gene,exons in exonboundaries.items():
-			if isref: # make different tuple for reference genes, since they are indexed by name, not scaffold
-				refbounds = refgene(scaffold=nametoscaffold[gene], start=min(x[0] for x in exons), end=max(x[1] for x in exons), strand=nametostrand[gene] )
-				genesbyscaffold[gene] = refbounds
+		sys.stderr.write("# Estimated {} genes from {} exons  ".format(len(exonboundaries), exoncount ) + time.asctime() + os.linesep)
+		for gene, genebounds in exonboundaries.items():
+			if isref: # make different tuple for reference genes, since they are indexed by ID, not scaffold
+				grow(genesbyscaffold, gene + 1)
+				genesbyscaffold[gene] = refgene(nametoscaffold[gene], genebounds[0], genebounds[1], nametostrand[gene] )
 			else:
-				boundstrand = querygene(start=min(x[0] for x in exons), end=max(x[1] for x in exons), strand=nametostrand[gene] )
-				genesbyscaffold[nametoscaffold[gene]][gene] = boundstrand
+				genesbyscaffold[nametoscaffold[gene]][gene] = querygene(genebounds[0], genebounds[1], nametostrand[gene] )
 		sys.stderr.write("# Found {} genes  ".format(len(genesbyscaffold) ) + time.asctime() + os.linesep) # uses len here
 		return genesbyscaffold
 
-def parse_tabular_blast(blasttabfile, evaluecutoff, querydelimiter, refdelimiter, switchquery=False, maxhits=100):
-	'''read tabular blast file, return a dict where key is query ID and value is subject ID'''
-	if blasttabfile.rsplit('.',1)[-1]=="gz": # autodetect gzip format
-		opentype = gzip.open
-		sys.stderr.write("# Parsing tabular blast output {} as gzipped  ".format(blasttabfile) + time.asctime() + os.linesep)
-	else: # otherwise assume normal open for fasta format
-		opentype = open
-		sys.stderr.write("# Parsing tabular blast output {}  ".format(blasttabfile) + time.asctime() + os.linesep)
-	query_to_sub_dict = defaultdict(dict)
-	query_hits = defaultdict(int) # counter of hits
+def parse_tabular_blast(blasttabfile, evaluecutoff, querydelimiter, refdelimiter, querynames, refnames, switchquery=False, maxhits=100, budget=None, report=None):
+	'''read tabular blast file, return a list indexed by query ID where values are dicts of subject ID to bitscore, or None for no hits, or a SpillTable on disk if over MemoryBudget budget, adding line and filter counts to RunReport report'''
+	sys.stderr.write("# Parsing tabular blast output {}{}  ".format(blasttabfile, describe_input(blasttabfile)) + time.asctime() + os.linesep)
+	query_to_sub_dict = new_table(budget, "blast hits") # indexed by query ID from querynames, subject IDs are from refnames
+	query_hits = [] # counter of hits, indexed by query ID
+	addquery, addsubject = querynames.add, refnames.add
 	evalueRemovals = 0
-	for line in opentype(blasttabfile, 'rt'):
+	maxhitRemovals = 0
+	linecount = 0
+	for linecount, line in enumerate(open_input(blasttabfile), 1):
 		line = line.strip()
 		lsplits = line.split("\t")
 		# qseqid, sseqid, pident, length, mismatch, gapopen, qstart, qend, sstart, send, evalue, bitscore
@@ -146,15 +170,30 @@ def parse_tabular_blast(blasttabfile, evaluecutoff, querydelimiter, refdelimiter
 		if float(lsplits[10]) > evaluecutoff:
 			evalueRemovals += 1
 			continue
+		queryid = addquery(queryseq)
+		if queryid >= len(query_hits):
+			grow(query_to_sub_dict, queryid + 1)
+			grow(query_hits, queryid + 1, 0)
 		# filter by number of hits
-		if query_hits.get(queryseq,0) >= maxhits: # too many hits already, skip
+		if query_hits[queryid] >= maxhits: # too many hits already, skip
+			maxhitRemovals += 1
 			continue
 		# otherwise add the entry
 		bitscore = float(lsplits[11])
-		query_to_sub_dict[queryseq][subjectid] = bitscore
-		query_hits[queryseq] += 1
-	sys.stderr.write("# Found blast hits for {} query sequences  ".format( len(query_to_sub_dict) ) + time.asctime() + os.linesep)
-	sys.stderr.write("# Removed {} hits by evalue, kept {} hits\n".format( evalueRemovals, sum(query_hits.values()) ) )
+		subjecthits = query_to_sub_dict[queryid]
+		if subjecthits is None:
+			subjecthits = query_to_sub_dict[queryid] = {}
+		subjecthits[addsubject(subjectid)] = bitscore
+		query_hits[queryid] += 1
+	grow(query_to_sub_dict, len(querynames)) # so every query gene can be indexed
+	query_to_sub_dict = finish_table(query_to_sub_dict)
+	sys.stderr.write("# Found blast hits for {} query sequences  ".format( sum(1 for hits in query_to_sub_dict if hits is not None) ) + time.asctime() + os.linesep)
+	sys.stderr.write("# Removed {} hits by evalue, kept {} hits\n".format( evalueRemovals, sum(query_hits) ) )
+	if report is not None:
+		report.count("blast lines", linecount)
+		report.count("hits removed by evalue", evalueRemovals)
+		report.count("hits removed over maximum per query", maxhitRemovals)
+		report.count("blast hits kept", sum(query_hits) )
 	sys.stderr.write("# Names parsed as {} from {}, and {} from {}\n".format( queryseq,lsplits[0], subjectid,lsplits[1] ) )
 	return query_to_sub_dict
 
@@ -168,10 +207,11 @@ def randomize_genes(refdict):
 			randomgenelist.append(genename)
 			genepositions[genename] = genedict[genename]
 	# randomize the list
+	import random # only used for randomized controls
 	random.shuffle(randomgenelist)
 	# reiterate in same order, but store random gene names at the same position
 	genecounter = 0
-	randomgenesbyscaf = defaultdict(dict) # scaffolds as key, then gene name, then genemapping tuple
+	randomgenesbyscaf = defaultdict(dict) # scaffolds as key, then gene ID, then querygene tuple
 	for scaffold, genedict in refdict.items(): # iterate again to reassign genes to each scaffold
 		for genename, bounds in genedict.items():
 			randomgenesbyscaf[scaffold][randomgenelist[genecounter]] = genepositions[genename]
@@ -179,16 +219,18 @@ def randomize_genes(refdict):
 	sys.stderr.write("# Randomized {} genes  ".format(genecounter) + time.asctime() + os.linesep)
 	return randomgenesbyscaf
 
-def synteny_walk(querydict, blastdict, refdict, min_block, max_span, max_distance, is_verbose, wayout, make_gff):
+def synteny_walk(querydict, blastdict, refdict, querynames, refnames, min_block, max_span, max_distance, is_verbose, wayout, make_gff):
 	'''for each query scaffold, begin with the first gene and follow as far as possible to identify colinear blocks, then print to stdout'''
-	syntenylist = [] # list to keep track of matches, as tuples of (querygene_name, subject_name)
+	querygenenames = querynames.names # gene names by ID, for output
+	refgenenames = refnames.names
+	syntenylist = [] # list to keep track of matches, as tuples of (querygene_ID, subject_ID)
 	blocknum = 1
 	blocklengths = defaultdict(int) # dictionary to keep track of number of blocks of length N
 	scaffoldgenecounts = defaultdict(int)
 	splitgenes = 0 # counter for number of genes where next gene hits same reference, so query might be split
 	basetotal = 0 # counter for block length in bases
 
-	lastmatch = "" # string of name of last gene that matched
+	lastmatch = -1 # ID of last gene that matched
 
 	querypos = (0,1) # position of first gene on query scaffold
 	subjectpos = (0,1) # position of first gene on ref scaffold
@@ -212,10 +254,10 @@ def synteny_walk(querydict, blastdict, refdict, min_block, max_span, max_distanc
 			startingtrans = querygene_tuple[0]
 			querypos = (querygene_tuple[1].start, querygene_tuple[1].end)
 			# get the blast matches of the query
-			blastrefmatch_dict = blastdict.get(startingtrans,None) 
+			blastrefmatch_dict = blastdict[startingtrans]
 			if blastrefmatch_dict==None: # if no blast match, then skip to next gene
 				if is_verbose:
-					sys.stderr.write("#2 No blast matches for {}, skipping walk\n".format(startingtrans) )
+					sys.stderr.write("#2 No blast matches for {}, skipping walk\n".format(querygenenames[startingtrans]) )
 				continue
 			# otherwise start iterating through all blast hits of that gene
 			for blast_refgene, bitscore1 in sorted(blastrefmatch_dict.items(), key=lambda x: x[1], reverse=True):
@@ -225,14 +267,14 @@ def synteny_walk(querydict, blastdict, refdict, min_block, max_span, max_distanc
 				# due to multiple hits within the same protein, e.g. multidomain proteins
 				if startingtrans in accounted_query_genes:
 					if is_verbose:
-						sys.stderr.write("#2 Gene {} already has match on {}, skipping\n".format(startingtrans, scaffold) )
+						sys.stderr.write("#2 Gene {} already has match on {}, skipping\n".format(querygenenames[startingtrans], scaffold) )
 					continue
 				# renew synteny list for each query gene
 				syntenylist = [ (startingtrans,blast_refgene) ]
 
 				if i < genesonscaff - 1: # this allows for 2 genes left
 					if is_verbose:
-						sys.stderr.write("#3 Starting walk from gene {} on scaffold {} against {}\n".format(startingtrans, scaffold, blast_refgene) )
+						sys.stderr.write("#3 Starting walk from gene {} on scaffold {} against {}\n".format(querygenenames[startingtrans], scaffold, refgenenames[blast_refgene]) )
 					# get scaffold and position of matched gene
 					refscaffold = refdict[blast_refgene].scaffold
 					subjectpos = (refdict[blast_refgene].start, refdict[blast_refgene].end)
@@ -243,15 +285,15 @@ def synteny_walk(querydict, blastdict, refdict, min_block, max_span, max_distanc
 							dist_to_next_query = next_gene_info.start-querypos[1]
 							if dist_to_next_query > max_distance: # next gene is too far
 								if is_verbose:
-									sys.stderr.write("#4 Next gene {} bases away from {}, stopping walk\n".format(dist_to_next_query, next_gene) )
+									sys.stderr.write("#4 Next gene {} bases away from {}, stopping walk\n".format(dist_to_next_query, querygenenames[next_gene]) )
 								break # end gene block
 							# update query positions
 							querypos = (next_gene_info.start, next_gene_info.end)
-							next_match_dict = blastdict.get(next_gene,None)
+							next_match_dict = blastdict[next_gene]
 							# if no blast match, then skip to next walk step, and decrement
 							if next_match_dict==None:
 								if is_verbose:
-									sys.stderr.write("#4 No blast matches for {}, skipping gene\n".format(next_gene) )
+									sys.stderr.write("#4 No blast matches for {}, skipping gene\n".format(querygenenames[next_gene]) )
 								walksteps -= 1
 								continue
 							# otherwise iterate through matches, finding one within range
@@ -270,10 +312,10 @@ def synteny_walk(querydict, blastdict, refdict, min_block, max_span, max_distanc
 									# if either are greater than max distance, then gene is too far
 									if dist_to_next_ref > max_distance or dist_to_prev_ref > max_distance:
 										if is_verbose:
-											sys.stderr.write("#4 {} match to {} is too far, {}bp, ignoring match\n".format(next_gene, next_match, max([dist_to_next_ref,dist_to_prev_ref]) ) )
+											sys.stderr.write("#4 {} match to {} is too far, {}bp, ignoring match\n".format(querygenenames[next_gene], refgenenames[next_match], max([dist_to_next_ref,dist_to_prev_ref]) ) )
 										continue
 									if is_verbose:
-										sys.stderr.write("#5 Match {} found for {} on {}\n".format(next_match, next_gene, scaffold ) )
+										sys.stderr.write("#5 Match {} found for {} on {}\n".format(refgenenames[next_match], querygenenames[next_gene], scaffold ) )
 									walksteps = max_span # if a gene is found, reset steps
 									subjectpos = next_ref_pos
 									accounted_query_genes.append(next_gene)
@@ -281,18 +323,18 @@ def synteny_walk(querydict, blastdict, refdict, min_block, max_span, max_distanc
 									break
 								else:
 									if is_verbose:
-										sys.stderr.write("#4 {} matches {} on wrong contig {}, skipping gene\n".format(next_gene, next_match, next_ref_scaf) )
+										sys.stderr.write("#4 {} matches {} on wrong contig {}, skipping gene\n".format(querygenenames[next_gene], refgenenames[next_match], next_ref_scaf) )
 							else:
 								walksteps -= 1 # then skip to next walk step and decrement
 						else: # if walksteps is 0, then break out of for loop
 							if is_verbose:
-								sys.stderr.write("#3 Limit reached at {}, stopping walk for {}\n".format(next_gene, startingtrans) )
+								sys.stderr.write("#3 Limit reached at {}, stopping walk for {}\n".format(querygenenames[next_gene], querygenenames[startingtrans]) )
 							break # no more searching for genes after walksteps is 0
 					### WRITE LONGEST MATCH
 					blocklen = len(syntenylist)
 					if blocklen >= min_block:
 						if is_verbose:
-							sys.stderr.write("# Found block of {0} genes starting from {1} on {2}\n".format(blocklen, startingtrans, scaffold) )
+							sys.stderr.write("# Found block of {0} genes starting from {1} on {2}\n".format(blocklen, querygenenames[startingtrans], scaffold) )
 						try:
 							if blocklen > max(blocklengths.keys()):
 								sys.stderr.write("New longest block blk-{} of {} on {}\n".format(blocknum, blocklen, scaffold) )
@@ -314,25 +356,27 @@ def synteny_walk(querydict, blastdict, refdict, min_block, max_span, max_distanc
 						if make_gff:
 							# could also be "cross_genome_match"
 							blockline = "{0}\tmicrosynteny\tmatch\t{1}\t{2}\t{3}\t{4}\t.\tID=blk-{5};Name=blk-{5}_to_{6};Target={6} {7} {8}\n".format( scaffold, qblockstart, qblockend, blocklen, strand, blocknum, refscaffold, sblockstart, sblockend)
-							wayout.write(blockline)
+							blocklines = [blockline]
 							# make GFF line for each match
 							for j,pair in enumerate(syntenylist):
-								outline = "{0}\tmicrosynteny\tmatch_part\t{1}\t{2}\t{3}\t{4}\t.\tID=blk-{5}.{10}.{11};Parent=blk-{5};Target={6} {7} {8} {9}\n".format( scaffold, transdict[pair[0]].start, transdict[pair[0]].end, blastdict[pair[0]][pair[1]], transdict[pair[0]].strand, blocknum, pair[1], refdict[pair[1]].start, refdict[pair[1]].end, refdict[pair[1]].strand, j+1, pair[0])
-								wayout.write(outline)
+								outline = "{0}\tmicrosynteny\tmatch_part\t{1}\t{2}\t{3}\t{4}\t.\tID=blk-{5}.{10}.{11};Parent=blk-{5};Target={6} {7} {8} {9}\n".format( scaffold, transdict[pair[0]].start, transdict[pair[0]].end, blastdict[pair[0]][pair[1]], transdict[pair[0]].strand, blocknum, refgenenames[pair[1]], refdict[pair[1]].start, refdict[pair[1]].end, refdict[pair[1]].strand, j+1, querygenenames[pair[0]])
+								blocklines.append(outline)
 						############################
 						# otherwise use output of v1
 						else:
+							blocklines = []
 							for pair in syntenylist:
-								outline = "{}\t{}\tblk-{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(scaffold, refscaffold, blocknum, pair[0], transdict[pair[0]].start, transdict[pair[0]].end, transdict[pair[0]].strand, pair[1], refdict[pair[1]].start, refdict[pair[1]].end, refdict[pair[1]].strand, blastdict[pair[0]][pair[1]])
-								wayout.write(outline)
+								outline = "{}\t{}\tblk-{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(scaffold, refscaffold, blocknum, querygenenames[pair[0]], transdict[pair[0]].start, transdict[pair[0]].end, transdict[pair[0]].strand, refgenenames[pair[1]], refdict[pair[1]].start, refdict[pair[1]].end, refdict[pair[1]].strand, blastdict[pair[0]][pair[1]])
+								blocklines.append(outline)
+						wayout.write("".join(blocklines)) # one write for the whole block
 						blocknum += 1
 					else:
 						if is_verbose:
 							sys.stderr.write("# Block only contained {0} genes, ignoring block\n".format(blocklen) )
 				else:
 					if is_verbose:
-						sys.stderr.write("# Too few genes left from {} on scaffold {}, skipping walk\n".format(startingtrans, scaffold) )
-				lastmatch = str(blast_refgene)
+						sys.stderr.write("# Too few genes left from {} on scaffold {}, skipping walk\n".format(querygenenames[startingtrans], scaffold) )
+				lastmatch = blast_refgene
 	sys.stderr.write("# Found {} possible split genes  ".format(splitgenes) + time.asctime() + os.linesep)
 	sys.stderr.write("# Most genes on a query scaffold was {}  ".format(max(list(scaffoldgenecounts.keys()))) + time.asctime() + os.linesep)
 	genetotal = sum(x*y for x,y in blocklengths.items())
@@ -365,11 +409,35 @@ def main(argv, wayout):
 	parser.add_argument('-s','--span', type=int, default=5, help="max number of skippable genes [5]")
 	parser.add_argument('-z','--distance', type=int, default=30000, help="max distance on query scaffold before next gene [30000]")
 	parser.add_argument('-G','--make-gff', help="make GFF output, instead of tabular blocks", action="store_true")
+	parser.add_argument('--bgzip-out', help="write position-sorted, bgzipped GFF with tabix index to this file, instead of stdout")
+	parser.add_argument('--sort-lines', type=int, default=2000000, help="lines of --bgzip-out to sort in memory, more are sorted in temporary files [2000000]")
+	parser.add_argument('--jbrowse-out', help="write JBrowse NCList track to this directory, with one folder per scaffold, instead of stdout")
+	parser.add_argument('-o','--output', help="write output to this file instead of stdout, as BGZF if ending in .gz")
+	parser.add_argument('--buffer-size', type=int, default=1048576, help="characters of output to hold before each write [1048576]")
 	parser.add_argument('-R','--randomize', help="randomize positions of query GTF", action="store_true")
 	parser.add_argument('-S','--switch-query', help="switch query and subject", action="store_true")
 	parser.add_argument('-v','--verbose', help="verbose output", action="store_true")
+	parser.add_argument('--max-memory', type=parse_memory_size, help="memory budget, as 4G or 500M, blast hits are moved to a temporary database when near this")
+	parser.add_argument('-T','--temp-dir', help="directory for temporary files of --max-memory and --bgzip-out [system default]")
+	parser.add_argument('--report', help="write JSON report of time, counts and peak memory of each stage to this file")
 	args = parser.parse_args(argv)
 
+	if (args.bgzip_out or args.jbrowse_out) and not args.make_gff:
+		sys.exit("ERROR: --bgzip-out and --jbrowse-out require GFF output, use -G")
+	if sum(1 for outarg in (args.output, args.bgzip_out, args.jbrowse_out) if outarg) > 1:
+		sys.exit("ERROR: can only use one of -o, --bgzip-out and --jbrowse-out")
+	if args.bgzip_out:
+		from genomegtf.bgzf import SortedBgzfSink
+		wayout = SortedBgzfSink(args.bgzip_out, args.sort_lines, args.temp_dir)
+	elif args.jbrowse_out:
+		from genomegtf.jbrowse import NCListSink
+		wayout = NCListSink(args.jbrowse_out)
+	elif args.output:
+		wayout = open_output(args.output)
+	report = RunReport("microsynteny.py", argv)
+	# lines are joined and written in blocks, and -o is compressed on another thread
+	wayout = BufferedLineWriter(report.count_output(wayout), args.buffer_size, closeoutput=bool(args.output or args.bgzip_out or args.jbrowse_out))
+
 	sys.stderr.write("# Running command:\n{}\n".format( ' '.join(sys.argv) ) )
 
 	if args.minimum < 2:
@@ -390,14 +458,20 @@ def main(argv, wayout):
 		exclusionDict = None
 
 	### SETUP DICTIONARIES ###
-	if args.switch_query:
-		querydict = parse_gtf(args.db_gtf, args.no_genes, exclusionDict), args.db_delimiter
-		refdict = parse_gtf(args.query_gtf, args.no_genes, exclusionDict, args.query_delimiter, isref=True)
-		blastdict = parse_tabular_blast(args.blast, args.evalue, args.blast_query_delimiter, args.blast_db_delimiter, args.switch_query)
-	else:
-		querydict = parse_gtf(args.query_gtf, args.no_genes, exclusionDict, args.query_delimiter)
-		refdict = parse_gtf(args.db_gtf, args.no_genes, exclusionDict, args.db_delimiter, isref=True)
-		blastdict = parse_tabular_blast(args.blast, args.evalue, args.blast_query_delimiter, args.blast_db_delimiter)
+	querynames = SymbolTable() # gene names are only kept here, all else uses the ID
+	refnames = SymbolTable()
+	with report.stage("read GFF"):
+		if args.switch_query:
+			querydict = parse_gtf(args.db_gtf, args.no_genes, exclusionDict, args.db_delimiter, querynames, report=report)
+			refdict = parse_gtf(args.query_gtf, args.no_genes, exclusionDict, args.query_delimiter, refnames, isref=True, report=report)
+		else:
+			querydict = parse_gtf(args.query_gtf, args.no_genes, exclusionDict, args.query_delimiter, querynames, report=report)
+			refdict = parse_gtf(args.db_gtf, args.no_genes, exclusionDict, args.db_delimiter, refnames, isref=True, report=report)
+		report.count("query genes", sum(len(genes) for genes in querydict.values()) )
+		report.count("reference genes", sum(1 for gene in refdict if gene is not None) )
+	with report.stage("read blast"):
+		blastdict = parse_tabular_blast(args.blast, args.evalue, args.blast_query_delimiter, args.blast_db_delimiter, querynames, refnames, args.switch_query, budget=MemoryBudget.from_option(args.max_memory, args.temp_dir), report=report)
+		report.count("blast queries", sum(1 for hits in blastdict if hits is not None) )
 
 	### IF DOING RANDOMIZATION ###
 	if args.randomize:
@@ -406,7 +480,15 @@ def main(argv, wayout):
 	if args.make_gff:
 		sys.stderr.write("# make GFF output: {}\n".format( args.make_gff ) )
 	### START SYNTENY WALKING ###
-	synteny_walk(querydict, blastdict, refdict, args.minimum, args.span, args.distance,  args.verbose, wayout, args.make_gff)
+	with report.stage("synteny walk"):
+		synteny_walk(querydict, blastdict, refdict, querynames, refnames, args.minimum, args.span, args.distance,  args.verbose, wayout, args.make_gff)
+	if args.bgzip_out or args.jbrowse_out:
+		with report.stage("write sorted output"):
+			wayout.close()
+	else:
+		wayout.close()
+	if args.report:
+		report.write(args.report)
 
 if __name__ == "__main__":
-	main(sys.argv[1:],sys.stdout)
+	run_main(main, sys.argv[1:], sys.stdout)
@@ -8,6 +8,8 @@
 # renamed to blast2genewise.py 2015-05-12
 # v2.3 lowered default cutoff, minor edits 2015-05-19
 # v2.4 boundaries determined by missing protein coverage 2015-05-22
+# v2.5 genewise jobs run in a process pool, with retries 2026-10-18
+# v2.6 only the search region is extracted from an indexed genome 2026-10-18
 #
 # blast2gff.py convert blast output to gff format for genome annotation
 # translated from blast2gff.pl and parseblast.pl
@@ -20,7 +22,7 @@
 # http://dendrome.ucdavis.edu/resources/tooldocs/wise2/doc_wise2.html
 
 '''
-BLAST2GENEWISE.PY v2.4 2015-05-27
+BLAST2GENEWISE.PY v2.6 2026-10-18
 
   ## GENERAL OPERATION
 
@@ -33,9 +35,21 @@ blast2genewise.py -b tblastn_output.tab -q refprots.fa -d target_genome.fa
   groups of exons are clumped into a single first/last pair, which is used
   to determine the range on the contig
   this range is then used as an input parameter with the strand for genewise
-  currently this is a single process, though may later be integrated with
-  GNU parallel, to allow parallel processing of something like 20k commands
+  genewise jobs are run in a pool of -p processes, and output is
+  collected in the order of the jobs, so is the same for any -p
   single process operation could take 6-8 hours, which could become 1 hour
+  failed jobs are tried again up to -r times
+
+blast2genewise.py -b tblastn_output.tab -q refprots.fa -d target_genome.fa -p 8
+
+  gene IDs are numbered by query, as query.1, query.2, etc.
+
+  the genome is not loaded into memory, instead, only the search region
+  for each job is read from the memory-mapped fasta and written to a small
+  temporary file, which is deleted after the job
+  a samtools faidx index (target_genome.fa.fai) is used if present,
+  otherwise the fasta is scanned for headers, though in both cases
+  all lines of each sequence must be the same length
 
   ## GETTING BLAST RESULTS WITH TBLASTN
 
@@ -115,32 +129,36 @@ ML2635	GeneWise	exon	108689	108833	.	-	.	ID=ML199826a.1.exon2;Parent=ML199826a.1
 ML2635	GeneWise	CDS	108689	108833	.	-	2	ID=ML199826a.1.cds;Parent=ML199826a.1.mrna
 ML2635	GeneWise	exon	107522	107573	.	-	.	ID=ML199826a.1.exon3;Parent=ML199826a.1.mrna
 ML2635	GeneWise	CDS	107522	107573	.	-	1	ID=ML199826a.1.cds;Parent=ML199826a.1.mrna
-ML2635	GeneWise	gene	107039	107517	201.01	-	.	ID=ML199826a.1;Name=ML199826a.1
-ML2635	GeneWise	mRNA	107039	107517	.	-	.	ID=ML199826a.1.mrna;Parent=ML199826a.1
-ML2635	GeneWise	exon	107300	107517	.	-	.	ID=ML199826a.1.exon4;Parent=ML199826a.1.mrna
-ML2635	GeneWise	CDS	107300	107517	.	-	0	ID=ML199826a.1.cds;Parent=ML199826a.1.mrna
-ML2635	GeneWise	exon	107039	107156	.	-	.	ID=ML199826a.1.exon5;Parent=ML199826a.1.mrna
-ML2635	GeneWise	CDS	107039	107156	.	-	1	ID=ML199826a.1.cds;Parent=ML199826a.1.mrna
-ML2635	GeneWise	gene	104608	106411	694.22	-	.	ID=ML199826a.2;Name=ML199826a.2
-ML2635	GeneWise	mRNA	104608	106411	.	-	.	ID=ML199826a.2.mrna;Parent=ML199826a.2
-ML2635	GeneWise	exon	106341	106411	.	-	.	ID=ML199826a.2.exon1;Parent=ML199826a.2.mrna
-ML2635	GeneWise	CDS	106341	106411	.	-	0	ID=ML199826a.2.cds;Parent=ML199826a.2.mrna
-ML2635	GeneWise	exon	105952	106223	.	-	.	ID=ML199826a.2.exon2;Parent=ML199826a.2.mrna
-ML2635	GeneWise	CDS	105952	106223	.	-	1	ID=ML199826a.2.cds;Parent=ML199826a.2.mrna
-ML2635	GeneWise	exon	105416	105758	.	-	.	ID=ML199826a.2.exon3;Parent=ML199826a.2.mrna
-ML2635	GeneWise	CDS	105416	105758	.	-	2	ID=ML199826a.2.cds;Parent=ML199826a.2.mrna
-ML2635	GeneWise	exon	105168	105276	.	-	.	ID=ML199826a.2.exon4;Parent=ML199826a.2.mrna
-ML2635	GeneWise	CDS	105168	105276	.	-	1	ID=ML199826a.2.cds;Parent=ML199826a.2.mrna
-ML2635	GeneWise	exon	104869	105041	.	-	.	ID=ML199826a.2.exon5;Parent=ML199826a.2.mrna
-ML2635	GeneWise	CDS	104869	105041	.	-	0	ID=ML199826a.2.cds;Parent=ML199826a.2.mrna
-ML2635	GeneWise	exon	104608	104725	.	-	.	ID=ML199826a.2.exon6;Parent=ML199826a.2.mrna
-ML2635	GeneWise	CDS	104608	104725	.	-	1	ID=ML199826a.2.cds;Parent=ML199826a.2.mrna"""
+ML2635	GeneWise	gene	107039	107517	201.01	-	.	ID=ML199826a.2;Name=ML199826a.2
+ML2635	GeneWise	mRNA	107039	107517	.	-	.	ID=ML199826a.2.mrna;Parent=ML199826a.2
+ML2635	GeneWise	exon	107300	107517	.	-	.	ID=ML199826a.2.exon1;Parent=ML199826a.2.mrna
+ML2635	GeneWise	CDS	107300	107517	.	-	0	ID=ML199826a.2.cds;Parent=ML199826a.2.mrna
+ML2635	GeneWise	exon	107039	107156	.	-	.	ID=ML199826a.2.exon2;Parent=ML199826a.2.mrna
+ML2635	GeneWise	CDS	107039	107156	.	-	1	ID=ML199826a.2.cds;Parent=ML199826a.2.mrna
+ML2635	GeneWise	gene	104608	106411	694.22	-	.	ID=ML199826a.3;Name=ML199826a.3
+ML2635	GeneWise	mRNA	104608	106411	.	-	.	ID=ML199826a.3.mrna;Parent=ML199826a.3
+ML2635	GeneWise	exon	106341	106411	.	-	.	ID=ML199826a.3.exon1;Parent=ML199826a.3.mrna
+ML2635	GeneWise	CDS	106341	106411	.	-	0	ID=ML199826a.3.cds;Parent=ML199826a.3.mrna
+ML2635	GeneWise	exon	105952	106223	.	-	.	ID=ML199826a.3.exon2;Parent=ML199826a.3.mrna
+ML2635	GeneWise	CDS	105952	106223	.	-	1	ID=ML199826a.3.cds;Parent=ML199826a.3.mrna
+ML2635	GeneWise	exon	105416	105758	.	-	.	ID=ML199826a.3.exon3;Parent=ML199826a.3.mrna
+ML2635	GeneWise	CDS	105416	105758	.	-	2	ID=ML199826a.3.cds;Parent=ML199826a.3.mrna
+ML2635	GeneWise	exon	105168	105276	.	-	.	ID=ML199826a.3.exon4;Parent=ML199826a.3.mrna
+ML2635	GeneWise	CDS	105168	105276	.	-	1	ID=ML199826a.3.cds;Parent=ML199826a.3.mrna
+ML2635	GeneWise	exon	104869	105041	.	-	.	ID=ML199826a.3.exon5;Parent=ML199826a.3.mrna
+ML2635	GeneWise	CDS	104869	105041	.	-	0	ID=ML199826a.3.cds;Parent=ML199826a.3.mrna
+ML2635	GeneWise	exon	104608	104725	.	-	.	ID=ML199826a.3.exon6;Parent=ML199826a.3.mrna
+ML2635	GeneWise	CDS	104608	104725	.	-	1	ID=ML199826a.3.cds;Parent=ML199826a.3.mrna"""
 #
 import sys
 import os
 import argparse
 import time
 import subprocess
+import shutil
+import multiprocessing
+import mmap
+import tempfile
 from collections import defaultdict
 from Bio import SeqIO
 #
@@ -207,11 +225,7 @@ class ProteinMatch:
 	def contig_span(self):
 		return abs(self.gend_position - self.gstart_position)
 	def base_per_aa(self):
-		return self.contig_span() / self.prot_span()
-
-def write_line(outlist, wayout):
-	outline = "\t".join(outlist)
-	print >> wayout, outline
+		return self.contig_span() // self.prot_span()
 
 def blast_index_to_python(index):
 	# python indeces are 1 less than blast
@@ -251,7 +265,7 @@ def get_pm_positions(sortedhits, querylen, verbose, slidecutoff=0.1):
 	# generate a protein match each time exon order goes from beginning to end
 	for i,hit in enumerate(sortedhits):
 		if verbose: # debugging purposes, show hits in order
-			print >> sys.stdout, hit
+			sys.stdout.write("{}\n".format(hit) )
 		iqend = hit[1]
 		# checks if the current end position is earlier than the most recent max, this allows a drop in value of the sildecutoff, which is by default 10 percent
 		if iqend < (lastqend - (querylen * slidecutoff) ):
@@ -297,12 +311,12 @@ def check_match_length(protMatches, querylen, covcutoff, verbose, min_protein=10
 	### TODO possibly have lower covcutoff for longer proteins, like 65% for short ones and 50% for long
 	for pm in protMatches:
 		if verbose:
-			print >> sys.stdout, "match length is %d vs query %d" % (pm.prot_span(), querylen)
+			sys.stdout.write("match length is %d vs query %d\n" % (pm.prot_span(), querylen) )
 		if pm.check_cov(querylen, covcutoff) and querylen > min_protein:
 			#flset = (pm.gstart_position, pm.gend_position)
 			longMatches.append(pm)
 	if verbose:
-		print >> sys.stdout, "%d of %d matches are above cutoff" % (len(longMatches), len(protMatches))
+		sys.stdout.write("%d of %d matches are above cutoff\n" % (len(longMatches), len(protMatches)) )
 	return longMatches
 
 def get_strand(isstart, isend):
@@ -341,8 +355,68 @@ def adjust_boundaries(startval, endval, uinverval, vinterval, contiglen):
 		vvalue = contiglen
 	return uvalue, vvalue
 
-def print_new_gff(stdoutLines, outFile, queryname, counter, gffTag, doexons):
+def fasta_index_from_fai(faifile):
+	'''read samtools faidx index, return dict where key is contig and value is tuple of (byte offset, length, bases per line, bytes per line)'''
+	contigindex = {}
+	for line in open(faifile,'r'):
+		lsplits = line.rstrip().split("\t")
+		if len(lsplits) < 5:
+			continue
+		contigindex[lsplits[0]] = (int(lsplits[2]), int(lsplits[1]), int(lsplits[3]), int(lsplits[4]))
+	return contigindex
+
+def fasta_index_from_mmap(fastamap):
+	'''scan memory-mapped fasta for headers, return dict as fasta_index_from_fai'''
+	contigindex = {}
+	if fastamap[0:1]==b">":
+		headerpos = 0
+	else: # skip anything before the first header, or return nothing if there are no headers
+		headerpos = fastamap.find(b"\n>")
+		headerpos = headerpos + 1 if headerpos > -1 else -1
+	filesize = len(fastamap)
+	while headerpos > -1:
+		headerend = fastamap.find(b"\n", headerpos)
+		if headerend < 0: # header with no sequence at end of file
+			break
+		contig = fastamap[headerpos+1:headerend].split(None,1)[0].decode()
+		seqstart = headerend + 1
+		nextheader = fastamap.find(b"\n>", headerend)
+		seqend = nextheader if nextheader > -1 else filesize
+		while seqend > seqstart and fastamap[seqend-1:seqend] in (b"\n", b"\r"): # trim line breaks at end
+			seqend -= 1
+		firstbreak = fastamap.find(b"\n", seqstart, seqend)
+		if firstbreak < 0: # sequence on a single line
+			linebytes = seqend - seqstart + 1
+			linebases = seqend - seqstart
+		else:
+			linebytes = firstbreak - seqstart + 1
+			linebases = linebytes - 2 if fastamap[firstbreak-1:firstbreak]==b"\r" else linebytes - 1
+		seqbytes = seqend - seqstart
+		seqlength = (seqbytes // linebytes) * linebases + min(seqbytes % linebytes, linebases) if linebases else 0
+		contigindex[contig] = (seqstart, seqlength, linebases, linebytes)
+		headerpos = nextheader + 1 if nextheader > -1 else -1
+	return contigindex
+
+def extract_region(fastamap, contigtuple, startpos, endpos):
+	'''return sequence as bytes from startpos to endpos, counting from 1 and including both ends'''
+	seqstart, seqlength, linebases, linebytes = contigtuple
+	startbyte = seqstart + ((startpos-1) // linebases) * linebytes + (startpos-1) % linebases
+	endbyte = seqstart + ((endpos-1) // linebases) * linebytes + (endpos-1) % linebases + 1
+	region = fastamap[startbyte:endbyte].replace(b"\n",b"").replace(b"\r",b"")
+	if len(region) != endpos - startpos + 1 or region.find(b">") > -1:
+		raise ValueError("cannot extract {}-{}, lines may not be the same length".format(startpos, endpos))
+	return region
+
+def write_fasta_region(fastahandle, seqname, region, linelength=60):
+	'''write bytes of sequence as fasta to an open binary file'''
+	fastahandle.write(">{}\n".format(seqname).encode() )
+	for i in range(0, len(region), linelength):
+		fastahandle.write(region[i:i+linelength] + b"\n")
+
+def print_new_gff(stdoutLines, outFile, queryname, genecounter, gffTag, doexons, offset=0):
 	# output is in bitstring format, so must split by line breaks first
+	# each match is numbered as a new gene for that query, in the order written
+	# offset is added to all positions, if genewise was run on a region of the contig
 	exoncounter = 0
 	for line in stdoutLines.split("\n"):
 		# disregard empty lines and comment lines
@@ -352,24 +426,27 @@ def print_new_gff(stdoutLines, outFile, queryname, counter, gffTag, doexons):
 			if gffTag:
 				gffSplits[1] = str(gffTag)
 			# check for correct start/end format, otherwise switch positions
-			if int(gffSplits[3]) > int(gffSplits[4]):
-				gffSplits[3], gffSplits[4] = gffSplits[4], gffSplits[3]
+			gffstart, gffend = int(gffSplits[3]) + offset, int(gffSplits[4]) + offset
+			gffSplits[3], gffSplits[4] = str(min(gffstart, gffend)), str(max(gffstart, gffend))
 			# add the modified attribute string
 			if gffSplits[2]=="intron": # skip introns
 				continue
 			elif gffSplits[2]=="match":
+				genecounter[queryname] += 1
+				counter = genecounter[queryname]
+				exoncounter = 0
 				# should be "translated_nucleotide_match" if anything
 				gffSplits[2] = "gene"
 				attrstring = "ID={0}.{1};Name={0}.{1}".format(queryname, counter)
 				gffSplits[8] = attrstring
-				print >> outFile, "\t".join(gffSplits)
+				outFile.write("\t".join(gffSplits) + "\n")
 				parent = "Parent={0}.{1}".format(queryname, counter)
 				# mRNA line is necessary, but exons are not
 				gffSplits[2] = "mRNA"
 				gffSplits[5] = "."
 				attrstring = "ID={0}.{1}.mrna;{2}".format(queryname, counter, parent)
 				gffSplits[8] = attrstring
-				print >> outFile, "\t".join(gffSplits)
+				outFile.write("\t".join(gffSplits) + "\n")
 				parent = "Parent={0}.{1}.mrna".format(queryname, counter)
 			elif gffSplits[2]=="cds":
 				if doexons:
@@ -380,13 +457,50 @@ def print_new_gff(stdoutLines, outFile, queryname, counter, gffTag, doexons):
 					gffSplits[7] = "." # exon is displayed without phase
 					attrstring = "ID={0}.{1}.exon{3};{2}".format(queryname, counter, parent, exoncounter)
 					gffSplits[8] = attrstring
-					print >> outFile, "\t".join(gffSplits)
+					outFile.write("\t".join(gffSplits) + "\n")
 					gffSplits[7] = intronphase # phase is put back for CDS
 				gffSplits[2] = "CDS"
 				gffSplits[5] = "."
 				attrstring = "ID={0}.{1}.cds;{2}".format(queryname, counter, parent)
 				gffSplits[8] = attrstring
-				print >> outFile, "\t".join(gffSplits)
+				outFile.write("\t".join(gffSplits) + "\n")
+
+worker_state = {}
+
+def init_genewise_worker(retries, dbfile, dbindex, tempdir):
+	worker_state["retries"] = retries
+	dbhandle = open(dbfile, 'rb')
+	worker_state["map"] = mmap.mmap(dbhandle.fileno(), 0, access=mmap.ACCESS_READ)
+	worker_state["index"] = dbindex
+	worker_state["tempdir"] = tempdir
+
+def run_genewise_job(genewisejob):
+	'''write the search region to a temporary file and run genewise on it, return tuple of gff text, number of tries, and error message or None'''
+	targetid, contig, uvalue, vvalue, strandflag, queryName = genewisejob
+	try:
+		region = extract_region(worker_state["map"], worker_state["index"][contig], uvalue, vvalue)
+	except ValueError as ve:
+		return "", 0, "{} {}".format(contig, ve)
+	with tempfile.NamedTemporaryFile(suffix=".fa", dir=worker_state["tempdir"], delete=False) as rf:
+		write_fasta_region(rf, contig, region)
+	gwCommand = ["genewise", "-gff", strandflag, queryName, rf.name]
+	try:
+		return run_genewise_command(gwCommand)
+	finally:
+		os.remove(rf.name)
+
+def run_genewise_command(gwCommand):
+	'''run one genewise command, return tuple of gff text, number of tries, and error message or None, only trying again after a non-zero exit status'''
+	for attempt in range(1, worker_state["retries"]+2):
+		try:
+			gwcall = subprocess.run(gwCommand, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		except OSError as oe: # genewise could not be started, so trying again would fail the same way
+			return "", attempt, str(oe)
+		if gwcall.returncode==0:
+			return gwcall.stdout.decode(), attempt, None
+		errlines = gwcall.stderr.decode().strip().split("\n")
+		errmsg = "exit status {}, {}".format(gwcall.returncode, errlines[-1])
+	return "", attempt, errmsg
 
 def main(argv, wayout):
 	if not len(argv):
@@ -406,7 +520,8 @@ def main(argv, wayout):
 	parser.add_argument('-n','--tandem-distance', type=int, default=10000, help="allowed distance between full hits [10000]")
 	parser.add_argument('-C','--commands', action="store_true", help="write commands to file instead of running")
 	parser.add_argument('-E','--exons', action="store_false", help="exclude gff3 features for exons")
-	parser.add_argument('-p','--processors', type=int, default=1, help="number of processors for parallel [1]")
+	parser.add_argument('-p','--processors', type=int, default=1, help="number of genewise jobs to run at once [1]")
+	parser.add_argument('-r','--retries', type=int, default=2, help="number of times to try again a failed genewise job [2]")
 	parser.add_argument('-v','--verbose', help="verbose output", action="store_true")
 	args = parser.parse_args(argv)
 
@@ -419,15 +534,15 @@ def main(argv, wayout):
 	# define temporary directory
 	tempdir = os.path.abspath(args.temp)
 	if os.path.isdir(tempdir):
-		print >> sys.stderr, "The directory {0} already exists, and will be used".format(tempdir)
+		sys.stderr.write("The directory {0} already exists, and will be used\n".format(tempdir) )
 	else:
-		print >> sys.stderr, "Making the directory {0}".format(tempdir)
+		sys.stderr.write("Making the directory {0}\n".format(tempdir) )
 		os.mkdir(tempdir)
 
 	starttime = time.time()
-	print >> sys.stderr, "Starting BLAST parsing on %s" % (args.blast), time.asctime()
-	print >> sys.stderr, "Bad hits will be removed with the following parameters"
-	print >> sys.stderr, "Min length: %d; Min e-value: %.2e; Min bits-to-length ratio: %.2f" % (args.hsp_length, args.evalue, args.score_cutoff)
+	sys.stderr.write("Starting BLAST parsing on %s  " % (args.blast) + time.asctime() + os.linesep)
+	sys.stderr.write("Bad hits will be removed with the following parameters\n")
+	sys.stderr.write("Min length: %d; Min e-value: %.2e; Min bits-to-length ratio: %.2f\n" % (args.hsp_length, args.evalue, args.score_cutoff) )
 
 	# PART 1
 	#
@@ -460,9 +575,9 @@ def main(argv, wayout):
 		# must use setdefault since get(qseqid, []) returns None, and cannot append
 		blasthitdict[sseqid].setdefault(qseqid, []).append(hittuple)
 		exoncounter += 1
-	print >> sys.stderr, "Parsed %d lines" % (linecounter), time.asctime()
-	print >> sys.stderr, "Counted %d putative exons" % (exoncounter), time.asctime()
-	print >> sys.stderr, "Removed %d weak hits" % (badhits), time.asctime()
+	sys.stderr.write("Parsed %d lines  " % (linecounter) + time.asctime() + os.linesep)
+	sys.stderr.write("Counted %d putative exons  " % (exoncounter) + time.asctime() + os.linesep)
+	sys.stderr.write("Removed %d weak hits  " % (badhits) + time.asctime() + os.linesep)
 
 	# PART II
 	#
@@ -471,127 +586,164 @@ def main(argv, wayout):
 	plusstrand, minusstrand = 0,0
 	# counter for potentially overlapping hits or tandem duplicates
 	tandemdups = 0
-	hitDictCounter = defaultdict(int)
 
-	print >> sys.stderr, "Reading query sequences from %s" % (args.query), time.asctime()
+	sys.stderr.write("Reading query sequences from %s  " % (args.query) + time.asctime() + os.linesep)
 	querydict = SeqIO.to_dict(SeqIO.parse(args.query, 'fasta'))
-	print >> sys.stderr, "Counted %d query sequences" % (len(querydict)), time.asctime()
-	print >> sys.stderr, "Reading database sequences from %s" % (args.db), time.asctime()
-	dbdict = SeqIO.to_dict(SeqIO.parse(args.db, 'fasta'))
-	print >> sys.stderr, "Counted %d db sequences" % (len(dbdict)), time.asctime()
+	sys.stderr.write("Counted %d query sequences  " % (len(querydict)) + time.asctime() + os.linesep)
+	if args.db.rsplit('.',1)[-1]=="gz":
+		sys.exit("ERROR: database {} must be uncompressed to read regions".format(args.db) )
+	dbhandle = open(args.db, 'rb')
+	dbmap = mmap.mmap(dbhandle.fileno(), 0, access=mmap.ACCESS_READ)
+	if os.path.isfile(args.db + ".fai"):
+		sys.stderr.write("Reading database index from %s.fai  " % (args.db) + time.asctime() + os.linesep)
+		dbindex = fasta_index_from_fai(args.db + ".fai")
+	else:
+		sys.stderr.write("Indexing database sequences from %s  " % (args.db) + time.asctime() + os.linesep)
+		dbindex = fasta_index_from_mmap(dbmap)
+	sys.stderr.write("Counted %d db sequences  " % (len(dbindex)) + time.asctime() + os.linesep)
+
+	# list of tuples of query name, contig, region, strand, and query file, in order of contigs and queries
+	genewisejobs = []
+	queryfiles = {} # key is query, value is temporary file, each query is written once
+	sys.stderr.write("Sorting %d contigs with valid hits  " % (len(blasthitdict) ) + time.asctime() + os.linesep)
+	for contig in blasthitdict.keys():
+		if contig not in dbindex:
+			sys.exit("ERROR: cannot find blast subject {} in {}".format(contig, args.db) )
+		contiglen = dbindex[contig][1]
+
+		# make a list of each query that hit the contig, which is the keys
+		matchingqueries = blasthitdict[contig].keys()
+
+		for query in matchingqueries:
+			# if that query is used, make a temp file of only that sequence
+			queryName = queryfiles.get(query)
+			if queryName is None:
+				queryName = os.path.join(tempdir, "{}.fa".format(query) ).replace("|","_")
+				with open(queryName, 'w') as qf:
+					qf.write(querydict[query].format("fasta") )
+				queryfiles[query] = queryName
+
+		# separate hits by strand, so only those on the same strand are counted together
+			forwardhits = []
+			reversehits = []
+			for hit in blasthitdict[contig][query]:
+				# strand is defined by whether the end is larger than the start value
+				strand = get_strand(hit[2], hit[3])
+				# depending on strand, add to forward or reverse
+				if strand:
+					forwardhits.append(hit)
+					plusexons += 1
+				else:
+					reversehits.append(hit)
+					minusexons += 1
+			# to check if full hits are long enough, get the length of the query protein
+			querylen = len(querydict[query].seq)
+			targetid = query.replace("|","")
+
+		# within forward hits
+			if forwardhits:
+				protMatches = get_pm_positions(sorted(forwardhits, key=lambda x: x[3]), querylen, args.verbose)
+				longMatches = check_match_length(protMatches, querylen, args.min_coverage, args.verbose)
+				tandemdups += tandem_counter(args.tandem_distance, protMatches)
+				for pm in longMatches:
+					plusstrand += 1
+					uinterval, vinterval = calc_coverage_drop(pm.pstart_position, pm.pend_position, querylen, pm.base_per_aa(), args.interval_distance )
+					uvalue, vvalue = adjust_boundaries(pm.gstart_position, pm.gend_position, uinterval, vinterval, contiglen)
+					# strand should be either -trev or -tfor
+					# which are the genewise options for reverse (-) and forward (+)
+					genewisejobs.append( (targetid, contig, uvalue, vvalue, "-tfor", queryName) )
+
+			# within reverse hits
+			if reversehits:
+				protMatches = get_pm_positions(sorted(reversehits, key=lambda x: x[2], reverse=True), querylen, args.verbose)
+				longMatches = check_match_length(protMatches, querylen, args.min_coverage, args.verbose)
+				tandemdups += tandem_counter(args.tandem_distance, protMatches)
+				for pm in longMatches:
+					minusstrand += 1
+					# intervals are switched since the end of the protein is at 5prime end
+					vinterval, uinterval = calc_coverage_drop(pm.pstart_position, pm.pend_position, querylen, pm.base_per_aa(), args.interval_distance )
+					# gend and gstart positions are switched, since it is reverse
+					uvalue, vvalue = adjust_boundaries(pm.gend_position, pm.gstart_position, uinterval, vinterval, contiglen)
+					genewisejobs.append( (targetid, contig, uvalue, vvalue, "-trev", queryName) )
+
+	# these counts relate only to the preprocessing, and not to the output of genewise
+	sys.stderr.write("Counted %d forward exons and %d reverse exons  " % (plusexons, minusexons) + time.asctime() + os.linesep)
+	sys.stderr.write("Found %d forward and %d reverse hits  " % (plusstrand, minusstrand) + time.asctime() + os.linesep)
+	sys.stderr.write("Found %d possible tandem duplicates  " % (tandemdups) + time.asctime() + os.linesep)
 
 	# for either direct output or written as output for each command
-	#genewiseGff = "{}_genewise_{}.gff".format(args.blast, time.strftime("%Y%m%d") )
 	genewiseGff = "{}_genewise_{}.gff".format(args.blast, time.strftime("%Y%m%d-%H%M%S") )
 	if os.path.isfile(genewiseGff):
-		print >> sys.stderr, "File %s already exists, results will be appended" % (genewiseGff), time.asctime()
+		sys.stderr.write("File %s already exists, results will be appended  " % (genewiseGff) + time.asctime() + os.linesep)
+
 	# if using commands argument, make a file listing the commands instead of running them
 	if args.commands:
 		# generate a file for commands to be called in parallel
 		genewiseCommands = "genewise_commands_{}.sh".format(time.strftime("%Y%m%d-%H%M%S"))
-		genewiseoutput = genewiseCommands
-		print >> sys.stderr, "Writing commands to %s" % (genewiseCommands), time.asctime()
-	else:
-		# generate the gff output filename
-		genewiseoutput = genewiseGff
-		print >> sys.stderr, "Writing hits to %s" % (genewiseGff), time.asctime()
-
-	# in either case for the output, write to genewiseoutput file
-	with open(genewiseoutput, 'a') as gwo:
-		# sort through each contig
-		print >> sys.stderr, "Sorting %d contigs with valid hits" % (len(blasthitdict) ), time.asctime()
-		for contig in blasthitdict.iterkeys():
-			# make temporary file for each contig with hits
-			contigName = os.path.join(tempdir, "{}.fa".format(contig) ).replace("|","_")
-			with open(contigName, 'w') as cf:
-				cf.write(dbdict[contig].format("fasta") )
-
-			contiglen = len(dbdict[contig].seq)
-
-			# make a list of each query that hit the contig, which is the keys
-			matchingqueries = blasthitdict[contig].keys()
-
-			for query in matchingqueries:
-				# if that query is used, make a temp file of only that sequence
-				queryName = os.path.join(tempdir, "{}.fa".format(query) ).replace("|","_")
-				with open(queryName, 'w') as qf:
-					qf.write(querydict[query].format("fasta") )
-
-			# separate hits by strand, so only those on the same strand are counted together
-				forwardhits = []
-				reversehits = []
-				for hit in blasthitdict[contig][query]:
-					# strand is defined by whether the end is larger than the start value
-					strand = get_strand(hit[2], hit[3])
-					# depending on strand, add to forward or reverse
-					if strand:
-						forwardhits.append(hit)
-						plusexons += 1
-					else:
-						reversehits.append(hit)
-						minusexons += 1
-				# to check if full hits are long enough, get the length of the query protein
-				querylen = len(querydict[query].seq)
-				targetid = query.replace("|","")
-
-			# within forward hits
-				if forwardhits:
-					protMatches = get_pm_positions(sorted(forwardhits, key=lambda x: x[3]), querylen, args.verbose)
-					longMatches = check_match_length(protMatches, querylen, args.min_coverage, args.verbose)
-					tandemdups += tandem_counter(args.tandem_distance, protMatches)
-					for pm in longMatches:
-						plusstrand += 1
-						hitDictCounter[targetid] += 1
-						uinterval, vinterval = calc_coverage_drop(pm.pstart_position, pm.pend_position, querylen, pm.base_per_aa(), args.interval_distance )
-						uvalue, vvalue = adjust_boundaries(pm.gstart_position, pm.gend_position, uinterval, vinterval, contiglen)
-						# strand should be either -trev or -tfor
-						# which are the genewise options for reverse (-) and forward (+)
-						gwCommand = ["genewise", "-gff", "-tfor", "-u", "%d" % uvalue, "-v", "%d" % vvalue, queryName, contigName]
-						if args.commands:
-							print >> gwo, " ".join(gwCommand), ">> {}".format(genewiseGff)
-						else:
-							if args.verbose:
-								print >> sys.stdout, "Calling command:\n%s" % (" ".join(gwCommand) )
-							gwcall = subprocess.Popen(gwCommand, stdout=subprocess.PIPE)
-							gffLines = gwcall.communicate()[0]
-							# if there is any output
-							if gffLines:
-								#IDstring = make_attr_string(targetid, hitDictCounter[targetid], pm.pstart_position, pm.pend_position)
-								print_new_gff(gffLines, gwo, targetid, hitDictCounter[targetid], args.gff, args.exons)
-
-				# within reverse hits
-				if reversehits:
-					protMatches = get_pm_positions(sorted(reversehits, key=lambda x: x[2], reverse=True), querylen, args.verbose)
-					longMatches = check_match_length(protMatches, querylen, args.min_coverage, args.verbose)
-					tandemdups += tandem_counter(args.tandem_distance, protMatches)
-					for pm in longMatches:
-						minusstrand += 1
-						hitDictCounter[targetid] += 1
-						# intervals are switched since the end of the protein is at 5prime end
-						vinterval, uinterval = calc_coverage_drop(pm.pstart_position, pm.pend_position, querylen, pm.base_per_aa(), args.interval_distance )
-						# gend and gstart positions are switched, since it is reverse
-						uvalue, vvalue = adjust_boundaries(pm.gend_position, pm.gstart_position, uinterval, vinterval, contiglen)
-						gwCommand = ["genewise", "-gff", "-trev", "-u", "%d" % uvalue, "-v", "%d" % vvalue, queryName, contigName]
-						if args.commands:
-							print >> gwo, " ".join(gwCommand), ">> {}".format(genewiseGff)
-						else:
-							if args.verbose:
-								print >> sys.stdout, "Calling command:\n%s" % (" ".join(gwCommand) )
-							gwcall = subprocess.Popen(gwCommand, stdout=subprocess.PIPE)
-							gffLines = gwcall.communicate()[0]
-							# if there is any output
-							if gffLines:
-								print_new_gff(gffLines, gwo, targetid, hitDictCounter[targetid], args.gff, args.exons)
-
-	# these counts relate only to the preprocessing, and not to the output of genewise
-	print >> sys.stderr, "Counted %d forward exons and %d reverse exons" % (plusexons, minusexons), time.asctime()
-	print >> sys.stderr, "Found %d forward and %d reverse hits" % (plusstrand, minusstrand), time.asctime()
-	print >> sys.stderr, "Found %d possible tandem duplicates" % (tandemdups), time.asctime()
-	print >> sys.stderr, "Processed completed in %.1f minutes" % ( (time.time()-starttime)/60)
-	if args.commands:
+		sys.stderr.write("Writing %d commands to %s  " % (len(genewisejobs), genewiseCommands) + time.asctime() + os.linesep)
+		# commands are given the full contig, so each contig with hits is written once
+		contigfiles = {}
+		with open(genewiseCommands, 'a') as gwo:
+			for targetid, contig, uvalue, vvalue, strandflag, queryName in genewisejobs:
+				contigName = contigfiles.get(contig)
+				if contigName is None:
+					contigName = os.path.join(tempdir, "{}.fa".format(contig) ).replace("|","_")
+					with open(contigName, 'wb') as cf:
+						write_fasta_region(cf, contig, extract_region(dbmap, dbindex[contig], 1, dbindex[contig][1]) )
+					contigfiles[contig] = contigName
+				gwCommand = ["genewise", "-gff", strandflag, "-u", "%d" % uvalue, "-v", "%d" % vvalue, queryName, contigName]
+				gwo.write(" ".join(gwCommand) + " >> {}\n".format(genewiseGff) )
+		sys.stderr.write("Processed completed in %.1f minutes\n" % ( (time.time()-starttime)/60) )
 		genewiselog = "{}_genewise.log".format(args.blast)
-		print >> sys.stderr, "RUN THIS COMMAND TO START PARALLEL PROCESSING:"
-		print >> sys.stderr, "parallel --gnu -a {0} -j {1} --joblog {2} --halt 1".format(genewiseCommands, args.processors, genewiselog)
+		sys.stderr.write("RUN THIS COMMAND TO START PARALLEL PROCESSING:\n")
+		sys.stderr.write("parallel --gnu -a {0} -j {1} --joblog {2} --halt 1\n".format(genewiseCommands, args.processors, genewiselog) )
+		return 0
+
+	# PART III
+	#
+	if shutil.which("genewise") is None: # check once, instead of failing every job
+		sys.exit("ERROR: cannot find genewise in the PATH")
+	sys.stderr.write("Running %d genewise jobs on %d processors, writing hits to %s  " % (len(genewisejobs), args.processors, genewiseGff) + time.asctime() + os.linesep)
+	if args.verbose:
+		for targetid, contig, uvalue, vvalue, strandflag, queryName in genewisejobs:
+			sys.stdout.write("Calling genewise %s for %s on %s:%d-%d\n" % (strandflag, queryName, contig, uvalue, vvalue) )
+	workerargs = (args.retries, args.db, dbindex, tempdir)
+	if args.processors > 1:
+		workerpool = multiprocessing.Pool(args.processors, init_genewise_worker, workerargs)
+		# imap returns results in the order of the jobs, so numbering is the same for any number of processors
+		gwresults = workerpool.imap(run_genewise_job, genewisejobs)
+	else:
+		init_genewise_worker(*workerargs)
+		gwresults = map(run_genewise_job, genewisejobs)
+
+	jobstarttime = time.time()
+	genecounter = defaultdict(int) # key is query ID, value is number of genes written
+	retriedjobs, failedjobs = 0, 0
+	reportinterval = max(100, len(genewisejobs)//20)
+	with open(genewiseGff, 'a') as gwo:
+		for jobnumber, (gffLines, tries, errmsg) in enumerate(gwresults, 1):
+			targetid, contig, uvalue = genewisejobs[jobnumber-1][0:3]
+			if tries > 1:
+				retriedjobs += 1
+			if errmsg:
+				failedjobs += 1
+				sys.stderr.write("WARNING: genewise failed after %d tries for %s on %s: %s\n" % (tries, targetid, contig, errmsg) )
+			# if there is any output
+			if gffLines:
+				# positions from genewise start from the beginning of the region
+				print_new_gff(gffLines, gwo, targetid, genecounter, args.gff, args.exons, uvalue-1)
+			if not jobnumber % reportinterval:
+				jobminutes = (time.time()-jobstarttime)/60
+				sys.stderr.write("Finished %d of %d jobs, %.1f jobs per minute  " % (jobnumber, len(genewisejobs), jobnumber/max(jobminutes,0.001)) + time.asctime() + os.linesep)
+	if args.processors > 1:
+		workerpool.close()
+		workerpool.join()
+
+	jobminutes = (time.time()-jobstarttime)/60
+	sys.stderr.write("Ran %d genewise jobs in %.1f minutes, %.1f jobs per minute\n" % (len(genewisejobs), jobminutes, len(genewisejobs)/max(jobminutes,0.001)) )
+	sys.stderr.write("Retried %d jobs, %d jobs failed\n" % (retriedjobs, failedjobs) )
+	sys.stderr.write("Wrote %d genes for %d queries  " % (sum(genecounter.values()), len(genecounter)) + time.asctime() + os.linesep)
+	sys.stderr.write("Processed completed in %.1f minutes\n" % ( (time.time()-starttime)/60) )
 
 if __name__ == "__main__":
 	main(sys.argv[1:],sys.stdout)
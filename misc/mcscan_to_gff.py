@@ -1,140 +1,209 @@
 #!/usr/bin/env python
 
-'''mcscan_to_gff.py  last modified 2018-10-31
+'''mcscan_to_gff.py  last modified 2026-10-18
 convert mcscanX synteny output to GFF-like file
 
-mcscan_to_gff.py -c g1_v_g2.collinearity > g1_v_g2.collinearity.gff
+mcscan_to_gff.py -c g1_v_g2.collinearity --short-positions g1_g2.gff > g1_v_g2.collinearity.gff
+
+    gene positions can instead be read from the GFF or GTF of both genomes
+    using the features named by --transcript, with IDs matching mcscanX
+
+mcscan_to_gff.py -c g1_v_g2.collinearity -g g1.gff g2.gtf.gz > g1_v_g2.collinearity.gff
 '''
 
 import sys
+import os
+import re
+import time
+import gzip
 import argparse
+from array import array
+
+class GenePositions:
+	'''compact index of gene intervals, where get(gene) returns a tuple of start and end'''
+	def __init__(self):
+		self.rows = {} # key is gene name, value is row in the arrays
+		self.starts = array('l')
+		self.ends = array('l')
+	def add(self, geneid, start, end):
+		row = self.rows.get(geneid)
+		if row is None:
+			self.rows[geneid] = len(self.starts)
+			self.starts.append(start)
+			self.ends.append(end)
+		else: # for duplicate IDs, use the last one
+			self.starts[row], self.ends[row] = start, end
+	def get(self, geneid):
+		row = self.rows.get(geneid)
+		if row is None:
+			return None
+		return self.starts[row], self.ends[row]
+	def __len__(self):
+		return len(self.rows)
 
 def read_scaffold_keys(renamefile):
 	'''read short scaffold keys into dictionary, where key is short key, and value is full name'''
 	scaffold_names = {} # key is short key (meaning can be indexed), value is long name
 	# should be tab-delimited, in order of
 	# short01   full_contig_name_01
-	print >> sys.stderr, "# reading scaffold names from {}".format(renamefile)
+	sys.stderr.write("# reading scaffold names from {}\n".format(renamefile) )
 	for line in open(renamefile,'r'):
 		line = line.strip()
 		if line:
 			shortname, longname = line.split("\t")
 			scaffold_names[shortname] = longname
-	print >> sys.stderr, "# found {} short names".format(len(scaffold_names))
+	sys.stderr.write("# found {} short names\n".format(len(scaffold_names)) )
 	return scaffold_names
 
 def read_short_positions(shortposfile):
-	'''read positions from psuedo-GFF, return dict where key is gene name and value is interval'''
-	gene_intervals = {} # key is gene name, value is interval, scaffold is ignored
+	'''read positions from psuedo-GFF, return GenePositions where key is gene name and value is interval'''
+	gene_intervals = GenePositions() # key is gene name, value is interval, scaffold is ignored
 	# ta1	ta_g00001	11252	15952
-	print >> sys.stderr, "# reading scaffold names from {}".format(shortposfile)
+	sys.stderr.write("# reading gene positions from {}\n".format(shortposfile) )
 	for line in open(shortposfile,'r'):
 		line = line.strip()
 		if line:
 			lsplits = line.split("\t")
-			geneid = lsplits[1]
-			boundaries = [ int(lsplits[2]), int(lsplits[3]) ]
-			gene_intervals[geneid] = boundaries
-	print >> sys.stderr, "# found {} gene positions".format(len(gene_intervals))
+			gene_intervals.add(lsplits[1], int(lsplits[2]), int(lsplits[3]) )
+	sys.stderr.write("# found {} gene positions\n".format(len(gene_intervals)) )
 	return gene_intervals
 
-def read_gene_positions(gfffile):
-	'''read gene positions from GFF file, return dict where key is gene name and value is interval'''
-	gene_intervals = {} # key is gene name, value is interval, scaffold is ignored
-	## TODO
+def read_gene_positions(gfffile, transcript_feature, gene_intervals=None):
+	'''read gene positions from GFF file, return GenePositions where key is gene name and value is interval'''
+	if gene_intervals is None:
+		gene_intervals = GenePositions() # key is gene name, value is interval, scaffold is ignored
+	# GFF3 uses ID=, and GTF uses transcript_id
+	gff_id_re = re.compile(r'ID=([^;]+)')
+	gtf_id_re = re.compile(r'transcript_id "([^"]+)"')
+	sys.stderr.write("# reading {} positions from {}  ".format(transcript_feature, gfffile) + time.asctime() + os.linesep)
+	opentype = gzip.open if gfffile.rsplit('.',1)[-1]=="gz" else open
+	featurecount = 0
+	for line in opentype(gfffile,'rt'):
+		if line[0]=="#":
+			continue
+		lsplits = line.rstrip().split("\t")
+		if len(lsplits) < 9 or lsplits[2]!=transcript_feature:
+			continue
+		attributes = lsplits[8]
+		idmatch = gff_id_re.search(attributes) or gtf_id_re.search(attributes)
+		if idmatch is None:
+			continue
+		featurecount += 1
+		gene_intervals.add(idmatch.group(1), int(lsplits[3]), int(lsplits[4]) )
+	sys.stderr.write("# found {} {} features, {} gene positions in total\n".format(featurecount, transcript_feature, len(gene_intervals)) )
+	return gene_intervals
+
+def iterate_alignment_blocks(collinearityfile, genepositions, scaffold_names):
+	'''read mcscanX collinearity file one block at a time, yield tuples of parent feature and list of gene features'''
+	# header lines of parameters and statistics all start with #
+	blockheader = None
+	genelist = []
+	for line in open(collinearityfile,'r'):
+		line = line.strip()
+		if not line:
+			continue
+		if line[0:13]=="## Alignment ":
+			# ## Alignment 0: score=11767.0 e_value=0 N=237 hh1&ta7 plus
+			# if finding a new alignment, return the previous one
+			if blockheader is not None:
+				yield blockheader, genelist
+			# reset parameters
+			genelist = []
+			# begin processing the line
+			lsplits = line.split()
+			alignnum = lsplits[2].replace(":","")
+			#fullscore = re.search('score=([\d.]+)', line).group(1)
+			fullscore = lsplits[3].split("=")[1]
+			fullevalue = lsplits[4].split("=")[1]
+			fulllength = lsplits[5].split("=")[1]
+			queryscaffold, subscaffold = lsplits[6].split("&")
+			# if short names are given, meaning dict is not None
+			# then try to rename all scaffolds
+			if scaffold_names:
+				queryscaffold = scaffold_names.get(queryscaffold, queryscaffold)
+				subscaffold = scaffold_names.get(subscaffold, subscaffold)
+			fullstrand = "+" if lsplits[7]=="plus" else "-"
+			blockheader = [queryscaffold, subscaffold, alignnum, fullscore, fullevalue, fulllength, fullstrand]
+		elif line[0]=="#":
+			continue
+		elif blockheader is not None:
+			#   0-  0:	hh_g00284	ta_g06734	      0
+			lsplits = line.split("\t")
+			genenum = lsplits[0].split("-")[1].strip().replace(":","")
+			querygene = lsplits[1]
+			subjectgene = lsplits[2]
+			evalue = lsplits[3].strip()
+			queryposition = genepositions.get(querygene)
+			subjectposition = genepositions.get(subjectgene)
+			if queryposition is None or subjectposition is None:
+				sys.stderr.write("WARNING: no position for {} or {} in alignment {}, skipping\n".format(querygene, subjectgene, alignnum) )
+				continue
+			querystart, queryend = queryposition
+			subjectstart, subjectend = subjectposition
+			genelist.append( (querystart, queryend, evalue, genenum, subjectgene, subjectstart, subjectend) )
+	if blockheader is not None: # return final block
+		yield blockheader, genelist
+
+def block_to_gff(blockheader, genelist):
+	'''make GFF lines for one alignment block, return list of strings'''
+	queryscaffold, subscaffold, alignnum, fullscore, fullevalue, fulllength, fullstrand = blockheader
+	parentstart, parentend = 0,0
+	subscafstart, subscafend = 0,0
+	outlines = [None] # parent feature is added when all genes are read
+	for querystart, queryend, evalue, genenum, subjectgene, subjectstart, subjectend in genelist:
+		# adjust range of query genome
+		if parentstart==0 and parentend==0:
+			parentstart = querystart
+			parentend = queryend
+		elif querystart > parentend:
+			parentend = queryend
+		elif queryend < parentstart:
+			parentstart = querystart
+		# adjust range of target genome
+		if subscafstart==0 and subscafend==0:
+			subscafstart = subjectstart
+			subscafend = subjectend
+		elif subjectstart > subscafend:
+			subscafend = subjectend
+		elif subjectend < subscafstart:
+			subscafstart = subjectstart
+		outlines.append( "{0}\tmcscanX\tmatch_part\t{1}\t{2}\t{3}\t{4}\t.\tID=alignment_{5}.{6};Parent=alignment_{5};Target={7} {8} {9}\n".format(queryscaffold, querystart, queryend, evalue, fullstrand, alignnum, genenum, subjectgene, subjectstart, subjectend) )
+	outlines[0] = "{0}\tmcscanX\tmatch\t{1}\t{2}\t{3}\t{4}\t.\tID=alignment_{5};Name=alignment_{5}_to_{6};Target={6} {7} {8};length={9};evalue={10}\n".format( queryscaffold, parentstart, parentend, fullscore, fullstrand, alignnum, subscaffold, subscafstart, subscafend, fulllength, fullevalue)
+	return outlines
 
 def main(argv, wayout):
 	if not len(argv):
 		argv.append("-h")
 	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=__doc__)
 	parser.add_argument('-c','--collinearity', help="collinearity output file of mcscanX")
+	parser.add_argument('-g','--gff', nargs='+', help="GFF or GTF files of both genomes, can be .gz, instead of --short-positions")
 	parser.add_argument('--transcript', default="transcript", help="optional name for transcript features, default is transcript")
 	parser.add_argument('--short-names', help="optional short name conversion vector")
 	parser.add_argument('--short-positions', help="gene positions, in short tab format")
 	args = parser.parse_args(argv)
 
 	scaffold_names = read_scaffold_keys(args.short_names) if args.short_names else None
-	genepositions = read_short_positions(args.short_positions)
+	if args.gff:
+		genepositions = None
+		for gfffile in args.gff:
+			genepositions = read_gene_positions(gfffile, args.transcript, genepositions)
+	elif args.short_positions:
+		genepositions = read_short_positions(args.short_positions)
+	else:
+		sys.exit("ERROR: must give gene positions with -g or --short-positions")
+	if not len(genepositions):
+		sys.exit("ERROR: no gene positions found, check --transcript")
 
-	linecounter = 0
 	blockcounter = 0
 	genecounter = 0
-	lastalignment = ""
-	genelist = [] # list of lists, each is a GFF line
-	print >> sys.stderr, "# Converting {} to GFF".format(args.collinearity)
-	for line in open(args.collinearity,'r'):
-		line = line.strip()
-		if line:
-			linecounter += 1
-			if linecounter < 12: # first 11 lines are summary stats
-				continue
-			if line[0:3]=="## ":
-				# ## Alignment 0: score=11767.0 e_value=0 N=237 hh1&ta7 plus
-				# if finding a new alignment, print the previous one
-				if lastalignment:
-					# print parent feature
-					outline = "{0}\tmcscanX\tmatch\t{1}\t{2}\t{3}\t{4}\t.\tID=alignment_{5};Name=alignment_{5}_to_{6};Target={6} {7} {8};length={9};evalue={10}".format( queryscaffold, parentstart, parentend, fullscore, fullstrand, alignnum, subscaffold, subscafstart, subscafend, fulllength, fullevalue)
-					print >> wayout, outline
-					for gene in genelist:
-						genecounter += 1
-						outline = "\t".join(map(str,gene))
-						print >> wayout, outline
-				blockcounter += 1
-				# reset parameters
-				genelist = []
-				parentstart, parentend = 0,0
-				subscafstart, subscafend = 0,0
-				# begin processing the line
-				lsplits = line.split()
-				alignnum = lsplits[2].replace(":","")
-				lastalignment = alignnum
-				#fullscore = re.search('score=([\d.]+)', line).group(1)
-				fullscore = lsplits[3].split("=")[1]
-				fullevalue = lsplits[4].split("=")[1]
-				fulllength = lsplits[5].split("=")[1]
-				queryscaffold, subscaffold = lsplits[6].split("&")
-				# if short names are given, meaning dict is not None
-				# then try to rename all scaffolds
-				if scaffold_names:
-					queryscaffold = scaffold_names.get(queryscaffold, queryscaffold)
-					subscaffold = scaffold_names.get(subscaffold, subscaffold)
-				fullstrand = "+" if lsplits[7]=="plus" else "-"
-			else:
-				#   0-  0:	hh_g00284	ta_g06734	      0
-				lsplits = line.split("\t")
-				genenum = lsplits[0].split("-")[1].strip().replace(":","")
-				querygene = lsplits[1]
-				subjectgene = lsplits[2]
-				evalue = lsplits[3].strip()
-				# adjust range of query genome
-				querystart, queryend = genepositions.get(querygene)
-				if parentstart==0 and parentend==0:
-					parentstart = querystart
-					parentend = queryend
-				elif querystart > parentend:
-					parentend = queryend
-				elif queryend < parentstart:
-					parentstart = querystart
-				# adjust range of target genome
-				subjectstart, subjectend = genepositions.get(subjectgene)
-				if subscafstart==0 and subscafend==0:
-					subscafstart = subjectstart
-					subscafend = subjectend
-				elif subjectstart > subscafend:
-					subscafend = subjectend
-				elif subjectend < parentstart:
-					subscafstart = subjectstart
-				# make list, to convert into GFF string
-				features = [queryscaffold, "mcscanX", "match_part", querystart, queryend, evalue, fullstrand, ".", "ID=alignment_{0}.{1};Parent=alignment_{0};Target={2} {3} {4}".format(alignnum, genenum, subjectgene, subjectstart, subjectend) ]
-				genelist.append(features)
-	else: # print final gene
-		outline = "{0}\tmcscanX\tmatch\t{1}\t{2}\t{3}\t{4}\t.\tID=alignment_{5};Name=alignment_{5}_to_{6};Target={6} {7} {8};length={9};evalue={10}".format( queryscaffold, parentstart, parentend, fullscore, fullstrand, alignnum, subscaffold, subscafstart, subscafend, fulllength, fullevalue)
-		print >> wayout, outline
-		for gene in genelist:
-			genecounter += 1
-			outline = "\t".join(map(str,gene))
-			print >> wayout, outline
-	print >> sys.stderr, "# read {} lines for {} genes in {} blocks".format(linecounter, genecounter, blockcounter)
+	sys.stderr.write("# Converting {} to GFF  ".format(args.collinearity) + time.asctime() + os.linesep)
+	for blockheader, genelist in iterate_alignment_blocks(args.collinearity, genepositions, scaffold_names):
+		if not genelist: # no genes with positions
+			continue
+		blockcounter += 1
+		genecounter += len(genelist)
+		wayout.write( "".join(block_to_gff(blockheader, genelist)) )
+	sys.stderr.write("# read {} genes in {} blocks  ".format(genecounter, blockcounter) + time.asctime() + os.linesep)
 
 if __name__ == "__main__":
 	main(sys.argv[1:],sys.stdout)
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 # v1.0 created 2016-03-16
 
-'''number_contigs_by_length.py    last modified 2019-10-04
+'''number_contigs_by_length.py    last modified 2026-10-18
 
 number_contigs_by_length.py contigs.fasta > renumbered_contigs.fasta
 
@@ -23,18 +23,109 @@ avictoria.0001.length.248369 scaffold4_cov199
 oldnamecontig123    newnamecontig001
 
     conversion vector can be used with script - rename_gtf_contigs.py -
+
+    for very large assemblies, use -2 to avoid loading sequences
+    the first pass only collects names, lengths and file positions
+    (from the samtools faidx .fai index, if it exists), then the
+    second pass copies each sequence from the file in length order
+    this requires an uncompressed fasta file, and the sequence lines
+    are copied as they are, without rewrapping
+
+number_contigs_by_length.py -2 -c conversions.txt contigs.fasta > renumbered_contigs.fasta
 '''
 
 import sys
 import argparse
-import gzip
-from Bio import SeqIO
+import os
+import mmap
+from genomegtf.inputs import open_input, describe_input, detect_compression
+from genomegtf.profiling import run_main
+
+def index_records_from_fai(faifile, fastamap):
+	'''read samtools faidx index, return list of tuples of (ID, length, header start, sequence start, sequence end) as byte positions'''
+	sys.stderr.write("# Reading positions from index {}\n".format(faifile) )
+	recordlist = []
+	for line in open(faifile,'r'):
+		lsplits = line.rstrip().split("\t")
+		if len(lsplits) < 5:
+			continue
+		seqid, seqlength, seqstart, linebases, linebytes = lsplits[0], int(lsplits[1]), int(lsplits[2]), int(lsplits[3]), int(lsplits[4])
+		headerstart = fastamap.rfind(b"\n", 0, seqstart-1) + 1 # header line ends just before the sequence
+		seqend = seqstart + (seqlength // linebases) * linebytes + seqlength % linebases if linebases else seqstart
+		recordlist.append( (seqid, seqlength, headerstart, seqstart, seqend) )
+	return recordlist
+
+def index_records_from_scan(fastamap, chunksize=16777216):
+	'''scan memory-mapped fasta, return list of tuples of (ID, length, header start, sequence start, sequence end) as byte positions'''
+	recordlist = []
+	filesize = len(fastamap)
+	headerstart = 0 if fastamap[0:1]==b">" else fastamap.find(b"\n>") + 1
+	while 0 <= headerstart < filesize and fastamap[headerstart:headerstart+1]==b">":
+		headerend = fastamap.find(b"\n", headerstart)
+		if headerend < 0:
+			headerend = filesize
+		headerwords = fastamap[headerstart+1:headerend].split(None,1)
+		if not headerwords:
+			sys.exit("ERROR: fasta header with no name at byte {}, cannot use -2".format(headerstart) )
+		seqid = headerwords[0].decode()
+		seqstart = min(headerend + 1, filesize)
+		nextheader = fastamap.find(b"\n>", headerend)
+		seqend = nextheader + 1 if nextheader > -1 else filesize
+		# length is all bytes that are not line breaks, counted in chunks so memory stays constant
+		seqlength = seqend - seqstart
+		for chunkstart in range(seqstart, seqend, chunksize):
+			seqchunk = fastamap[chunkstart:min(chunkstart+chunksize, seqend)]
+			seqlength -= seqchunk.count(b"\n") + seqchunk.count(b"\r")
+		recordlist.append( (seqid, seqlength, headerstart, seqstart, seqend) )
+		headerstart = seqend if nextheader > -1 else filesize
+	return recordlist
+
+def two_pass_renumber(args, wayout, chunksize=16777216):
+	'''index the fasta file without reading sequences, then copy each record in order of length'''
+	if args.input_file=="-" or detect_compression(args.input_file) or args.format!="fasta":
+		sys.exit("ERROR: -2 requires an uncompressed fasta file")
+	fastahandle = open(args.input_file, 'rb')
+	fastamap = mmap.mmap(fastahandle.fileno(), 0, access=mmap.ACCESS_READ)
+	faifile = "{}.fai".format(args.input_file)
+	if os.path.isfile(faifile):
+		recordlist = index_records_from_fai(faifile, fastamap)
+	else:
+		sys.stderr.write("# Scanning positions of sequences from {}\n".format(args.input_file) )
+		recordlist = index_records_from_scan(fastamap, chunksize)
+	sys.stderr.write("# Found {} sequences of {} total bases\n".format(len(recordlist), sum(r[1] for r in recordlist) ) )
+	reclog = str(len(str(len(recordlist))))
+
+	# write bytes directly, since sequences are copied from the file
+	outbuffer = getattr(wayout, "buffer", wayout)
+	conversionlist = []
+	# sorting is stable, so contigs of the same length stay in the order of the file
+	for counter, record in enumerate(sorted(recordlist, key=lambda x: x[1], reverse=True), 1):
+		seqid, seqlength, headerstart, seqstart, seqend = record
+		if args.only_reorder:
+			outbuffer.write(fastamap[headerstart:seqstart].rstrip(b"\r\n") + b"\n")
+		else:
+			contignum = str(counter) if args.omit_zero else str("{:0"+reclog+"}").format(counter)
+			outputid = [args.name, contignum]
+			if args.length:
+				outputid.extend( [ args.length, str(seqlength) ] )
+			newid = args.delimiter.join(outputid)
+			conversionlist.append( (seqid, newid) )
+			header = ">{} {}\n".format(newid, seqid) if args.old else ">{}\n".format(newid)
+			outbuffer.write(header.encode())
+		for chunkstart in range(seqstart, seqend, chunksize):
+			outbuffer.write(fastamap[chunkstart:min(chunkstart+chunksize, seqend)])
+		if seqend > seqstart and fastamap[seqend-1:seqend]!=b"\n": # last sequence of the file, or from the index
+			outbuffer.write(b"\n")
+	fastamap.close()
+	fastahandle.close()
+	return conversionlist
 
 def main(argv, wayout):
 	if not len(argv):
 		argv.append("-h")
 	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=__doc__)
 	parser.add_argument('input_file', help="contigs file, by default in fasta format, can be .gz")
+	parser.add_argument('-2','--two-pass', action="store_true", help="index then copy sequences from the file, without loading them into memory")
 	parser.add_argument('-c','--conversion', help="optional output file for naming conversions")
 	parser.add_argument('-d','--delimiter', default='_', help="delimiter for headers")
 	parser.add_argument('-f','--format', default='fasta', help="format of sequences [fasta] or fastq")
@@ -45,14 +136,20 @@ def main(argv, wayout):
 	parser.add_argument('-z','--omit-zero', action="store_true", help="do not add extra zeroes to number")
 	args = parser.parse_args(argv)
 
+	### FOR TWO PASS MODE ###
+	if args.two_pass:
+		conversionlist = two_pass_renumber(args, wayout)
+		if args.conversion:
+			sys.stderr.write("# Writing conversion file {}\n".format(args.conversion) )
+			with open(args.conversion,'w') as cf:
+				for k,v in conversionlist:
+					cf.write("{}\t{}\n".format(k,v) )
+		return 0
+
 	# make dict of all contigs
-	if args.input_file.rsplit('.',1)[-1]=="gz": # autodetect gzip format
-		opentype = gzip.open
-		sys.stderr.write("# Reading sequences from {} as gzipped\n".format(args.input_file) )
-	else: # otherwise assume normal open for fasta format
-		opentype = open
-		sys.stderr.write("# Reading sequences from {}\n".format(args.input_file) )
-	contigdict = SeqIO.to_dict( SeqIO.parse( opentype(args.input_file,'rt'), args.format) )
+	sys.stderr.write("# Reading sequences from {}{}\n".format(args.input_file, describe_input(args.input_file)) )
+	from Bio import SeqIO # slow to import, so only when reading sequences
+	contigdict = SeqIO.to_dict( SeqIO.parse( open_input(args.input_file), args.format) )
 	# count number of sequences, and return number of padded zeroes
 	if not args.omit_zero:
 		reclog = str(len(str(len(contigdict)))) # literally counting the number of digits in the length
@@ -101,5 +198,5 @@ def main(argv, wayout):
 				cf.write("{}\t{}\n".format(k,v) )
 
 if __name__ == "__main__":
-	main(sys.argv[1:], sys.stdout)
+	run_main(main, sys.argv[1:], sys.stdout)
 
@@ -6,7 +6,7 @@
 # https://github.com/The-Sequence-Ontology/SO-Ontologies/blob/master/subsets/SOFA.obo
 
 '''
-pfam2gff.py  last modified 2019-12-05
+pfam2gff.py  last modified 2026-10-18
 
     EXAMPLE USAGE:
     to convert to protein gff, where domains are protein coordinates
@@ -16,6 +16,16 @@ pfam2gff.py -i proteins.pfam.tab > proteins.pfam.gtf
     must use -g with transcript coordinates, can be exon or CDS
 pfam2gff.py -i proteins.pfam.tab -g genes.gff > genome.pfam.gtf
 
+    genome gff can be sorted, bgzipped and indexed for tabix, with --bgzip-out
+pfam2gff.py -i proteins.pfam.tab -g genes.gff --bgzip-out genome.pfam.gff.gz
+
+    or written directly as a JBrowse track, with --jbrowse-out
+pfam2gff.py -i proteins.pfam.tab -g genes.gff --jbrowse-out jbrowse/data/tracks/PFAM
+
+    or written unsorted to a file with -o, gzipped as BGZF if the name
+    ends in .gz, where compression runs on a background thread
+pfam2gff.py -i proteins.pfam.tab -g genes.gff -o genome.pfam.gff.gz
+
     if using TransDecoder for peptide prediction, use mode -T
     and use the TransDecoder genome GFF file for -g
     this corrects for the CDS IDs as ID=cds.gene123 by removing the cds.
@@ -37,9 +47,13 @@ import sys
 import time
 import argparse
 import re
-import gzip
 from collections import defaultdict
 from itertools import chain
+from genomegtf.features import GffFeature, write_features
+from genomegtf.inputs import open_input, describe_input
+from genomegtf.outputs import BufferedLineWriter, open_output
+from genomegtf.instrument import RunReport
+from genomegtf.profiling import run_main
 
 def cds_to_intervals(gtffile, genesplit, keepexons, transdecoder, jgimode, nogenemode):
 	'''convert protein or gene intervals from gff to dictionary where mrna IDs are keys and lists of intervals are values'''
@@ -52,16 +66,11 @@ def cds_to_intervals(gtffile, genesplit, keepexons, transdecoder, jgimode, nogen
 	linecounter = 0
 	transcounter = 0
 	exoncounter = 0
-	# allow gzipped files
-	if gtffile.rsplit('.',1)[-1]=="gz": # autodetect gzip format
-		opentype = gzip.open
-		sys.stderr.write("# Parsing gff from {} as gzipped  ".format(gtffile) + time.asctime() + os.linesep)
-	else: # otherwise assume normal open for fasta format
-		opentype = open
-		sys.stderr.write("# Parsing gff from {}  ".format(gtffile) + time.asctime() + os.linesep)
+	# allow gzipped or zstd files
+	sys.stderr.write("# Parsing gff from {}{}  ".format(gtffile, describe_input(gtffile)) + time.asctime() + os.linesep)
 
 	# extract gene or CDS information
-	for line in opentype(gtffile,'r'):
+	for line in open_input(gtffile):
 		line = line.strip()
 		if line: # ignore empty lines
 			if line[0]=="#": # count comment lines, just in case
@@ -106,8 +115,8 @@ def cds_to_intervals(gtffile, genesplit, keepexons, transdecoder, jgimode, nogen
 	sys.stderr.write("# Gene IDs taken as {} from {}\n".format(geneid, attributes) )
 	return geneintervals, genestrand, genescaffold
 
-def parse_pfam_domains(pfamtabular, evaluecutoff, lengthcutoff, programname, outputtype, donamechop, debugmode=False, jgimode=False, geneintervals=None, genestrand=None, genescaffold=None):
-	'''parse domains from hmm domtblout and write to stdout as protein gff or genome gff'''
+def pfam_domain_features(pfamtabular, evaluecutoff, lengthcutoff, programname, outputtype, donamechop, debugmode=False, jgimode=False, geneintervals=None, genestrand=None, genescaffold=None):
+	'''parse domains from hmm domtblout and yield GffFeature in protein or genome coordinates'''
 	domaincounter = 0
 	protnamedict = {}
 	evalueRemovals = 0
@@ -115,17 +124,12 @@ def parse_pfam_domains(pfamtabular, evaluecutoff, lengthcutoff, programname, out
 	intervalproblems = 0
 	intervalcounts = 0
 	# for protein GFF, keep domains in dict for later sorting by position
-	protboundstoline = defaultdict(dict)
+	protboundstofeature = defaultdict(dict)
 
-	# allow gzipped files
-	if pfamtabular.rsplit('.',1)[-1]=="gz": # autodetect gzip format
-		opentype = gzip.open
-		sys.stderr.write("# Parsing hmmscan PFAM tabular {} as gzipped  ".format(pfamtabular) + time.asctime() + os.linesep)
-	else: # otherwise assume normal open for fasta format
-		opentype = open
-		sys.stderr.write("# Parsing hmmscan PFAM tabular {}  ".format(pfamtabular) + time.asctime() + os.linesep)
+	# allow gzipped or zstd files
+	sys.stderr.write("# Parsing hmmscan PFAM tabular {}{}  ".format(pfamtabular, describe_input(pfamtabular)) + time.asctime() + os.linesep)
 
-	for line in opentype(pfamtabular, 'rt'):
+	for line in open_input(pfamtabular):
 		line = line.strip()
 		if not line or line[0]=="#": # skip comment lines
 			continue # also catch for empty line, which would cause IndexError
@@ -195,24 +199,23 @@ def parse_pfam_domains(pfamtabular, evaluecutoff, lengthcutoff, programname, out
 			# ID=g1.t1.VWA.1
 			# Name consists of: PFAM accession, target name, target description
 			# Name=PF00092.VWA.von_Willebrand_factor_type_A_domain
-			outline = "{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\t.\tID={10}.{8}.{9};Name={7}.{8}.{11}\n".format(scaffold, programname, outputtype, parentstart, parentend, domscore, strand, pfamacc, targetname, domnumber, queryid, targetdescription)
-			sys.stdout.write(outline+os.linesep)
+			yield GffFeature(scaffold, programname, outputtype, parentstart, parentend, domscore, strand, ".", "ID={2}.{1}.{3};Name={0}.{1}.{4}".format(pfamacc, targetname, queryid, domnumber, targetdescription) )
 			# make child features for each interval
 			for interval in genomeintervals:
 				# thus ID appears as protein.targetname.number,
 				# so avic1234.G2F.1, and uses ID in most browsers
-				outline = "{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\t.\tParent={10}.{8}.{9};Name={7}.{8}.{11}\n".format(scaffold, programname, outputtype, interval[0], interval[1], domscore, strand, pfamacc, targetname, domnumber, queryid, targetdescription)
-				sys.stdout.write(outline)
+				yield GffFeature(scaffold, programname, outputtype, interval[0], interval[1], domscore, strand, ".", "Parent={2}.{1}.{3};Name={0}.{1}.{4}".format(pfamacc, targetname, queryid, domnumber, targetdescription) )
 
 		### FOR PROTEIN GFF ###
-		else: # for protein GFF, make outline for later sorting
+		else: # for protein GFF, make feature for later sorting
 			boundaries = (domstart,domend)
-			if debugmode:
+			domainid = "{}.{}.{}".format(pfamacc, targetname, domnumber)
+			if debugmode: # strand and phase columns show bits per length and coverage
 				bitlength = float(lsplits[13])/domainlength
-				outline = "{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{9:.3f}\t{10:.3f}\tID={6}.{7}.{8};Name={6}.{7}.{8}\n".format(queryid, programname, outputtype, domstart, domend, domscore, pfamacc, targetname, domnumber, bitlength, fractioncov)
+				feature = GffFeature(queryid, programname, outputtype, domstart, domend, domscore, "{:.3f}".format(bitlength), "{:.3f}".format(fractioncov), "ID={0};Name={0}".format(domainid) )
 			else:
-				outline = "{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t.\t.\tID={6}.{7}.{8};Name={6}.{7}.{8}\n".format(queryid, programname, outputtype, domstart, domend, domscore, pfamacc, targetname, domnumber)
-			protboundstoline[queryid][boundaries] = outline
+				feature = GffFeature(queryid, programname, outputtype, domstart, domend, domscore, ".", ".", "ID={0};Name={0}".format(domainid) )
+			protboundstofeature[queryid][boundaries] = feature
 	sys.stderr.write("# Found {} domains for {} proteins  ".format(domaincounter, len(protnamedict) ) + time.asctime() + os.linesep)
 	if geneintervals: # in genome GFF mode, check if any CDS intervals were actually collected
 		if intervalcounts:
@@ -223,10 +226,14 @@ def parse_pfam_domains(pfamtabular, evaluecutoff, lengthcutoff, programname, out
 	sys.stderr.write("# Removed {} domain hits by evalue\n".format(evalueRemovals) )
 	if intervalproblems:
 		sys.stderr.write("# {} genes have domains extending beyond gene bounds\n".format(intervalproblems) )
-	if protboundstoline: # should be empty unless in protein GFF mode, meaning no genomic intervals
-		for protid, boundlines in protboundstoline.items(): # sort proteins by start position
-			for bounds in sorted(boundlines.keys()):
-				sys.stdout.write(boundlines[bounds])
+	if protboundstofeature: # should be empty unless in protein GFF mode, meaning no genomic intervals
+		for protid, boundfeatures in protboundstofeature.items(): # sort proteins by start position
+			for bounds in sorted(boundfeatures.keys()):
+				yield boundfeatures[bounds]
+
+def parse_pfam_domains(pfamtabular, evaluecutoff, lengthcutoff, programname, outputtype, donamechop, debugmode=False, jgimode=False, geneintervals=None, genestrand=None, genescaffold=None, wayout=sys.stdout):
+	'''parse domains from hmm domtblout and write to wayout as protein gff or genome gff'''
+	write_features(pfam_domain_features(pfamtabular, evaluecutoff, lengthcutoff, programname, outputtype, donamechop, debugmode, jgimode, geneintervals, genestrand, genescaffold), wayout)
 	# NO RETURN
 
 def get_intervals(intervals, domstart, domlength, doreverse=True):
@@ -304,13 +311,48 @@ def main(argv, wayout):
 	parser.add_argument('-T','--transdecoder', action="store_true", help="use presets for TransDecoder genome gff")
 	parser.add_argument('-x','--exons', action="store_true", help="exons define coding sequence")
 	parser.add_argument('--debug', action="store_true", help="debug some output options")
+	parser.add_argument('--bgzip-out', help="write position-sorted, bgzipped GFF with tabix index to this file, instead of stdout")
+	parser.add_argument('--sort-lines', type=int, default=2000000, help="lines of --bgzip-out to sort in memory, more are sorted in temporary files [2000000]")
+	parser.add_argument('--temp-dir', help="directory for temporary sort files of --bgzip-out [system default]")
+	parser.add_argument('--jbrowse-out', help="write JBrowse NCList track to this directory, with one folder per scaffold, instead of stdout")
+	parser.add_argument('-o','--output', help="write GFF to this file instead of stdout, as BGZF if ending in .gz")
+	parser.add_argument('--buffer-size', type=int, default=1048576, help="characters of output to hold before each write [1048576]")
+	parser.add_argument('--report', help="write JSON report of time, counts and peak memory of each stage to this file")
 	args = parser.parse_args(argv)
 
+	if sum(1 for outarg in (args.output, args.bgzip_out, args.jbrowse_out) if outarg) > 1:
+		sys.exit("ERROR: can only use one of -o, --bgzip-out and --jbrowse-out")
+	if args.bgzip_out:
+		from genomegtf.bgzf import SortedBgzfSink
+		wayout = SortedBgzfSink(args.bgzip_out, args.sort_lines, args.temp_dir)
+	elif args.jbrowse_out:
+		from genomegtf.jbrowse import NCListSink
+		wayout = NCListSink(args.jbrowse_out)
+	elif args.output:
+		wayout = open_output(args.output)
+	report = RunReport("pfam2gff.py", argv)
+	if not args.jbrowse_out: # NCListSink takes the GffFeature records directly, so needs no text buffer
+		# lines are joined and written in blocks, and -o is compressed on another thread
+		wayout = BufferedLineWriter(report.count_output(wayout), args.buffer_size, closeoutput=bool(args.output or args.bgzip_out))
+
 	if args.genes:
-		geneintervals, genestrand, genescaffold = cds_to_intervals(args.genes, args.gene_delimiter, args.exons, args.transdecoder, args.JGI, args.no_genes)
-		parse_pfam_domains(args.input, args.evalue, args.length_cutoff, args.program, args.type, args.prot_delimiter, args.debug, args.JGI, geneintervals, genestrand, genescaffold)
+		with report.stage("read GFF"):
+			geneintervals, genestrand, genescaffold = cds_to_intervals(args.genes, args.gene_delimiter, args.exons, args.transdecoder, args.JGI, args.no_genes)
+			report.count("transcripts", len(geneintervals) )
+		with report.stage("convert domains"):
+			parse_pfam_domains(args.input, args.evalue, args.length_cutoff, args.program, args.type, args.prot_delimiter, args.debug, args.JGI, geneintervals, genestrand, genescaffold, wayout=wayout)
 	else: # assume protein gff
-		parse_pfam_domains(args.input, args.evalue, args.length_cutoff, args.program, args.type, args.prot_delimiter, args.debug)
+		with report.stage("convert domains"):
+			parse_pfam_domains(args.input, args.evalue, args.length_cutoff, args.program, args.type, args.prot_delimiter, args.debug, wayout=wayout)
+	if args.bgzip_out or args.jbrowse_out:
+		with report.stage("write sorted output"):
+			wayout.close()
+	else:
+		wayout.close()
+	if args.jbrowse_out:
+		report.count("lines written", wayout.featurecount)
+	if args.report:
+		report.write(args.report)
 
 if __name__ == "__main__":
-	main(sys.argv[1:],sys.stdout)
+	run_main(main, sys.argv[1:], sys.stdout)
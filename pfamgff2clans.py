@@ -3,7 +3,7 @@
 # pfamgff2clans.py v1.0 created 2016-04-19
 
 '''
-pfamgff2clans.py  last modified 2019-09-26
+pfamgff2clans.py  last modified 2026-10-18
 
 pfamgff2clans.py -i proteins.pfam.gtf -c Pfam-A.clans.tsv > proteins.clan.gtf
 
@@ -20,7 +20,9 @@ import argparse
 import re
 import os
 from collections import defaultdict,OrderedDict
-from Bio import SeqIO
+from genomegtf.features import GffFeature, read_gff, write_features
+from genomegtf.inputs import open_input
+from genomegtf.profiling import run_main
 
 def parse_clan_links(clanlinks):
 	'''read in PFAM ID to PFAM clan tsv and make a dict where keys are PFAM accessions and values are cl accessions'''
@@ -45,78 +47,80 @@ def parse_clan_links(clanlinks):
 	sys.stderr.write("# Found {} clan links  ".format(len(pfamtoclan)) + time.asctime() + os.linesep)
 	return pfamtoclan, pfamannotation
 
-def parse_pfam_gtf(pfamgtf, overlaplimit, verbose=False):
-	'''read PFAM GTF, merge identical annotations, and print the domain-merged GTF'''
-	gtfbyprot = defaultdict(list) # keys are protein IDs and 
+def merge_pfam_domains(features, overlaplimit, verbose=False):
+	'''from GffFeature of PFAM domains, merge identical annotations, return dict of lists of features by protein, the features are not changed'''
+	gtfbyprot = defaultdict(list) # keys are protein IDs and values are lists of GffFeature
 	domcount = 0
-	sys.stderr.write("# Parsing GTF from {}  ".format(pfamgtf) + time.asctime() + os.linesep)
-	for line in open(pfamgtf,'r').readlines():
-		line = line.strip()
-		if line and not line[0]=="#":
-			domcount += 1
-			lsplits = line.split("\t")
-			protid = lsplits[0]
-			domstart = int(lsplits[3])
-			domend = int(lsplits[4])
-			domlength = domend - domstart + 1
-			qscore = float(lsplits[5])
-			for i,protstats in enumerate(gtfbyprot[protid]):
-				sstart, send, sscore = protstats[3:6] # meaning 3,4,5
-				if sstart > domend or domstart > send: # means zero overlap
-					continue
-				else: # some overlap possible
-					overlap = min(send, domend) - max(sstart, domstart) + 1
-					if verbose:
-						sys.stderr.write("{} {} overlap from ({},{}) to ({},{})\n".format(protid, overlap, domstart, domend, sstart, send) )
-					slength = send - sstart + 1
-					qoverlap = overlap * 1.0 / domlength
-					soverlap = overlap * 1.0 / slength
-					if qoverlap >= overlaplimit: # default is 0.67 overlap, maybe needs to be lower
-						if qscore < sscore: # worse domain hit, break
-							break
-					if soverlap >= overlaplimit:
-						if qscore >= sscore:
-							gtfbyprot[protid].pop(i)
-			else: # if no break, add to list
-				lsplits[3] = domstart # write back integer and floats
-				lsplits[4] = domend
-				lsplits[5] = qscore
-				gtfbyprot[protid].append(lsplits)
+	for feature in features:
+		domcount += 1
+		protid = feature.seqid
+		domstart = feature.start
+		domend = feature.end
+		domlength = domend - domstart + 1
+		qscore = float(feature.score)
+		for i,protdomain in enumerate(gtfbyprot[protid]):
+			sstart, send, sscore = protdomain.start, protdomain.end, float(protdomain.score)
+			if sstart > domend or domstart > send: # means zero overlap
+				continue
+			else: # some overlap possible
+				overlap = min(send, domend) - max(sstart, domstart) + 1
+				if verbose:
+					sys.stderr.write("{} {} overlap from ({},{}) to ({},{})\n".format(protid, overlap, domstart, domend, sstart, send) )
+				slength = send - sstart + 1
+				qoverlap = overlap * 1.0 / domlength
+				soverlap = overlap * 1.0 / slength
+				if qoverlap >= overlaplimit: # default is 0.67 overlap, maybe needs to be lower
+					if qscore < sscore: # worse domain hit, break
+						break
+				if soverlap >= overlaplimit:
+					if qscore >= sscore:
+						gtfbyprot[protid].pop(i)
+		else: # if no break, add to list
+			gtfbyprot[protid].append(feature)
 	sys.stderr.write("# Found {} domains for {} proteins".format(domcount, len(gtfbyprot) ) + time.asctime() + os.linesep)
 	return gtfbyprot
 
-def convert_domains(domainsbyprot, programname, outputtype, wayout, pfamtoclandict, annotdict, fastalendict=None):
+def parse_pfam_gtf(pfamgtf, overlaplimit, verbose=False):
+	'''read PFAM GTF, merge identical annotations, and return dict of lists of features by protein'''
+	sys.stderr.write("# Parsing GTF from {}  ".format(pfamgtf) + time.asctime() + os.linesep)
+	return merge_pfam_domains(read_gff(pfamgtf), overlaplimit, verbose)
+
+def clan_domain_features(domainsbyprot, programname, pfamtoclandict, annotdict, fastalendict=None):
+	'''yield new GffFeature of domains renamed by clan, and of each protein if lengths are given, score is written as float'''
 	sys.stderr.write("# Coverting domains to clans" + time.asctime() + os.linesep)
 	writecount = 0
 
 	if fastalendict: # if original fasta file is there, use that order
-		iterprots = fastalendict.iterkeys()
+		iterprots = fastalendict.keys()
 	else:
-		iterprots = domainsbyprot.iterkeys()
+		iterprots = domainsbyprot.keys()
 	# iterate over protein IDs, and print respctive domains
 	for protid in iterprots:
 		if fastalendict: # if length is available
 			# print one entry for each protein
 			# this could also be id: SO:0000104 polypeptide
-			wayout.write("{0}\t{1}\tprotein\t1\t{2}\t.\t.\t.\tID={0}\n".format(protid, programname, fastalendict[protid]) )
+			yield GffFeature(protid, programname, "protein", 1, fastalendict[protid], ".", ".", ".", "ID={}".format(protid) )
 		domaincounter = defaultdict(int)
-		for domainstats in domainsbyprot[protid]:
-			attributes = domainstats[8]
-			hitid = re.search('ID=([\w.|-]+)', attributes).group(1)
+		for domain in domainsbyprot.get(protid, []):
+			hitid = re.search('ID=([\w.|-]+)', domain.attributes).group(1)
 			pfamid, targetname, domnumber = hitid.split('.') # ID should appear as ID={6}.{7}.{8};
 			cldomain = pfamtoclandict.get(pfamid,pfamid) # if no clan is found, use the PFAM ID
 			domaincounter[cldomain] += 1
 			writecount += 1
-			domainstats[8] = "ID={}.{}.{}".format(cldomain, annotdict.get(pfamid,"None"), domaincounter[cldomain])
-			wayout.write("{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\t{7}\t{8}\n".format(*domainstats) )
+			clanattributes = "ID={}.{}.{}".format(cldomain, annotdict.get(pfamid,"None"), domaincounter[cldomain])
+			yield GffFeature(domain.seqid, domain.source, domain.type, domain.start, domain.end, str(float(domain.score)), domain.strand, domain.phase, clanattributes)
 	sys.stderr.write("# Wrote {} domains".format(writecount) + time.asctime() + os.linesep)
+
+def convert_domains(domainsbyprot, programname, outputtype, wayout, pfamtoclandict, annotdict, fastalendict=None):
+	write_features(clan_domain_features(domainsbyprot, programname, pfamtoclandict, annotdict, fastalendict), wayout)
 	# NO RETURN
 
 def get_prot_lengths(sequences):
 	'''from a fasta file, return a dictionary where protein ID is the key and length is the value'''
 	seqlendict = OrderedDict()
 	sys.stderr.write("# Parsing proteins from {}".format(sequences) + time.asctime() + os.linesep)
-	for seqrec in SeqIO.parse(sequences,'fasta'):
+	from Bio import SeqIO # slow to import, so only when reading sequences
+	for seqrec in SeqIO.parse(open_input(sequences),'fasta'):
 		seqlendict[seqrec.id] = len(seqrec.seq)
 	return seqlendict
 
@@ -140,4 +144,4 @@ def main(argv, wayout):
 	convert_domains(domainsbyprot, args.program, args.type, wayout, pfamtoclandict, pfamannot, seqlens)
 
 if __name__ == "__main__":
-	main(sys.argv[1:],sys.stdout)
+	run_main(main, sys.argv[1:], sys.stdout)
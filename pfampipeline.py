@@ -33,6 +33,7 @@ import os
 import subprocess
 import argparse
 import time
+from genomegtf.profiling import run_main
 
 def call_hmmscan(inputfasta, threadcount, pfamhmms):
 	outfile = "{}.pfam.tab".format(os.path.splitext(inputfasta)[0])
@@ -117,4 +118,4 @@ def main(argv, wayout):
 	call_draw_domains(args.rscript, clangff)
 
 if __name__ == "__main__":
-	main(sys.argv[1:],sys.stdout)
+	run_main(main, sys.argv[1:], sys.stdout)
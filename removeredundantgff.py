@@ -3,7 +3,7 @@
 # v1.0 2015-07-23
 
 '''
-removeredundantgff.py last modified 2015-07-24
+removeredundantgff.py last modified 2026-10-18
     remove identical gene predictions from gff3 file
 
     EXAMPLE USAGE:
@@ -13,80 +13,263 @@ removeredundantgff.py -g genewise.gff3 > genewise.nonredundant.gff3
     IF EXONS WERE PREVIOUSLY EXCLUDED, GET RANGE INFORMATION FROM CDS:
 
 removeredundantgff.py -g genewise.gff3 -C > genewise.nonredundant.gff3
+
+    ALSO REMOVE PREDICTIONS CONTAINED IN A LONGER PREDICTION:
+
+removeredundantgff.py -g genewise.gff3 -S > genewise.nonredundant.gff3
+
+    a prediction is contained if its exons are a continuous part of
+    the exons of another prediction on the same scaffold, where only
+    the outer ends of the first and last exon can be shorter
+    this reads the file twice, so cannot be used with stdin
+
+    each gene is kept in memory only until the next gene is read
+    genes must be followed by their mRNA, exon and CDS features
+
+    exon chains already written, and all exon chains for -S, are kept
+    in memory, or if memory is limited, moved to a temporary database
+    in -T when the process comes near --max-memory, as 8G
 '''
 
 import sys
 import argparse
 import time
+import os
 import re
+import struct
+import hashlib
+import marshal
+from bisect import bisect_right
 from collections import defaultdict
+from genomegtf.inputs import open_input
+from genomegtf.spill import MemoryBudget, parse_memory_size, new_set, open_temp_database, CHECK_INTERVAL
+from genomegtf.profiling import run_main
+
+gene_id_re = re.compile(r"ID=([\w.]+);")
+
+def exon_chain_key(scaffold, exonchain):
+	'''return a compact hash of the scaffold and a sorted tuple of exon boundaries'''
+	# such as ((19899, 20013), (20080, 20137), (20218, 20335))
+	flatbounds = [pos for bounds in exonchain for pos in bounds]
+	return hashlib.blake2b(scaffold.encode() + b"\0" + struct.pack("{}q".format(len(flatbounds)), *flatbounds), digest_size=16).digest()
+
+def iterate_gene_models(features, use_cds, keep_exons, counts):
+	'''from GffFeature of gff3, one gene at a time, yield tuples of scaffold, gene ID, sorted exon chain, and features for that gene'''
+	geneid, scaffold = None, None
+	exons = []
+	genefeatures = []
+	for feature in features:
+		featuretype = feature.type
+		if featuretype=="gene":
+			counts["gene"] += 1
+			if geneid is not None: # finish the previous gene
+				yield scaffold, geneid, tuple(sorted(exons)), genefeatures
+			geneid = gene_id_re.search(feature.attributes).group(1)
+			scaffold = feature.seqid
+			exons = []
+			genefeatures = [feature]
+		elif geneid is None: # any features before the first gene are ignored
+			continue
+		elif featuretype=="mRNA":
+			counts["mRNA"] += 1
+			genefeatures.append(feature)
+		elif featuretype=="exon":
+			counts["exon"] += 1
+			if not use_cds:
+				exons.append( (feature.start, feature.end) )
+			if keep_exons:
+				genefeatures.append(feature)
+		elif featuretype=="CDS":
+			counts["CDS"] += 1
+			if use_cds:
+				exons.append( (feature.start, feature.end) )
+			genefeatures.append(feature)
+	if geneid is not None: # last gene of the file
+		yield scaffold, geneid, tuple(sorted(exons)), genefeatures
+
+def iterate_gene_lines(gfffile, use_cds, keep_exons, counts):
+	'''read gff3 one gene at a time, yield tuples of scaffold, gene ID, sorted exon chain, and lines for that gene, same as iterate_gene_models'''
+	# lines are only passed through, so are not made into GffFeature, which would take twice as long
+	geneid, scaffold = None, None
+	exons = []
+	genelines = []
+	for line in open_input(gfffile):
+		line = line.rstrip()
+		if not line or line[0]=="#":
+			continue
+		lsplits = line.split("\t")
+		feature = lsplits[2]
+		if feature=="gene":
+			counts["gene"] += 1
+			if geneid is not None: # finish the previous gene
+				yield scaffold, geneid, tuple(sorted(exons)), genelines
+			geneid = gene_id_re.search(lsplits[8]).group(1)
+			scaffold = lsplits[0]
+			exons = []
+			genelines = [line]
+		elif geneid is None: # any features before the first gene are ignored
+			continue
+		elif feature=="mRNA":
+			counts["mRNA"] += 1
+			genelines.append(line)
+		elif feature=="exon":
+			counts["exon"] += 1
+			if not use_cds:
+				exons.append( (int(lsplits[3]), int(lsplits[4])) )
+			if keep_exons:
+				genelines.append(line)
+		elif feature=="CDS":
+			counts["CDS"] += 1
+			if use_cds:
+				exons.append( (int(lsplits[3]), int(lsplits[4])) )
+			genelines.append(line)
+	if geneid is not None: # last gene of the file
+		yield scaffold, geneid, tuple(sorted(exons)), genelines
+
+def chain_is_contained(shortchain, longchain):
+	'''return True if the exons of shortchain are a continuous part of longchain, allowing shorter outer ends'''
+	if len(shortchain) > len(longchain) or not shortchain:
+		return False
+	if len(shortchain)==1: # single exon can be anywhere in any exon
+		shortstart, shortend = shortchain[0]
+		return any(start <= shortstart and shortend <= end for start, end in longchain)
+	lastindex = len(shortchain) - 1
+	for i in range(len(longchain) - lastindex):
+		# first exon must end at the same intron, and start in the same exon
+		if longchain[i][1]!=shortchain[0][1] or longchain[i][0] > shortchain[0][0]:
+			continue
+		# last exon must start at the same intron, and end in the same exon
+		if longchain[i+lastindex][0]!=shortchain[-1][0] or longchain[i+lastindex][1] < shortchain[-1][1]:
+			continue
+		# all middle exons must be identical
+		if longchain[i+1:i+lastindex]==shortchain[1:lastindex]:
+			return True
+	return False
+
+class ChainIndex:
+	'''interval index of unique exon chains on one scaffold, to find chains that contain another'''
+	def __init__(self):
+		self.chains = []
+		self.count = 0 # number of chains added, including any moved to disk
+		self.maxspan = 0
+		self.database = None # sqlite of chains of all scaffolds, if moved to disk
+		self.scaffold = None
+	def add(self, exonchain):
+		self.chains.append(exonchain)
+		self.count += 1
+		if exonchain:
+			self.maxspan = max(self.maxspan, exonchain[-1][1] - exonchain[0][0])
+	def sort(self):
+		self.chains.sort()
+		self.starts = [chain[0][0] if chain else 0 for chain in self.chains]
+	def is_contained(self, exonchain):
+		'''return True if any other chain contains exonchain'''
+		if not exonchain:
+			return False
+		chainstart, chainend = exonchain[0][0], exonchain[-1][1]
+		if self.database is not None:
+			return self.is_contained_on_disk(exonchain, chainstart, chainend)
+		# any chain that contains this one must start between chainend-maxspan and chainstart
+		for i in range(bisect_right(self.starts, chainstart)-1, -1, -1):
+			other = self.chains[i]
+			if other and other[0][0] < chainend - self.maxspan:
+				break
+			if other!=exonchain and other and other[-1][1] >= chainend and chain_is_contained(exonchain, other):
+				return True
+		return False
+	def is_contained_on_disk(self, exonchain, chainstart, chainend):
+		'''same as is_contained, reading the chains that start in range from the database'''
+		for (chainvalue,) in self.database.execute("SELECT chain FROM chains WHERE scaffold=? AND start BETWEEN ? AND ?", (self.scaffold, chainend - self.maxspan, chainstart) ):
+			other = marshal.loads(chainvalue)
+			if other!=exonchain and other[-1][1] >= chainend and chain_is_contained(exonchain, other):
+				return True
+		return False
+
+def move_chains_to_disk(containedindex, database, budget):
+	'''move chains of every ChainIndex to database, or to a new database if None, return the database'''
+	if database is None:
+		budget.note_move("exon chains", sum(len(chainindex.chains) for chainindex in containedindex.values()) )
+		database = open_temp_database(budget.tempdir, ["CREATE TABLE chains (scaffold TEXT, start INTEGER, chain BLOB)"])
+	database.executemany("INSERT INTO chains VALUES (?,?,?)", ( (scaffold, chain[0][0], marshal.dumps(chain)) for scaffold, chainindex in containedindex.items() for chain in chainindex.chains if chain) )
+	database.commit()
+	for chainindex in containedindex.values():
+		chainindex.chains = []
+	return database
+
+def index_exon_chains(genemodels, budget=None):
+	'''from tuples of iterate_gene_models or iterate_gene_lines, return dict where key is scaffold and value is ChainIndex of unique exon chains, on disk if over MemoryBudget budget'''
+	containedindex = defaultdict(ChainIndex) # key is scaffold, value is index of chains
+	indexedkeys = new_set(budget, "indexed exon chains")
+	chaindatabase = None
+	for genecount, (scaffold, geneid, exonchain, genefeatures) in enumerate(genemodels):
+		chainkey = exon_chain_key(scaffold, exonchain)
+		if chainkey not in indexedkeys:
+			indexedkeys.add(chainkey)
+			containedindex[scaffold].add(exonchain)
+		if budget is not None and genecount % CHECK_INTERVAL==0 and budget.is_over():
+			chaindatabase = move_chains_to_disk(containedindex, chaindatabase, budget)
+	if chaindatabase is None:
+		for chainindex in containedindex.values():
+			chainindex.sort()
+		return containedindex
+	chaindatabase = move_chains_to_disk(containedindex, chaindatabase, budget)
+	chaindatabase.execute("CREATE INDEX chainstarts ON chains (scaffold, start)")
+	for scaffold, chainindex in containedindex.items():
+		chainindex.database = chaindatabase
+		chainindex.scaffold = scaffold
+	return containedindex
+
+def nonredundant_gene_models(genemodels, containedindex=None, counts=None, verbose=False, budget=None):
+	'''yield tuples of iterate_gene_models or iterate_gene_lines, skipping exon chains already seen on that scaffold, and chains contained in another from containedindex'''
+	if counts is None:
+		counts = defaultdict(int)
+	printedkeys = new_set(budget, "written exon chains") # hashes of scaffold and exon chain already written
+	for scaffold, geneid, exonchain, genefeatures in genemodels:
+		chainkey = exon_chain_key(scaffold, exonchain)
+		if chainkey in printedkeys:
+			continue
+		if containedindex is not None and containedindex[scaffold].is_contained(exonchain):
+			counts["contained"] += 1
+			if verbose:
+				sys.stderr.write("# {} is contained in another prediction\n".format(geneid) )
+			continue
+		counts["printed"] += 1
+		printedkeys.add(chainkey)
+		yield scaffold, geneid, exonchain, genefeatures
 
 def main(argv, wayout):
 	if not len(argv):
 		argv.append("-h")
 	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=__doc__)
-	parser.add_argument('-g','--gff', help="gff3 format file")
+	parser.add_argument('-g','--gff', help="gff3 format file, can be .gz, or - for stdin")
 	parser.add_argument('-d','--delimiter', default=".", help="delimiter for separating names and IDs [.]")
 	parser.add_argument('-C','--cds', action="store_true", help="ranges are by CDS rather than exons")
 	parser.add_argument('-E','--exons', action="store_false", help="exclude exons when writing output")
+	parser.add_argument('-S','--remove-contained', action="store_true", help="also remove predictions contained in another prediction")
 	parser.add_argument('-v','--verbose', help="verbose output", action="store_true")
+	parser.add_argument('--max-memory', type=parse_memory_size, help="memory budget, as 4G or 500M, exon chains are moved to a temporary database when near this")
+	parser.add_argument('-T','--temp-dir', help="directory for temporary files of --max-memory [system default]")
 	args = parser.parse_args(argv)
 
-	exonScaffold = defaultdict(lambda: defaultdict(list)) # dict of dicts of lists, as scaffold[gene][exons]
-	geneorder = [] # keep order of genes read in the file, to make output deterministic
-	scaffoldbygene = defaultdict(list) # all scaffold hits by each gene, might only be one each
-	linesbyid = defaultdict(list) # this stores all GFF output lines by the gene ID
-	genecount, mrnacount, exoncount, cdscount = 0,0,0,0
-	print >> sys.stderr, "Starting exon parsing on {}".format(args.gff), time.asctime()
-	for line in open(args.gff,'r').readlines():
-		line = line.rstrip()
-		if not line or line[0]=="#":
-			continue
-		lsplits = line.split("\t")
-		if lsplits[2]=="gene":
-			genecount += 1
-			transid = re.search("ID=([\w.]+);", lsplits[8]).group(1)
-			geneorder.append(transid)
-			scaffoldbygene[transid].append( lsplits[0] )
-			linesbyid[transid].append(line)
-		elif lsplits[2]=="mRNA":
-			mrnacount += 1
-			linesbyid[transid].append(line)
-		elif lsplits[2]=="exon":
-			exoncount += 1
-			if not args.cds:
-				contig, startpos, endpos, strand = lsplits[0], int(lsplits[3]), int(lsplits[4]), lsplits[6]
-				boundaries = (startpos,endpos)
-				#if strand=="+":
-				exonScaffold[contig][transid].append(boundaries)
-				#else: # strand=="-":
-			if args.exons:
-				linesbyid[transid].append(line)
-		elif lsplits[2]=="CDS":
-			cdscount += 1
-			if args.cds:
-				contig, startpos, endpos, strand = lsplits[0], int(lsplits[3]), int(lsplits[4]), lsplits[6]
-				boundaries = (startpos,endpos)
-				exonScaffold[contig][transid].append(boundaries)
-			linesbyid[transid].append(line)
-	print >> sys.stderr, "Counted {} gene and {} mRNA predictions".format(genecount, mrnacount), time.asctime()
-	print >> sys.stderr, "Counted {} exons and {} CDS".format(exoncount, cdscount), time.asctime()
-
-	printcount = 0
-	exonsorted = defaultdict(dict) # dict of scaffold and then exon boundaries as list of tuples
-	print >> sys.stderr, "Starting duplicate gene sorting", time.asctime()
-	for gene in geneorder:
-		for sc in scaffoldbygene[gene]:
-			# this generates a string of the sorted list of exon boundaries
-			exonorder = str(sorted(exonScaffold[sc][gene]))
-			# such as "[(19899, 20013), (20080, 20137), (20218, 20335)]"
-			### TODO allow removal of substring matches
-			if not exonorder in exonsorted[sc]:
-				printcount += 1
-				exonsorted[sc][exonorder] = True
-				for line in linesbyid[gene]:
-					print >> wayout, line
-	print >> sys.stderr, "Printed {} non redundant predictions".format(printcount), time.asctime()
+	budget = MemoryBudget.from_option(args.max_memory, args.temp_dir)
+	containedindex = None
+	if args.remove_contained: # first pass, only to index unique exon chains
+		if args.gff=="-":
+			sys.exit("ERROR: -S reads the file twice, cannot use stdin")
+		sys.stderr.write("# Indexing exon chains from {}  ".format(args.gff) + time.asctime() + os.linesep)
+		containedindex = index_exon_chains(iterate_gene_lines(args.gff, args.cds, False, defaultdict(int)), budget)
+		sys.stderr.write("# Indexed {} unique predictions  ".format(sum(x.count for x in containedindex.values()) ) + time.asctime() + os.linesep)
+
+	counts = defaultdict(int)
+	sys.stderr.write("# Starting duplicate gene removal on {}  ".format(args.gff) + time.asctime() + os.linesep)
+	genemodels = iterate_gene_lines(args.gff, args.cds, args.exons, counts)
+	for scaffold, geneid, exonchain, genelines in nonredundant_gene_models(genemodels, containedindex, counts, args.verbose, budget):
+		wayout.write("\n".join(genelines) + "\n")
+	sys.stderr.write("# Counted {} gene and {} mRNA predictions  ".format(counts["gene"], counts["mRNA"]) + time.asctime() + os.linesep)
+	sys.stderr.write("# Counted {} exons and {} CDS  ".format(counts["exon"], counts["CDS"]) + time.asctime() + os.linesep)
+	if containedindex is not None:
+		sys.stderr.write("# Removed {} predictions contained in others\n".format(counts["contained"]) )
+	sys.stderr.write("# Printed {} non redundant predictions  ".format(counts["printed"]) + time.asctime() + os.linesep)
 
 if __name__ == "__main__":
-	main(sys.argv[1:],sys.stdout)
+	run_main(main, sys.argv[1:], sys.stdout)
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 # v1.0 created 2016-05-16
 
-'''rename_gtf_contigs.py    last modified 2019-09-26
+'''rename_gtf_contigs.py    last modified 2026-10-18
 
     rename scaffolds/contigs in a GTF/GFF based on a conversion vector
 
@@ -17,12 +17,22 @@ oldnamecontig123    newnamecontig001
 
     using conversion vector list from:
 number_contigs_by_length.py -c conversions.txt contigs.fasta > renamed_contigs.fasta
+
+    many GFF/GTF files can be renamed at once with the same vector
+    each is written to the folder -o with the same file name
+    using -p processes, and gzipped files (.gz) stay gzipped, written
+    as BGZF on a background thread, as from bgzip
+
+rename_gtf_contigs.py -c conversions.txt -o renamed/ -p 4 -g genes.gff repeats.gff.gz pfam.gff
 '''
 
 import sys
 import os
 import time
 import argparse
+from genomegtf.inputs import open_input, describe_input
+from genomegtf.outputs import BufferedLineWriter, open_output
+from genomegtf.profiling import run_main
 
 def make_conversion_dict(conversionfile, do_reverse):
 	'''return dict where keys are old contig names and values are new contig names'''
@@ -49,50 +59,127 @@ def make_exclude_dict(excludefile):
 	sys.stderr.write("# Found {} contigs to exclude  ".format(len(exclusion_dict) ) + time.asctime() + os.linesep)
 	return exclusion_dict
 
-def main(argv, wayout):
-	if not len(argv):
-		argv.append("-h")
-	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=__doc__)
-	parser.add_argument('-c','--conversion', help="text file of naming conversions", required=True)
-	parser.add_argument('-E','--exclude', help="file of list of bad contigs")
-	parser.add_argument('-g','--gtf', help="gtf or gff format file", required=True)
-	parser.add_argument('-n','--nomatch', action="store_true", help="exclude features with no conversion")
-	parser.add_argument('-R','--reversed', action="store_true", help="conversion vector is in reversed order, as newname--oldname")
-	args = parser.parse_args(argv)
-
-	conversiondict = make_conversion_dict(args.conversion, args.reversed)
-
-	exclusiondict = make_exclude_dict(args.exclude) if args.exclude else None
-
+def rename_features(gtffile, wayout, conversiondict, exclusiondict, nomatch):
+	'''rename the scaffold column of one GFF, return counts of lines, conversions and lines without a conversion'''
 	linecounter = 0
 	conversions = 0
 	noconvertfeatures = 0
-	sys.stderr.write("# Reading features from {}  ".format(args.gtf) + time.asctime() + os.linesep)
-	for line in open(args.gtf,'r'):
+	sys.stderr.write("# Reading features from {}{}  ".format(gtffile, describe_input(gtffile)) + time.asctime() + os.linesep)
+	for line in open_input(gtffile):
 		line = line.strip()
 		if line: # remove empty lines
 			if line[0]=="#": # write out any comment lines with no change
 				wayout.write(line + os.linesep)
 			else:
 				linecounter += 1
-				lsplits = line.split("\t")
-				scaffold = lsplits[0]
+				# only split the first column, other columns are copied as they are
+				try:
+					scaffold, otherfields = line.split("\t",1)
+				except ValueError: # no tab, so not a feature, write out with no change
+					wayout.write(line + os.linesep)
+					continue
 				if exclusiondict and exclusiondict.get(scaffold, False):
 					continue # skip everything from this contig anyway
 				newscaffold = conversiondict.get(scaffold, None)
 				if newscaffold is None:
 					noconvertfeatures += 1
-					if args.nomatch: # no match, so skip
+					if nomatch: # no match, so skip
 						continue
 					else:
 						sys.stderr.write("WARNING: NO CONVERSION FOR {}\n".format(scaffold) )
-						lsplits[8] = "{};Rename=false".format(lsplits[8])
+						wayout.write("{}\t{};Rename=false".format(scaffold, otherfields) + os.linesep)
 				else:
 					conversions += 1
-					lsplits[0] = newscaffold
-				wayout.write("\t".join(lsplits) + os.linesep)
-	sys.stderr.write("# Counted {} lines  ".format(linecounter) + time.asctime() + os.linesep)
-	sys.stderr.write("# Converted {} lines and could not change {}\n".format(conversions, noconvertfeatures) )
+					wayout.write(newscaffold + "\t" + otherfields + os.linesep)
+	return linecounter, conversions, noconvertfeatures
+
+# kept by each worker process, so the conversion dict is sent only once to each
+worker_state = {}
+
+def init_rename_worker(conversiondict, exclusiondict, nomatch, outputdir, gzip_out, buffersize):
+	worker_state["args"] = (conversiondict, exclusiondict, nomatch)
+	worker_state["output"] = (outputdir, gzip_out, buffersize)
+
+def output_file_name(gtffile, outputdir, gzip_out):
+	'''return the name of the renamed file in the output folder'''
+	outfile = os.path.join(outputdir, os.path.basename(gtffile))
+	if outfile.endswith(".zst"): # zstd is read, but written uncompressed
+		outfile = outfile[:-4]
+	if gzip_out and not outfile.endswith(".gz"):
+		outfile += ".gz"
+	return outfile
+
+def check_output_names(gtffiles, outputdir, gzip_out):
+	'''exit if two inputs would be written to the same file, or any output would replace an input'''
+	inputpaths = set(os.path.realpath(gtffile) for gtffile in gtffiles)
+	outputsources = {}
+	for gtffile in gtffiles:
+		outfile = output_file_name(gtffile, outputdir, gzip_out)
+		outpath = os.path.realpath(outfile)
+		if outpath in outputsources:
+			sys.exit("ERROR: {} and {} would both be written to {}, rename one or use separate -o".format(outputsources[outpath], gtffile, outfile) )
+		if outpath in inputpaths:
+			sys.exit("ERROR: output {} would replace input file, use a different -o".format(outfile) )
+		outputsources[outpath] = gtffile
+
+def rename_to_output_dir(gtffile):
+	'''rename one GFF into the output folder, return the name of the new file and the counts'''
+	outputdir, gzip_out, buffersize = worker_state["output"]
+	outfile = output_file_name(gtffile, outputdir, gzip_out)
+	renamedgff = BufferedLineWriter(open_output(outfile), buffersize, closeoutput=True)
+	counts = rename_features(gtffile, renamedgff, *worker_state["args"])
+	renamedgff.close()
+	return outfile, counts
+
+def main(argv, wayout):
+	if not len(argv):
+		argv.append("-h")
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=__doc__)
+	parser.add_argument('-c','--conversion', help="text file of naming conversions", required=True)
+	parser.add_argument('-E','--exclude', help="file of list of bad contigs")
+	parser.add_argument('-g','--gtf', nargs='+', help="one or more gtf or gff format files, can be .gz or .zst", required=True)
+	parser.add_argument('-n','--nomatch', action="store_true", help="exclude features with no conversion")
+	parser.add_argument('-o','--output-dir', help="folder for renamed files, required if more than one -g is given")
+	parser.add_argument('-p','--processors', type=int, default=1, help="number of files to rename at once with -o [1]")
+	parser.add_argument('-R','--reversed', action="store_true", help="conversion vector is in reversed order, as newname--oldname")
+	parser.add_argument('-z','--gzip-out', action="store_true", help="gzip all output files with -o, as BGZF")
+	parser.add_argument('--buffer-size', type=int, default=1048576, help="characters of output to hold before each write [1048576]")
+	args = parser.parse_args(argv)
+
+	if len(args.gtf) > 1 and not args.output_dir:
+		sys.exit("ERROR: more than one -g file given, must also set output folder -o")
+
+	conversiondict = make_conversion_dict(args.conversion, args.reversed)
+
+	exclusiondict = make_exclude_dict(args.exclude) if args.exclude else None
+
+	### FOR SINGLE FILE TO STDOUT ###
+	if not args.output_dir:
+		wayout = BufferedLineWriter(wayout, args.buffer_size)
+		linecounter, conversions, noconvertfeatures = rename_features(args.gtf[0], wayout, conversiondict, exclusiondict, args.nomatch)
+		wayout.close()
+		sys.stderr.write("# Counted {} lines  ".format(linecounter) + time.asctime() + os.linesep)
+		sys.stderr.write("# Converted {} lines and could not change {}\n".format(conversions, noconvertfeatures) )
+		return 0
+
+	### FOR ONE OR MORE FILES TO OUTPUT FOLDER ###
+	check_output_names(args.gtf, args.output_dir, args.gzip_out)
+	if not os.path.isdir(args.output_dir):
+		sys.stderr.write("# Making output folder {}\n".format(args.output_dir) )
+		os.makedirs(args.output_dir)
+	workerargs = (conversiondict, exclusiondict, args.nomatch, args.output_dir, args.gzip_out, args.buffer_size)
+	if args.processors > 1 and len(args.gtf) > 1:
+		import multiprocessing # slow to import, so only when using several processes
+		workerpool = multiprocessing.Pool(min(args.processors, len(args.gtf)), init_rename_worker, workerargs)
+		fileresults = workerpool.imap(rename_to_output_dir, args.gtf)
+	else:
+		init_rename_worker(*workerargs)
+		fileresults = map(rename_to_output_dir, args.gtf)
+	for outfile, counts in fileresults:
+		sys.stderr.write("# Wrote {}, converted {} of {} lines and could not change {}  ".format(outfile, counts[1], counts[0], counts[2]) + time.asctime() + os.linesep)
+	if args.processors > 1 and len(args.gtf) > 1:
+		workerpool.close()
+		workerpool.join()
 
 if __name__ == "__main__":
-	main(sys.argv[1:], sys.stdout)
+	run_main(main, sys.argv[1:], sys.stdout)
@@ -5,10 +5,11 @@
 # for SOFA terms:
 # https://github.com/The-Sequence-Ontology/SO-Ontologies/blob/master/subsets/SOFA.obo
 
-"""repeat2gtf.py  last modified 2019-10-10
+"""repeat2gtf.py  last modified 2026-10-18
     generates a GFF3 format file of repeats, typically Ns as gaps
-  the script only searches the FORWARD strand, meaning would need
-  to be run twice for non-palindromic sequences (e.g. CACA vs GTGT)
+  by default the script only searches the FORWARD strand, meaning
+  non-palindromic sequences (e.g. CACA vs GTGT) need -s to also
+  search the reverse complement
     Requires Bio library (biopython)
 
 repeat2gtf.py scaffolds.fasta > scaffolds_gaps.gff
@@ -16,6 +17,12 @@ repeat2gtf.py scaffolds.fasta > scaffolds_gaps.gff
     for non-gap repeats (anything other than N)
     change -t to direct_repeat
 
+    several repeats can be given to -r as a comma-separated list
+    all are found in a single pass through each sequence, and
+    output is sorted by position on each sequence
+
+repeat2gtf.py -r N,CA,GA -l -s scaffolds.fasta > scaffolds_repeats.gff
+
     GFF output contains 9 tab-separated columns for:
 contig  program  type  start  end  score (length)  strand  phase  attributes
     where attributes are composed of:
@@ -26,6 +33,29 @@ contig  program  type  start  end  score (length)  strand  phase  attributes
 scaffold123  assembler  gap  2001  2105  105  .  .  ID=gap.N.1.105
 
     meaning gap (default name), of N, number 1, length is 105
+
+    with -s, matches to the given repeat are + strand, matches
+    to the reverse complement are - strand, and palindromic repeats
+    (such as N or AT) are left as .
+
+    for large genomes, use -m to scan the raw file as a memory map
+    with -j processes, without reading sequences into memory
+    this requires an uncompressed fasta with lines of even length
+    and uses the samtools faidx index (.fai) if it exists
+
+repeat2gtf.py -m -j 8 scaffolds.fasta > scaffolds_gaps.gff
+
+    in -m mode, repeats must be plain letters or [] character classes
+
+    output can be sorted, bgzipped and indexed for tabix, with --bgzip-out
+repeat2gtf.py -r N,CA -s scaffolds.fasta --bgzip-out scaffolds_repeats.gff.gz
+
+    or written directly as a JBrowse track, with --jbrowse-out
+repeat2gtf.py -r N,CA -s scaffolds.fasta --jbrowse-out jbrowse/data/tracks/repeats
+
+    or written unsorted to a file with -o, gzipped as BGZF if the name
+    ends in .gz, where compression runs on a background thread
+repeat2gtf.py -r N,CA -s scaffolds.fasta -o scaffolds_repeats.gff.gz
 """
 
 import sys
@@ -33,25 +63,245 @@ import argparse
 import time
 import os
 import re
-from Bio import SeqIO
+import mmap
+from genomegtf.inputs import open_input, describe_input, detect_compression
+from genomegtf.outputs import BufferedLineWriter, open_output
+from genomegtf.instrument import RunReport
+from genomegtf.profiling import run_main
+
+complement_table = str.maketrans("ACGTURYKMBVDHNacgturykmbvdhn", "TGCAAYRMKVBHDNtgcaayrmkvbhdn")
+
+def reverse_complement_repeat(repeat):
+	'''return the reverse complement of a repeat, or None if the repeat is a regular expression rather than plain letters'''
+	if not repeat.isalpha():
+		return None
+	return repeat.translate(complement_table)[::-1]
+
+def repeat_atoms(pattern):
+	'''return list of sets of letters for each position of a repeat of plain letters or [] classes, or None for other regexes'''
+	atoms = re.findall("\\[[^\\]^-]+\\]|[A-Za-z]", pattern)
+	if "".join(atoms)!=pattern:
+		return None
+	return [ set(atom.strip("[]")) for atom in atoms ]
+
+def can_start_together(atoms1, copies1, atoms2, copies2):
+	'''return True if two repeats could both match at the same position, meaning letters overlap for the length of the shorter one'''
+	if atoms1 is None or atoms2 is None: # any other regex could match anywhere
+		return True
+	return all( letters1 & letters2 for letters1, letters2 in zip(atoms1 * copies1, atoms2 * copies2) )
+
+def make_repeat_regex(repeatlist, do_lowercase, do_reverse, skip_linebreaks=False, above=1):
+	'''combine all repeats into one regex, return the compiled regex (or the bytes pattern to compile for -m), a dict of (repeat, strand) for each named group, and a dict of the later groups that can start at the same position as each group, or None if no two groups can'''
+	# each alternative is a named group m0, m1, etc., so the matching repeat is found by rep.lastgroup
+	# the combined regex only finds where the next repeat starts, as the first alternative that matches is used,
+	# so for CA and CAG, CAGCAG would be found as CA, and find_longest_repeats() checks the other groups at that position
+	patterns = [] # list of (pattern, label, strand)
+	for repeat in repeatlist:
+		forwardstrand = "."
+		revrepeat = reverse_complement_repeat(repeat) if do_reverse else None
+		if do_reverse and revrepeat is None:
+			sys.stderr.write("WARNING: cannot reverse complement {}, searching forward only\n".format(repeat) )
+		if revrepeat is not None and revrepeat!=repeat: # not palindromic, so search both
+			forwardstrand = "+"
+		patterns.append( (repeat, repeat, forwardstrand) )
+		if do_lowercase: # lowercase version of the same repeat
+			patterns.append( (repeat.lower(), repeat.lower(), forwardstrand) )
+		if forwardstrand=="+":
+			patterns.append( (revrepeat, repeat, "-") )
+			if do_lowercase:
+				patterns.append( (revrepeat.lower(), repeat.lower(), "-") )
+	grouplabels = dict( ("m{}".format(i), (pattern[1], pattern[2]) ) for i, pattern in enumerate(patterns) )
+	# repeats shorter than -a are never kept, so each group needs enough copies to reach that length,
+	# and short runs such as a single CA are skipped inside the regex rather than returned to python
+	groupatoms = [ repeat_atoms(pattern[0]) for pattern in patterns ]
+	mincopies = [ max(1, -(-above // len(atoms))) if atoms else 1 for atoms in groupatoms ]
+	if skip_linebreaks: # for raw fasta bytes, allow line breaks between any two letters
+		# written as repeat(breaks-repeat)* rather than (repeat)+ so the regex can skip ahead to the first letter
+		grouppatterns = [ "{0}(?:[\\r\\n]*{0}){{{1},}}".format(allow_linebreaks(pattern[0]), copies-1) for pattern, copies in zip(patterns, mincopies) ]
+	else:
+		grouppatterns = [ "(?:{}){{{},}}".format(pattern[0], copies) for pattern, copies in zip(patterns, mincopies) ]
+	regexstring = "|".join( "(?P<m{}>{})".format(i, grouppattern) for i, grouppattern in enumerate(grouppatterns) )
+	# only later groups need to be checked, as all earlier groups already failed to match where the regex stopped
+	groupregexes = {}
+	for i in range(len(patterns)):
+		laterindexes = [ j for j in range(i+1, len(patterns)) if can_start_together(groupatoms[i], mincopies[i], groupatoms[j], mincopies[j]) ]
+		groupregexes["m{}".format(i)] = [ ("m{}".format(j), grouppatterns[j]) for j in laterindexes ]
+	if not any(groupregexes.values()): # no two groups can start at the same position
+		groupregexes = None
+	if skip_linebreaks: # as bytes, compiled by each worker process
+		if groupregexes is not None:
+			groupregexes = dict( (name, [ (othername, grouppattern.encode()) for othername, grouppattern in othergroups ]) for name, othergroups in groupregexes.items() )
+		return regexstring.encode(), grouplabels, groupregexes
+	if groupregexes is not None:
+		groupregexes = compile_group_regexes(groupregexes)
+	return re.compile(regexstring), grouplabels, groupregexes
+
+def compile_group_regexes(groupregexes):
+	'''return dict of the same lists of (group, pattern) with each pattern compiled'''
+	return dict( (name, [ (othername, re.compile(grouppattern)) for othername, grouppattern in othergroups ]) for name, othergroups in groupregexes.items() )
+
+def find_longest_repeats(repeatregex, groupregexes, sequence, seqstart=0, seqend=None):
+	'''yield (start, end, group) for each repeat from left to right, taking the longest of all groups where several start at the same position'''
+	if seqend is None:
+		seqend = len(sequence)
+	if groupregexes is None: # no two groups can start at the same position, so the combined regex is already the longest
+		for rep in repeatregex.finditer(sequence, seqstart, seqend):
+			yield rep.start(), rep.end(), rep.lastgroup
+		return
+	rep = repeatregex.search(sequence, seqstart, seqend)
+	while rep is not None:
+		repstart, repend, repgroup = rep.start(), rep.end(), rep.lastgroup
+		for groupname, groupregex in groupregexes[repgroup]:
+			grouprep = groupregex.match(sequence, repstart, seqend)
+			if grouprep is not None and grouprep.end() > repend: # for equal length, the first given is kept
+				repend, repgroup = grouprep.end(), groupname
+		yield repstart, repend, repgroup
+		rep = repeatregex.search(sequence, repend, seqend)
+
+def allow_linebreaks(pattern):
+	'''return the pattern with optional line breaks between each letter or [] class, so a repeat can span lines'''
+	atoms = re.findall("\\[[^\\]]+\\]|[A-Za-z]", pattern)
+	if "".join(atoms)!=pattern:
+		sys.exit("ERROR: repeat {} must be only letters or [] classes to use -m".format(pattern) )
+	return "[\\r\\n]*".join(atoms)
+
+def fasta_index_from_fai(faifile):
+	'''read samtools faidx index, return list of tuples of (contig, byte offset, length, bases per line, bytes per line)'''
+	sys.stderr.write("# Reading fasta index from {}  ".format(faifile) + time.asctime() + os.linesep)
+	contigindex = []
+	for line in open(faifile,'r'):
+		lsplits = line.rstrip().split("\t")
+		if len(lsplits) < 5:
+			continue
+		contigindex.append( (lsplits[0], int(lsplits[2]), int(lsplits[1]), int(lsplits[3]), int(lsplits[4])) )
+	return contigindex
+
+def fasta_index_from_mmap(fastamap):
+	'''scan memory-mapped fasta for headers, return list of tuples as fasta_index_from_fai'''
+	# length is calculated from the line layout, and checked by each worker in scan_contig_bytes()
+	contigindex = []
+	if fastamap[0:1]==b">":
+		headerpos = 0
+	else: # skip anything before the first header, or return nothing if there are no headers
+		headerpos = fastamap.find(b"\n>")
+		headerpos = headerpos + 1 if headerpos > -1 else -1
+	filesize = len(fastamap)
+	while headerpos > -1:
+		headerend = fastamap.find(b"\n", headerpos)
+		if headerend < 0: # header with no sequence at end of file
+			break
+		headerwords = fastamap[headerpos+1:headerend].split(None,1)
+		if not headerwords:
+			sys.exit("ERROR: fasta header with no name at byte {}, cannot use -m".format(headerpos) )
+		contig = headerwords[0].decode()
+		seqstart = headerend + 1
+		nextheader = fastamap.find(b"\n>", headerend)
+		seqend = nextheader if nextheader > -1 else filesize
+		while seqend > seqstart and fastamap[seqend-1:seqend] in (b"\n", b"\r"): # trim line breaks at end
+			seqend -= 1
+		firstbreak = fastamap.find(b"\n", seqstart, seqend)
+		if firstbreak < 0: # sequence on a single line
+			linebytes = seqend - seqstart + 1
+			linebases = seqend - seqstart
+		else:
+			linebytes = firstbreak - seqstart + 1
+			linebases = linebytes - 2 if fastamap[firstbreak-1:firstbreak]==b"\r" else linebytes - 1
+		seqlength = bytes_to_position(seqend - seqstart, linebases, linebytes) if linebases else 0
+		contigindex.append( (contig, seqstart, seqlength, linebases, linebytes) )
+		headerpos = nextheader + 1 if nextheader > -1 else -1
+	return contigindex
+
+def bytes_to_position(byteoffset, linebases, linebytes):
+	'''convert byte offset from the start of the sequence into a base position, ignoring line breaks'''
+	return (byteoffset // linebytes) * linebases + min(byteoffset % linebytes, linebases)
+
+def make_line_layout_regex(linebases, linebytes):
+	'''return bytes regex that matches only sequences where every line but the last has linebases letters'''
+	linebreak = b"\\r\\n" if linebytes - linebases == 2 else b"\\n"
+	layout = b"(?:[^\\n]{%d}%s)*+[^\\n]{0,%d}" % (linebases, linebreak, linebases)
+	try: # possessive repeat avoids keeping backtracking state for every line
+		return re.compile(layout)
+	except re.error: # for python before 3.11
+		return re.compile(layout.replace(b")*+", b")*"))
+
+# kept by each worker process, so the file is mapped and the regex compiled only once
+worker_state = {}
+
+def init_scan_worker(fastafile, regexbytes, grouplabels, groupbytes, above, below):
+	'''open the memory map and compile the regex for one worker process'''
+	fastahandle = open(fastafile, 'rb')
+	worker_state["map"] = mmap.mmap(fastahandle.fileno(), 0, access=mmap.ACCESS_READ)
+	worker_state["regex"] = re.compile(regexbytes)
+	worker_state["labels"] = grouplabels
+	worker_state["groups"] = None if groupbytes is None else compile_group_regexes(groupbytes)
+	worker_state["limits"] = (above, below)
+
+def scan_contig_bytes(contigtuple):
+	'''find all repeats in one contig directly on the mapped bytes, return list of (start, end, length, repeat, strand)'''
+	contig, seqstart, seqlength, linebases, linebytes = contigtuple
+	fastamap = worker_state["map"]
+	above, below = worker_state["limits"]
+	grouplabels = worker_state["labels"]
+	replist = []
+	if not seqlength:
+		return replist
+	seqend = seqstart + ( (seqlength-1) // linebases ) * linebytes + (seqlength-1) % linebases + 1
+	# check that all lines are even, otherwise positions would be wrong
+	if not make_line_layout_regex(linebases, linebytes).fullmatch(fastamap, seqstart, seqend):
+		raise ValueError("lines of uneven length in sequence {}, cannot use -m".format(contig) )
+	for bytestart, byteend, repgroup in find_longest_repeats(worker_state["regex"], worker_state["groups"], fastamap, seqstart, seqend):
+		repstart = bytes_to_position(bytestart - seqstart, linebases, linebytes)
+		repend = bytes_to_position(byteend - seqstart, linebases, linebytes)
+		replen = repend - repstart
+		if replen < above or replen > below:
+			continue
+		replabel, repstrand = grouplabels[repgroup]
+		replist.append( (repstart+1, repend, replen, replabel, repstrand) )
+	return replist
 
 def main(argv, wayout):
 	if not len(argv):
 		argv.append("-h")
 	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=__doc__)
-	parser.add_argument('input_file', type = argparse.FileType('rU'), default = '-', help="fasta format file, or stdin as -")
+	parser.add_argument('input_file', default = '-', help="fasta format file, can be compressed, or stdin as -")
 	parser.add_argument('-a', '--above', type=int, metavar='N', default=2, help="only print repeats/gaps longer than N, in letters [2]")
 	parser.add_argument('-b', '--below', type=int, metavar='N', default=1000000000, help="only print sequences repeats/gaps shorter than N, in letters")
 	parser.add_argument('--format', metavar='fastq', default='fasta', help="import fastq format sequences")
 	parser.add_argument('-i','--identifier', help="tag for ID attribute [gap]", default="gap")
 	parser.add_argument('-l','--lowercase', action="store_true", help="search for lowercase letters as well")
+	parser.add_argument('-m','--mmap', action="store_true", help="scan the fasta file as a memory map, without reading sequences")
+	parser.add_argument('-j','--processors', type=int, default=1, help="number of processes for -m mode [1]")
 	parser.add_argument('-p','--program', help="program for 2nd column in output [assembler]", default="assembler")
-	parser.add_argument('-r','--repeat', metavar='N', default='N', help="measure length of the longest polyN, NX repeat, etc.")
+	parser.add_argument('-r','--repeat', metavar='N', default='N', help="measure length of the longest polyN, NX repeat, etc., can be comma-separated list as N,CA,GA")
+	parser.add_argument('-s','--strands', action="store_true", help="also search the reverse complement of each repeat")
 	parser.add_argument('-t','--type', help="feature type for 3rd column [gap]", default="gap")
 	parser.add_argument('--attribute', help="attribute for 9th column [ID]", default="ID")
 	parser.add_argument('-v','--verbose', action="store_true", help="extra output")
+	parser.add_argument('--bgzip-out', help="write position-sorted, bgzipped GFF with tabix index to this file, instead of stdout")
+	parser.add_argument('--sort-lines', type=int, default=2000000, help="lines of --bgzip-out to sort in memory, more are sorted in temporary files [2000000]")
+	parser.add_argument('-T','--temp-dir', help="directory for temporary sort files of --bgzip-out [system default]")
+	parser.add_argument('--jbrowse-out', help="write JBrowse NCList track to this directory, with one folder per scaffold, instead of stdout")
+	parser.add_argument('-o','--output', help="write GFF to this file instead of stdout, as BGZF if ending in .gz")
+	parser.add_argument('--buffer-size', type=int, default=1048576, help="characters of output to hold before each write [1048576]")
+	parser.add_argument('--report', help="write JSON report of time, counts and peak memory of each stage to this file")
 	args = parser.parse_args(argv)
 
+	if sum(1 for outarg in (args.output, args.bgzip_out, args.jbrowse_out) if outarg) > 1:
+		sys.exit("ERROR: can only use one of -o, --bgzip-out and --jbrowse-out")
+	if args.bgzip_out:
+		from genomegtf.bgzf import SortedBgzfSink
+		wayout = SortedBgzfSink(args.bgzip_out, args.sort_lines, args.temp_dir)
+	elif args.jbrowse_out:
+		from genomegtf.jbrowse import NCListSink
+		wayout = NCListSink(args.jbrowse_out)
+	elif args.output:
+		wayout = open_output(args.output)
+	report = RunReport("repeat2gtf.py", argv)
+	# lines are joined and written in blocks, and -o is compressed on another thread
+	wayout = BufferedLineWriter(report.count_output(wayout), args.buffer_size, closeoutput=bool(args.output or args.bgzip_out or args.jbrowse_out))
+	if args.input_file!="-" and not os.path.isfile(args.input_file):
+		sys.exit("ERROR: cannot find input file {}".format(args.input_file) )
+
 	# all integers initialized
 	seqcount = 0
 	seqsum = 0
@@ -59,48 +309,95 @@ def main(argv, wayout):
 	longestrepeat = 0
 	lrepcontig = ""
 
-	# make the one or two regexps
-	repeatregex = re.compile("({0})+".format(args.repeat) )
-	if args.lowercase: # lowercase version of the same repeat
-		lowerrepeat = args.repeat.lower()
-		lcregex = re.compile("({0})+".format(lowerrepeat) )
-		sys.stderr.write("# Parsing repeats of {} and {} from {}  ".format(args.repeat, lowerrepeat, args.input_file.name) + time.asctime() + os.linesep)
-	else:
-		sys.stderr.write("# Parsing repeats of {} from {}  ".format(args.repeat, args.input_file.name) + time.asctime() + os.linesep)
-
-	# begin iterating through sequences, then search the regular expression
-	for seqrec in SeqIO.parse(args.input_file, args.format):
-		seqcount += 1
-		contig = seqrec.id
-		reptracker = {} # key is position, value is list of start, end, length
-		for rep in repeatregex.finditer(str(seqrec.seq)): # iterate through normal repeats
-			replen = rep.end() - rep.start()
-			if replen < args.above or replen > args.below:
-				continue
-			if replen > longestrepeat:
-				longestrepeat = replen
-				lrepcontig = contig
-			seqsum += replen
-			repstart = rep.start()+1
-			repend = rep.end()
-			reptracker[repstart] = [repstart, repend, replen, args.repeat]
-		if args.lowercase:
-			for rep in lcregex.finditer(str(seqrec.seq)): # iterate through lowercase repeats
-				replen = rep.end() - rep.start()
-				if replen < args.above or replen > args.below:
-					continue
-				seqsum += replen
-				repstart = rep.start()+1
-				repend = rep.end()
-				reptracker[repstart] = [repstart, repend, replen, lowerrepeat]
-		for startpos in sorted(reptracker.keys()):
-			repcounter += 1
-			sys.stdout.write("{}\t{}\t{}\t{}\t{}\t{}\t.\t.\t{}={}.{}.{}.{}\n".format(contig, args.program, args.type, reptracker[startpos][0], reptracker[startpos][1], reptracker[startpos][2], args.attribute, args.identifier, reptracker[startpos][3], repcounter, reptracker[startpos][2]) )
+	# make one regexp of all repeats, including lowercase and reverse complement
+	repeatlist = [r for r in args.repeat.split(",") if r]
+	repeatregex, grouplabels, groupregexes = make_repeat_regex(repeatlist, args.lowercase, args.strands, args.mmap, args.above)
+	sys.stderr.write("# Parsing {} patterns for repeats of {} from {}  ".format( len(grouplabels), ",".join(repeatlist), args.input_file + describe_input(args.input_file)) + time.asctime() + os.linesep)
+
+	with report.stage("scan sequences"):
+		### FOR MEMORY MAPPED MODE ###
+		if args.mmap:
+			fastafile = args.input_file
+			if fastafile=="-" or detect_compression(fastafile):
+				sys.exit("ERROR: -m requires an uncompressed fasta file, not stdin or compressed")
+			faifile = "{}.fai".format(fastafile)
+			if os.path.isfile(faifile):
+				contigindex = fasta_index_from_fai(faifile)
+			else:
+				sys.stderr.write("# Indexing contigs from {}  ".format(fastafile) + time.asctime() + os.linesep)
+				with open(fastafile, 'rb') as fh:
+					fastamap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+					contigindex = fasta_index_from_mmap(fastamap)
+					fastamap.close()
+			sys.stderr.write("# Scanning {} sequences with {} processes  ".format(len(contigindex), args.processors) + time.asctime() + os.linesep)
+			workerargs = (fastafile, repeatregex, grouplabels, groupregexes, args.above, args.below)
+			if args.processors > 1:
+				import multiprocessing # slow to import, so only when using several processes
+				workerpool = multiprocessing.Pool(args.processors, init_scan_worker, workerargs)
+				contigresults = workerpool.imap(scan_contig_bytes, contigindex)
+			else: # run in this process
+				init_scan_worker(*workerargs)
+				contigresults = map(scan_contig_bytes, contigindex)
+			# imap returns results in the order of the index, meaning order of the fasta
+			try:
+				for contigtuple, replist in zip(contigindex, contigresults):
+					seqcount += 1
+					contig = contigtuple[0]
+					outlines = []
+					for repstart, repend, replen, replabel, repstrand in replist:
+						if replen > longestrepeat:
+							longestrepeat = replen
+							lrepcontig = contig
+						seqsum += replen
+						repcounter += 1
+						outlines.append("{}\t{}\t{}\t{}\t{}\t{}\t{}\t.\t{}={}.{}.{}.{}\n".format(contig, args.program, args.type, repstart, repend, replen, repstrand, args.attribute, args.identifier, replabel, repcounter, replen) )
+					wayout.write("".join(outlines))
+			except ValueError as uneven_error: # lines of uneven length
+				if args.processors > 1:
+					workerpool.terminate()
+				sys.exit("ERROR: {}".format(uneven_error) )
+			if args.processors > 1:
+				workerpool.close()
+				workerpool.join()
+		### OTHERWISE READ EACH SEQUENCE ###
+		else:
+			# begin iterating through sequences, then search the regular expression
+			from Bio import SeqIO # slow to import, so only when reading sequences
+			for seqrec in SeqIO.parse(open_input(args.input_file), args.format):
+				seqcount += 1
+				contig = seqrec.id
+				outlines = []
+				# matches are found left to right without overlap, so are already sorted by position
+				for repstart, repend, repgroup in find_longest_repeats(repeatregex, groupregexes, str(seqrec.seq)):
+					replen = repend - repstart
+					if replen < args.above or replen > args.below:
+						continue
+					if replen > longestrepeat:
+						longestrepeat = replen
+						lrepcontig = contig
+					seqsum += replen
+					repcounter += 1
+					replabel, repstrand = grouplabels[repgroup]
+					outlines.append("{}\t{}\t{}\t{}\t{}\t{}\t{}\t.\t{}={}.{}.{}.{}\n".format(contig, args.program, args.type, repstart+1, repend, replen, repstrand, args.attribute, args.identifier, replabel, repcounter, replen) )
+				wayout.write("".join(outlines))
+		report.count("sequences", seqcount)
+		report.count("repeats", repcounter)
+		report.count("bases in repeats", seqsum)
 
 	sys.stderr.write("# Counted {} sequences  ".format(seqcount) + time.asctime() + os.linesep)
-	sys.stderr.write("# Counted {} repeats of {} total bases, average {:.2f}\n".format(repcounter, seqsum, seqsum*1.0/repcounter) )
+	if repcounter:
+		sys.stderr.write("# Counted {} repeats of {} total bases, average {:.2f}\n".format(repcounter, seqsum, seqsum*1.0/repcounter) )
+	else:
+		sys.stderr.write("# WARNING: no repeats found\n")
 	if longestrepeat:
 		sys.stderr.write("# Longest repeat was {} bases on {}\n".format(longestrepeat, lrepcontig) )
+	if args.bgzip_out or args.jbrowse_out:
+		with report.stage("write sorted output"):
+			wayout.close()
+	else:
+		wayout.close()
+	if args.report:
+		report.write(args.report)
 
 if __name__ == "__main__":
-	main(sys.argv[1:],sys.stdout)
+	run_main(main, sys.argv[1:], sys.stdout)
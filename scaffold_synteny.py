@@ -3,7 +3,7 @@
 # scaffold_synteny.py created 2019-03-27
 
 '''
-scaffold_synteny.py  v1.1 last modified 2019-10-14
+scaffold_synteny.py  v1.1 last modified 2026-10-18
     makes a table of gene matches between two genomes, to detect synteny
     these can be converted into a dotplot of gene matches
 
@@ -13,6 +13,8 @@ scaffold_synteny.py  v1.1 last modified 2019-10-14
     -q and -d : GFF files of genes for query and subject genomes
     -l and -L : total length to keep for each genome, in MB
         i.e. to only take long scaffolds up to length -l
+    --max-memory : memory budget, as 8G, blast hits are moved to a
+        temporary database in -T when near this, which is slower
 
 scaffold_synteny.py -b monbr1_vs_srosetta_blastp.tab -q Monbr1_augustus_v1_no_comment.gff -d Srosetta_mrna_only_ID_renamed.gff -f Monbr1_scaffolds.fasta -F Salpingoeca_rosetta.dna.toplevel.fa.gz -l 40 -L 50 > monbr1_vs_srosetta_scaffold2d_points.tab
 
@@ -42,21 +44,20 @@ import argparse
 import time
 import os
 import re
-import gzip
 import random
 from collections import defaultdict
-from Bio import SeqIO
+from genomegtf.inputs import open_input, describe_input
+from genomegtf.instrument import RunReport
+from genomegtf.symbols import SymbolTable, grow
+from genomegtf.spill import MemoryBudget, parse_memory_size, new_table, finish_table
+from genomegtf.profiling import run_main
 
 def make_seq_length_dict(contigsfile, maxlength, exclusiondict, wayout, isref=False):
 	'''read fasta file, and return dict where key is scaffold name and value is length'''
 	lengthdict = {}
-	if contigsfile.rsplit('.',1)[-1]=="gz": # autodetect gzip format
-		opentype = gzip.open
-		sys.stderr.write("# Parsing genomic contigs {} as gzipped  ".format(contigsfile) + time.asctime() + os.linesep)
-	else: # otherwise assume normal open for fasta format
-		opentype = open
-		sys.stderr.write("# Parsing genomic contigs {}  ".format(contigsfile) + time.asctime() + os.linesep)
-	for seqrec in SeqIO.parse(opentype(contigsfile,'rt'), "fasta"):
+	sys.stderr.write("# Parsing genomic contigs {}{}  ".format(contigsfile, describe_input(contigsfile)) + time.asctime() + os.linesep)
+	from Bio import SeqIO # slow to import, so only when reading sequences
+	for seqrec in SeqIO.parse(open_input(contigsfile), "fasta"):
 		lengthdict[seqrec.id] = len(seqrec.seq)
 	sys.stderr.write("# Found {} contigs  ".format(len(lengthdict)) + time.asctime() + os.linesep)
 
@@ -86,24 +87,20 @@ def make_seq_length_dict(contigsfile, maxlength, exclusiondict, wayout, isref=Fa
 	#sys.stderr.write(",".join( map(str,breaklines) )	
 	return sorteddict
 
-def parse_gtf(gtffile, excludedict, delimiter, isref=False):
-	'''from a gtf, return a dict of dicts where keys are scaffold names, then gene names, and values are gene info as a tuple of start end and strand direction'''
+def parse_gtf(gtffile, excludedict, delimiter, genenames, isref=False, report=None):
+	'''from a gtf, return a dict of dicts where keys are scaffold names, then gene IDs from SymbolTable genenames, and values are gene midpoints, or for isref a list indexed by gene ID of tuples of scaffold and midpoint, adding line counts to RunReport report'''
 	if isref:
-		genesbyscaffold = {} # key is reference gene ID, value is list of scaffold and gene midpoint position
+		genesbyscaffold = [] # index is reference gene ID, value is tuple of scaffold and gene midpoint position
 	else:
-		genesbyscaffold = defaultdict(dict) # scaffolds as key, then gene name, then gene position integer
-
-	if gtffile.rsplit('.',1)[1]=="gz": # autodetect gzip format
-		opentype = gzip.open
-		sys.stderr.write("# Parsing loci from {} as gzipped  ".format(gtffile) + time.asctime() + os.linesep)
-	else: # otherwise assume normal open for fasta format
-		opentype = open
-		sys.stderr.write("# Parsing loci from {}  ".format(gtffile) + time.asctime() + os.linesep)
-	for line in opentype(gtffile,'rt'):
+		genesbyscaffold = defaultdict(dict) # scaffolds as key, then gene ID, then gene position integer
+
+	sys.stderr.write("# Parsing loci from {}{}  ".format(gtffile, describe_input(gtffile)) + time.asctime() + os.linesep)
+	linecount = 0
+	for linecount, line in enumerate(open_input(gtffile), 1):
 		line = line.strip()
 		if line and not line[0]=="#": # ignore empty lines and comments
 			lsplits = line.split("\t")
-			scaffold = lsplits[0]
+			scaffold = sys.intern(lsplits[0]) # so all genes on the scaffold keep the same string
 			if excludedict and excludedict.get(scaffold, False):
 				continue # skip anything that hits to excludable scaffolds
 			feature = lsplits[2]
@@ -113,32 +110,37 @@ def parse_gtf(gtffile, excludedict, delimiter, isref=False):
 				# if a delimiter is given for either query or db, then split
 				if delimiter:
 					geneid = geneid.rsplit(delimiter,1)[0]
+				geneid = genenames.add(geneid)
 
 				# generate midpoint of each gene as average of start and end positions
 				genemidpoint = (int(lsplits[3]) + int(lsplits[4])) / 2
 				if isref:
-					genesbyscaffold[geneid] = [scaffold,genemidpoint]
+					grow(genesbyscaffold, geneid + 1)
+					genesbyscaffold[geneid] = (scaffold,genemidpoint)
 				else:
 					genesbyscaffold[scaffold][geneid] = genemidpoint
+	if report is not None:
+		report.count("GFF lines", linecount)
 
 	if len(genesbyscaffold) > 0:
-		sys.stderr.write("# Found {} genes  ".format( sum( list( map( len,genesbyscaffold.values()) ) ) ) + time.asctime() + os.linesep)
+		if isref:
+			genecount = sum(1 for gene in genesbyscaffold if gene is not None)
+		else:
+			genecount = sum( list( map( len,genesbyscaffold.values()) ) )
+		sys.stderr.write("# Found {} genes  ".format( genecount ) + time.asctime() + os.linesep)
 		return genesbyscaffold
 	else:
 		sys.stderr.write("# WARNING: NO GENES FOUND\n")
 
-def parse_tabular_blast(blasttabfile, evaluecutoff, querydelimiter, refdelimiter, maxhits, group_removal_max):
-	'''read tabular blast file, return a dict where key is query ID and value is dict of subject ID and bitscore'''
-	if blasttabfile.rsplit('.',1)[1]=="gz": # autodetect gzip format
-		opentype = gzip.open
-		sys.stderr.write("# Parsing tabular blast output {} as gzipped  ".format(blasttabfile) + time.asctime() + os.linesep)
-	else: # otherwise assume normal open for fasta format
-		opentype = open
-		sys.stderr.write("# Parsing tabular blast output {}  ".format(blasttabfile) + time.asctime() + os.linesep)
-	query_to_sub_dict = defaultdict( lambda: defaultdict(int) )
+def parse_tabular_blast(blasttabfile, evaluecutoff, querydelimiter, refdelimiter, querynames, refnames, maxhits, group_removal_max, budget=None, report=None):
+	'''read tabular blast file, return a list indexed by query ID where values are dicts of subject ID and bitscore, or None for no hits, or a SpillTable on disk if over MemoryBudget budget, adding line and filter counts to RunReport report'''
+	sys.stderr.write("# Parsing tabular blast output {}{}  ".format(blasttabfile, describe_input(blasttabfile)) + time.asctime() + os.linesep)
+	query_to_sub_dict = new_table(budget, "blast hits") # indexed by query ID from querynames, subject IDs are from refnames
 	evalueRemovals = 0
-	subjectcounter = defaultdict(int)
-	for line in opentype(blasttabfile, 'rt'):
+	subjectcounter = [] # number of hits, indexed by subject ID
+	addquery, addsubject = querynames.add, refnames.add
+	linecount = 0
+	for linecount, line in enumerate(open_input(blasttabfile), 1):
 		line = line.strip()
 		lsplits = line.split("\t")
 		# qseqid, sseqid, pident, length, mismatch, gapopen, qstart, qend, sstart, send, evalue, bitscore
@@ -151,36 +153,62 @@ def parse_tabular_blast(blasttabfile, evaluecutoff, querydelimiter, refdelimiter
 			continue
 		# otherwise add the entry to first dict
 		bitscore = float(lsplits[11])
-		query_to_sub_dict[queryseq][subjectid] += bitscore
-		subjectcounter[subjectid] += 1
-	sys.stderr.write("# Found blast hits for {} query sequences, removed {} hits by evalue  ".format( len(query_to_sub_dict), evalueRemovals ) + time.asctime() + os.linesep)
+		queryid = addquery(queryseq)
+		if queryid >= len(query_to_sub_dict):
+			grow(query_to_sub_dict, queryid + 1)
+		subdict = query_to_sub_dict[queryid]
+		if subdict is None:
+			subdict = query_to_sub_dict[queryid] = {}
+		subid = addsubject(subjectid)
+		subdict[subid] = subdict.get(subid, 0) + bitscore
+		if subid >= len(subjectcounter):
+			grow(subjectcounter, subid + 1, 0)
+		subjectcounter[subid] += 1
+	query_to_sub_dict = finish_table(query_to_sub_dict)
+	sys.stderr.write("# Found blast hits for {} query sequences, removed {} hits by evalue  ".format( sum(1 for subdict in query_to_sub_dict if subdict is not None), evalueRemovals ) + time.asctime() + os.linesep)
 	# filter by number of hits
 	total_kept = 0
+	maxhitRemovals = 0
 	large_group_removals_qu = {} # to prevent multiple counting, store keys
 	large_group_removals_sb = {} # or possibly to later check what was removed
-	filtered_hit_dict = defaultdict( lambda: defaultdict(int) )
-	for queryseq, subdict in query_to_sub_dict.items():
+	filtered_hit_dict = grow(new_table(budget, "filtered blast hits"), len(querynames)) # so every query gene can be indexed
+	for queryid, subdict in enumerate(query_to_sub_dict):
+		if subdict is None:
+			continue
 		num_hits = len(subdict)
 		if num_hits >= group_removal_max: # remove proteins with many hits, as large protein families likely lead to spurious synteny
-			large_group_removals_qu[queryseq] = True
+			large_group_removals_qu[queryid] = True
 			continue
 		hit_counter = 0 # reset for each query, to take no more than maxhits
-		for subseq, bits in sorted(subdict.items(), key=lambda x: x[1], reverse=True):
-			if subjectcounter.get(subseq, 0) >= group_removal_max:
-				large_group_removals_sb[subseq] = True
+		for subid, bits in sorted(subdict.items(), key=lambda x: x[1], reverse=True):
+			if subjectcounter[subid] >= group_removal_max:
+				large_group_removals_sb[subid] = True
 				continue
 			if hit_counter >= maxhits:
+				maxhitRemovals += 1
 				continue
-			filtered_hit_dict[queryseq][subseq] = bits
+			if filtered_hit_dict[queryid] is None:
+				filtered_hit_dict[queryid] = {}
+			filtered_hit_dict[queryid][subid] = bits
 			hit_counter += 1 # should never get above maxhits
 		total_kept += hit_counter
+	filtered_hit_dict = finish_table(filtered_hit_dict)
 	sys.stderr.write("# Removed {} queries and {} subjects with {} or more hits\n".format( len(large_group_removals_qu), len(large_group_removals_sb), group_removal_max ) )
 	sys.stderr.write("# Names parsed as {} from {}, and {} from {}\n".format( queryseq,lsplits[0], subjectid,lsplits[1] ))
 	sys.stderr.write("# Kept {} blast hits\n".format( total_kept ) )
+	if report is not None:
+		report.count("blast lines", linecount)
+		report.count("hits removed by evalue", evalueRemovals)
+		report.count("queries removed with too many hits", len(large_group_removals_qu) )
+		report.count("subjects removed with too many hits", len(large_group_removals_sb) )
+		report.count("hits removed over maximum per query", maxhitRemovals)
+		report.count("blast hits kept", total_kept)
 	return filtered_hit_dict
 
-def generate_synteny_points(queryScafOffset, dbScafOffset, queryPos, dbPos, blastdict, wayout):
+def generate_synteny_points(queryScafOffset, dbScafOffset, queryPos, dbPos, blastdict, querynames, refnames, wayout):
 	'''combine all datasets and for each gene on the query scaffolds, print tab delimited data'''
+	querygenenames = querynames.names # gene names by ID, for output
+	refgenenames = refnames.names
 	printcount = 0
 	scaffoldtotals = defaultdict(int) # counts of total genes for each scaffold
 	sys.stderr.write("# Determining match positions  " + time.asctime() + os.linesep)
@@ -192,20 +220,20 @@ def generate_synteny_points(queryScafOffset, dbScafOffset, queryPos, dbPos, blas
 			if queryoffset is None:
 				continue
 			overallposition = localposition + queryoffset
-			blasthits = blastdict.get(gene, None)
+			blasthits = blastdict[gene]
 			if blasthits is None:
 				continue
 			for matchgene, bitscore in sorted(blasthits.items(), key=lambda x: x[1], reverse=True):
-				matchscaf, matchposition = dbPos.get(matchgene, [None, None])
-				if matchscaf is None:
+				if matchgene >= len(dbPos) or dbPos[matchgene] is None: # subject is not in reference GFF
 					continue
+				matchscaf, matchposition = dbPos[matchgene]
 				matchoffset = dbScafOffset.get(matchscaf, None)
 				if matchoffset is None:
 					continue
 				overallmatchpos = matchposition + matchoffset
 				scaffoldcounts[matchscaf] += 1
 				printcount += 1
-				wayout.write("g\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(gene, scaffold, matchgene, matchscaf, overallposition, overallmatchpos, bitscore) )
+				wayout.write("g\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(querygenenames[gene], scaffold, refgenenames[matchgene], matchscaf, overallposition, overallmatchpos, bitscore) )
 	if printcount:
 		sys.stderr.write("# Wrote match positions for {} genes\n".format( printcount ) )
 	else:
@@ -257,10 +285,10 @@ def randomize_genes_locally(refdict):
 	return randomgenesbyscaf
 
 def randomize_db_locally(refdict):
-	'''take the ref gtf dict and randomize the gene positions for genes within each scaffold, return a similar dict of lists'''
+	'''take the ref gtf dict and randomize the gene positions for genes within each scaffold, return a list indexed by gene ID, as parse_gtf for isref'''
 	scaffoldcount = 0
 	total_genes = 0
-	randomgenesbyscaf = {} # key is reference gene ID, value is list of scaffold and gene midpoint position
+	randomgenesbyscaf = [] # index is reference gene ID, value is tuple of scaffold and gene midpoint position
 	sys.stderr.write("# Randomizing reference gene positions by scaffold  " + time.asctime() + os.linesep)
 	for scaffold, genedict in refdict.items(): # iterate first to get list of all genes
 		scaffoldcount += 1
@@ -272,7 +300,8 @@ def randomize_db_locally(refdict):
 		# reiterate in same order, but store random positions for each gene
 		genecounter = 0
 		for genename, bounds in genedict.items(): # iterate again to reassign genes to each scaffold
-			randomgenesbyscaf[genename] = [scaffold, randomposlist[genecounter]]
+			grow(randomgenesbyscaf, genename + 1)
+			randomgenesbyscaf[genename] = (scaffold, randomposlist[genecounter])
 			genecounter += 1
 			total_genes += 1
 	sys.stderr.write("# Randomized {} genes on {} scaffolds  ".format(total_genes,scaffoldcount) + time.asctime() + os.linesep)
@@ -313,35 +342,53 @@ def main(argv, wayout):
 	parser.add_argument('-R','--global-randomize', help="globally randomize gene positions of query GFF, cannot use with -S", action="store_true")
 	parser.add_argument('-S','--scaffold-randomize', help="randomize gene positions of query GFF within each scaffold, cannot use with -R", action="store_true")
 	parser.add_argument('--double-randomize', help="randomize gene positions of db, use with -S", action="store_true")
+	parser.add_argument('--max-memory', type=parse_memory_size, help="memory budget, as 4G or 500M, blast hits are moved to a temporary database when near this")
+	parser.add_argument('-T','--temp-dir', help="directory for temporary files of --max-memory [system default]")
+	parser.add_argument('--report', help="write JSON report of time, counts and peak memory of each stage to this file")
 	args = parser.parse_args(argv)
+	report = RunReport("scaffold_synteny.py", argv)
+	wayout = report.count_output(wayout)
 
 	exclusiondict = make_exclude_dict(args.exclude) if args.exclude else {}
 
 	# read both sets of scaffolds
-	query_scaf_lengths = make_seq_length_dict(args.query_fasta, args.query_genome_len, exclusiondict, wayout, False)
-	db_scaf_lengths = make_seq_length_dict(args.db_fasta, args.db_genome_len, exclusiondict, wayout, True)
-
-	# read query as normal
-	query_gene_pos = parse_gtf(args.query_gff, exclusiondict, args.query_delimiter, False)
-	### IF DOING RANDOMIZATION ###
-	if args.global_randomize:
-		query_gene_pos = randomize_genes_globally(query_gene_pos)
-	elif args.scaffold_randomize:
-		query_gene_pos = randomize_genes_locally(query_gene_pos)
-
-	### IF DOING DOUBLE RANDOMIZE ###
-	if args.double_randomize: # read db first as query format, randomize and generate the dict in the ref format
-		db_gene_pos = parse_gtf(args.db_gff, exclusiondict, args.db_delimiter, False)
-		db_gene_pos = randomize_db_locally(db_gene_pos)
-	# if NOT RANDOMIZING REFERENCE #
-	else: # otherwise read as normal into the ref format
-		db_gene_pos = parse_gtf(args.db_gff, exclusiondict, args.db_delimiter, True)
+	with report.stage("read scaffolds"):
+		query_scaf_lengths = make_seq_length_dict(args.query_fasta, args.query_genome_len, exclusiondict, wayout, False)
+		db_scaf_lengths = make_seq_length_dict(args.db_fasta, args.db_genome_len, exclusiondict, wayout, True)
+		report.count("query scaffolds", len(query_scaf_lengths) )
+		report.count("reference scaffolds", len(db_scaf_lengths) )
+
+	with report.stage("read GFF"):
+		# read query as normal
+		querynames = SymbolTable() # gene names are only kept here, all else uses the ID
+		refnames = SymbolTable()
+		query_gene_pos = parse_gtf(args.query_gff, exclusiondict, args.query_delimiter, querynames, False, report)
+		### IF DOING RANDOMIZATION ###
+		if args.global_randomize:
+			query_gene_pos = randomize_genes_globally(query_gene_pos)
+		elif args.scaffold_randomize:
+			query_gene_pos = randomize_genes_locally(query_gene_pos)
+
+		### IF DOING DOUBLE RANDOMIZE ###
+		if args.double_randomize: # read db first as query format, randomize and generate the dict in the ref format
+			db_gene_pos = parse_gtf(args.db_gff, exclusiondict, args.db_delimiter, refnames, False, report)
+			db_gene_pos = randomize_db_locally(db_gene_pos)
+		# if NOT RANDOMIZING REFERENCE #
+		else: # otherwise read as normal into the ref format
+			db_gene_pos = parse_gtf(args.db_gff, exclusiondict, args.db_delimiter, refnames, True, report)
+		report.count("query genes", sum(len(genes) for genes in query_gene_pos.values()) )
+		report.count("reference genes", sum(1 for gene in db_gene_pos if gene is not None) )
 
 	# read blast hits
-	blastdict = parse_tabular_blast(args.blast, args.evalue, args.blast_query_delimiter, args.blast_db_delimiter, args.maximum_hits, args.group_size_maximum)
+	with report.stage("read blast"):
+		blastdict = parse_tabular_blast(args.blast, args.evalue, args.blast_query_delimiter, args.blast_db_delimiter, querynames, refnames, args.maximum_hits, args.group_size_maximum, MemoryBudget.from_option(args.max_memory, args.temp_dir), report)
+		report.count("blast queries", sum(1 for hits in blastdict if hits is not None) )
 
 	# write output
-	generate_synteny_points( query_scaf_lengths, db_scaf_lengths, query_gene_pos, db_gene_pos, blastdict, wayout)
+	with report.stage("write points"):
+		generate_synteny_points( query_scaf_lengths, db_scaf_lengths, query_gene_pos, db_gene_pos, blastdict, querynames, refnames, wayout)
+	if args.report:
+		report.write(args.report)
 
 if __name__ == "__main__":
-	main(sys.argv[1:],sys.stdout)
+	run_main(main, sys.argv[1:], sys.stdout)